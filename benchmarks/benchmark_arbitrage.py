@@ -0,0 +1,138 @@
+"""
+Compares checking put-call parity, vertical spreads, butterflies and futures versus synthetic
+forwards with Python loops over the latest quotes dicts of the expiry of every quotes message with
+ArbitrageScanner, for 3 expiries of 11 strikes each - scanning after every message and after
+batches of messages.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_arbitrage.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+import market_stream_fixtures
+from quedex_api import ArbitrageScanner
+
+UPDATES = 5000
+BATCH = 50
+FORWARD = 0.0004
+
+
+def generate_quotes(registry):
+  random.seed(0)
+  instruments = [instrument for instrument in registry if instrument.expiration_date is not None]
+  quotes = []
+  for _ in range(UPDATES):
+    instrument = random.choice(instruments)
+    if instrument.is_option:
+      strike = float(instrument.strike)
+      price = max(FORWARD - strike if instrument.is_call else strike - FORWARD, 0) + 0.00001
+    else:
+      price = FORWARD
+    price += random.randint(-1, 1) * 0.000001
+    quotes.append({
+      'type': 'quotes', 'instrument_id': instrument.instrument_id,
+      'bid': '%.8f' % (price - 0.000002), 'bid_quantity': 10,
+      'ask': '%.8f' % (price + 0.000002), 'ask_quantity': 10,
+      'last': None, 'last_quantity': 0, 'volume': 0, 'open_interest': 0,
+    })
+  return quotes
+
+
+def check_expiry(registry, latest, expiry):
+  # what a listener without ArbitrageScanner does: loop over the strikes of the expiry
+  underlying_symbol, expiration_date = expiry
+  rows = {}
+  futures = None
+  instruments = registry.find(underlying_symbol=underlying_symbol, expiration_date=expiration_date)
+  for instrument in instruments:
+    quotes = latest.get(instrument.instrument_id)
+    prices = (float(quotes['bid']), float(quotes['ask'])) if quotes else (None, None)
+    if not instrument.is_option:
+      futures = prices
+    else:
+      row = rows.setdefault(float(instrument.strike), {})
+      row['call' if instrument.is_call else 'put'] = prices
+  strikes = sorted(rows)
+  violations = []
+  forwards = []
+  for strike in strikes:
+    call_bid, call_ask = rows[strike].get('call', (None, None))
+    put_bid, put_ask = rows[strike].get('put', (None, None))
+    if None in (call_bid, call_ask, put_bid, put_ask):
+      forwards.append(None)
+      continue
+    forwards.append((strike + call_bid - put_ask, strike + call_ask - put_bid))
+    if futures and futures[0] is not None:
+      if futures[0] > strike + call_ask - put_bid or strike + call_bid - put_ask > futures[1]:
+        violations.append(('futures_synthetic', strike))
+  quoted = [forward for forward in forwards if forward]
+  if quoted:
+    best_bid = max(forward[0] for forward in quoted)
+    violations.extend(
+      ('put_call_parity', forward[1]) for forward in quoted if forward[1] < best_bid
+    )
+  for kind in ('call', 'put'):
+    prices = [rows[strike].get(kind, (None, None)) for strike in strikes]
+    for i in range(len(strikes) - 1):
+      (lower_bid, lower_ask), (higher_bid, higher_ask) = prices[i], prices[i + 1]
+      if None in (lower_bid, lower_ask, higher_bid, higher_ask):
+        continue
+      width = strikes[i + 1] - strikes[i]
+      if kind == 'call' and (higher_bid > lower_ask or lower_bid - higher_ask > width):
+        violations.append(('vertical_spread', strikes[i]))
+      if kind == 'put' and (lower_bid > higher_ask or higher_bid - lower_ask > width):
+        violations.append(('vertical_spread', strikes[i]))
+    for i in range(1, len(strikes) - 1):
+      if None in (prices[i - 1][1], prices[i][0], prices[i + 1][1]):
+        continue
+      weight = (strikes[i + 1] - strikes[i]) / (strikes[i + 1] - strikes[i - 1])
+      if prices[i][0] > weight * prices[i - 1][1] + (1 - weight) * prices[i + 1][1]:
+        violations.append(('butterfly', strikes[i]))
+  return violations
+
+
+def main():
+  instrument_data = market_stream_fixtures.load_instrument_data()
+
+  def new_scanner():
+    scanner = ArbitrageScanner()
+    scanner.on_instrument_data(instrument_data)
+    return scanner
+
+  registry = new_scanner().registry
+  quotes = generate_quotes(registry)
+  expiries = dict(
+    (instrument.instrument_id, (instrument.underlying_symbol, instrument.expiration_date))
+    for instrument in registry
+  )
+  latest = {}
+
+  def loops(batch):
+    changed = set()
+    for i, message in enumerate(quotes):
+      latest[message['instrument_id']] = message
+      changed.add(expiries[message['instrument_id']])
+      if (i + 1) % batch == 0:
+        for expiry in changed:
+          check_expiry(registry, latest, expiry)
+        changed = set()
+
+  def scanner_scans(batch):
+    scanner = new_scanner()
+    for i, message in enumerate(quotes):
+      scanner.on_quotes(message)
+      if (i + 1) % batch == 0:
+        scanner.scan()
+
+  for batch in (1, BATCH):
+    print('scan after %d message(s)' % batch)
+    for name, scan in [('loops over dicts:', loops), ('ArbitrageScanner:', scanner_scans)]:
+      seconds = timeit.timeit(lambda: scan(batch), number=1)
+      print('  %s %6.2f us/message' % (name, seconds / UPDATES * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,59 @@
+"""
+Compares passing messages to MarketStream.on_message as str decoded from the WebSocket payload
+(the behaviour before the client protocols passed the payload on as received) with passing the
+bytes payload itself. For each message the time and the peak of memory allocated while it is
+processed (measured with tracemalloc) are reported.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_buffer_messages.py
+"""
+from __future__ import print_function
+
+import timeit
+import tracemalloc
+
+import market_stream_fixtures
+from quedex_api import Exchange, MarketStream, MarketStreamListener
+from quedex_api.codec import available_codecs
+
+ITERATIONS = 2000
+
+
+def peak_allocated(run):
+  run()
+  tracemalloc.start()
+  tracemalloc.reset_peak()
+  run()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return peak
+
+
+def main():
+  messages = [
+    ('keepalive', '{"type":"keepalive","timestamp":1506958410894}'),
+    ('order_book', market_stream_fixtures.order_book_str),
+    ('quotes', market_stream_fixtures.quotes_str),
+    ('instrument_data', market_stream_fixtures.instrument_data_str),
+  ]
+  exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+  for codec in available_codecs():
+    market_stream = MarketStream(exchange, fast_verification=True, codec=codec)
+    market_stream.add_listener(MarketStreamListener())
+    print(codec)
+    for name, message_str in messages:
+      payload = message_str.encode('utf8')
+      iterations = ITERATIONS // 100 if name == 'instrument_data' else ITERATIONS
+      results = [
+        ('str', lambda: market_stream.on_message(payload.decode('utf8'))),
+        ('bytes', lambda: market_stream.on_message(payload)),
+      ]
+      timings = []
+      for result_name, run in results:
+        seconds = timeit.timeit(run, number=iterations) / iterations
+        timings.append('%s: %8.2f us %8d B' % (result_name, seconds * 1e6, peak_allocated(run)))
+      print('  %-16s %s' % (name, '   '.join(timings)))
+
+
+if __name__ == '__main__':
+  main()
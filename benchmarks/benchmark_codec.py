@@ -0,0 +1,37 @@
+"""
+Measures decoding time of real order_book, quotes and instrument_data payloads with every installed
+codec (see quedex_api.codec).
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_codec.py
+"""
+from __future__ import print_function
+
+import json
+import timeit
+
+import market_stream_fixtures
+from quedex_api.codec import available_codecs, get_codec
+from quedex_api.verification import extract_cleartext
+
+PAYLOADS = [
+  ('order_book', market_stream_fixtures.order_book_str, 20000),
+  ('quotes', market_stream_fixtures.quotes_str, 20000),
+  ('instrument_data', market_stream_fixtures.instrument_data_str, 200),
+]
+
+
+def main():
+  codecs = [get_codec(name) for name in available_codecs()]
+  print('%-16s %s' % ('payload', ''.join('%12s' % codec.name for codec in codecs)))
+  for name, message_wrapper_str, iterations in PAYLOADS:
+    message_str = extract_cleartext(json.loads(message_wrapper_str)['data'])
+    timings = []
+    for codec in codecs:
+      seconds = timeit.timeit(lambda: codec.loads(message_str), number=iterations) / iterations
+      timings.append('%9.2f us' % (seconds * 1e6))
+    print('%-16s %s' % (name, ''.join(timings)))
+
+
+if __name__ == '__main__':
+  main()
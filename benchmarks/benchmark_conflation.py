@@ -0,0 +1,67 @@
+"""
+Feeds a burst of order_book, quotes and trade messages of 250 instruments to a slow listener (about
+20 us of work per message), directly and through ConflatingListener flushed every 1000 messages,
+and reports how many messages the listener processed and how long it took.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_conflation.py
+"""
+from __future__ import print_function
+
+import random
+import time
+
+from quedex_api import ConflatingListener, MarketStreamListener
+
+INSTRUMENTS = 250
+MESSAGES = 20000
+FLUSH_EVERY = 1000
+
+
+class SlowListener(MarketStreamListener):
+  def __init__(self):
+    self.processed = 0
+
+  def on_message(self, message):
+    self.processed += 1
+    deadline = time.time() + 0.00002
+    while time.time() < deadline:
+      pass
+
+
+def generate_messages():
+  random.seed(0)
+  messages = []
+  for _ in range(MESSAGES):
+    instrument_id = str(random.randrange(INSTRUMENTS))
+    message_type = random.choice(['order_book'] * 10 + ['quotes'] * 9 + ['trade'])
+    messages.append({'type': message_type, 'instrument_id': instrument_id})
+  return messages
+
+
+def main():
+  messages = generate_messages()
+
+  listener = SlowListener()
+  started = time.time()
+  for message in messages:
+    listener.on_message(message)
+  print('direct:      %5d messages processed in %.3f s' % (
+    listener.processed, time.time() - started
+  ))
+
+  listener = SlowListener()
+  conflating_listener = ConflatingListener(listener)
+  started = time.time()
+  for i, message in enumerate(messages):
+    conflating_listener.on_message(message)
+    if i % FLUSH_EVERY == FLUSH_EVERY - 1:
+      conflating_listener.flush()
+  conflating_listener.flush()
+  print('conflating:  %5d messages processed in %.3f s, %d coalesced' % (
+    listener.processed, time.time() - started, conflating_listener.coalesced_count
+  ))
+
+
+if __name__ == '__main__':
+  main()
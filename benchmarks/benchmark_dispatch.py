@@ -0,0 +1,69 @@
+"""
+Compares dispatching market stream messages of all types to 10 listeners by looking listener
+methods up on every message (hasattr/getattr, the behaviour before DispatchTable) and with
+DispatchTable. Every listener implements one message type callback, so most lookups are misses.
+
+Run from the root of the repository:
+  PYTHONPATH=. python benchmarks/benchmark_dispatch.py
+"""
+from __future__ import print_function
+
+import timeit
+
+from quedex_api import MarketStreamListener
+from quedex_api.dispatch import DispatchTable
+
+ITERATIONS = 20000
+MESSAGE_TYPES = ['instrument_data', 'order_book', 'quotes', 'spot_data', 'trade', 'session_state']
+
+
+def create_listener(message_type):
+  def handle(self, message):
+    self.count += 1
+  listener_class = type(
+    'Listener', (MarketStreamListener,), {'on_' + message_type: handle, 'count': 0}
+  )
+  return listener_class()
+
+
+def dispatch_with_lookups(listeners, message):
+  for listener in listeners:
+    if hasattr(listener, 'on_message'):
+      listener.on_message(message)
+
+  listener_name = 'on_' + message['type']
+  for listener in listeners:
+    if hasattr(listener, listener_name):
+      getattr(listener, listener_name)(message)
+
+
+def dispatch_with_table(dispatch_table, message):
+  for handler in dispatch_table.handlers('on_message'):
+    handler(message)
+
+  for handler in dispatch_table.message_handlers(message['type']):
+    handler(message)
+
+
+def main():
+  listeners = [create_listener(MESSAGE_TYPES[i % len(MESSAGE_TYPES)]) for i in range(10)]
+  dispatch_table = DispatchTable(MarketStreamListener)
+  for listener in listeners:
+    dispatch_table.add(listener)
+  messages = [{'type': message_type} for message_type in MESSAGE_TYPES]
+
+  def run_lookups():
+    for message in messages:
+      dispatch_with_lookups(listeners, message)
+
+  def run_table():
+    for message in messages:
+      dispatch_with_table(dispatch_table, message)
+
+  for name, run in [('hasattr/getattr', run_lookups), ('dispatch table', run_table)]:
+    seconds = timeit.timeit(run, number=ITERATIONS) / (ITERATIONS * len(messages))
+    print('%-16s %8.3f us/message' % (name, seconds * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,41 @@
+"""
+Compares decoding market stream envelopes with json.loads (the behaviour before parse_envelope) and
+with parse_envelope, for envelopes as str and as bytes received from the WebSocket.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_envelope.py
+"""
+from __future__ import print_function
+
+import json
+import timeit
+
+import market_stream_fixtures
+from quedex_api.envelope import parse_envelope
+
+ITERATIONS = 20000
+
+
+def main():
+  messages = [
+    ('keepalive', '{"type":"keepalive","timestamp":1506958410894}'),
+    ('order_book', market_stream_fixtures.order_book_str),
+    ('quotes', market_stream_fixtures.quotes_str),
+    ('instrument_data', market_stream_fixtures.instrument_data_str),
+  ]
+  for name, message_str in messages:
+    message_bytes = message_str.encode('utf8')
+    results = [
+      ('json.loads(decode)', lambda: json.loads(message_bytes.decode('utf8'))),
+      ('parse_envelope(str)', lambda: parse_envelope(message_str)),
+      ('parse_envelope(bytes)', lambda: parse_envelope(message_bytes)),
+    ]
+    timings = []
+    for result_name, run in results:
+      seconds = timeit.timeit(run, number=ITERATIONS) / ITERATIONS
+      timings.append('%s: %6.2f us' % (result_name, seconds * 1e6))
+    print('%-16s %s' % (name, '   '.join(timings)))
+
+
+if __name__ == '__main__':
+  main()
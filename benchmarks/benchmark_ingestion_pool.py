@@ -0,0 +1,73 @@
+"""
+Measures market stream throughput (messages per second) with ingestion done inline on the calling
+thread and on an IngestionPool of 1, 2, 4 and 8 worker processes.
+
+Run from the root of the repository (add --fast to verify with ClearsignVerifier):
+  PYTHONPATH=.:tests python benchmarks/benchmark_ingestion_pool.py [--fast]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+import market_stream_fixtures
+from quedex_api import Exchange, IngestionPool, MarketStream, MarketStreamListener
+
+MESSAGES = 2000
+WORKERS = [1, 2, 4, 8]
+FIXTURES = [
+  market_stream_fixtures.order_book_str,
+  market_stream_fixtures.quotes_str,
+  market_stream_fixtures.order_book_str,
+  market_stream_fixtures.trade_str,
+]
+
+
+class CountingListener(MarketStreamListener):
+  def __init__(self):
+    self.count = 0
+
+  def on_message(self, message):
+    self.count += 1
+
+
+def run(fast_verification, workers):
+  calls = queue.Queue()
+  pool = None
+  if workers:
+    pool = IngestionPool(
+      workers=workers, call_from_thread=lambda function, *args: calls.put((function, args))
+    )
+  exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+  market_stream = MarketStream(exchange, fast_verification=fast_verification, ingestion_pool=pool)
+  listener = CountingListener()
+  market_stream.add_listener(listener)
+
+  started = time.time()
+  for i in range(MESSAGES):
+    market_stream.on_message(FIXTURES[i % len(FIXTURES)])
+  while listener.count < MESSAGES:
+    function, args = calls.get()
+    function(*args)
+  elapsed = time.time() - started
+
+  if pool is not None:
+    pool.close()
+  return MESSAGES / elapsed
+
+
+def main():
+  fast_verification = '--fast' in sys.argv
+  print('verification: %s' % ('clearsign' if fast_verification else 'pgpy'))
+  print('%-10s %10.0f messages/s' % ('inline', run(fast_verification, 0)))
+  for workers in WORKERS:
+    print('%-10s %10.0f messages/s' % ('%d workers' % workers, run(fast_verification, workers)))
+
+
+if __name__ == '__main__':
+  main()
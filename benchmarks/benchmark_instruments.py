@@ -0,0 +1,67 @@
+"""
+Compares finding instruments by a linear scan of the instrument_data payload (parsing the strike
+on the way) with InstrumentRegistry indexes, and the cost of instrument_data for components which
+share one registry.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_instruments.py
+"""
+from __future__ import print_function
+
+import timeit
+from decimal import Decimal
+
+import market_stream_fixtures
+from quedex_api import InstrumentRegistry
+
+ITERATIONS = 5000
+
+
+def main():
+  instrument_data = market_stream_fixtures.load_instrument_data()
+  registry = InstrumentRegistry()
+  registry.on_instrument_data(instrument_data)
+  expiration = 1499990400000
+  strike = Decimal('0.00043478')
+
+  def scan_calls():
+    return sorted(
+      (instrument for instrument in instrument_data['data'].values()
+       if instrument.get('option_type') == 'call_european'
+       and instrument['expiration_date'] == expiration),
+      key=lambda instrument: Decimal(instrument['strike'])
+    )
+
+  def scan_strike():
+    return [instrument for instrument in instrument_data['data'].values()
+            if 'strike' in instrument and Decimal(instrument['strike']) == strike]
+
+  queries = [
+    ('calls of an expiry', scan_calls,
+     lambda: registry.find(expiration_date=expiration, option_type='call_european')),
+    ('options of a strike', scan_strike, lambda: registry.find(strike=strike)),
+    ('futures', lambda: [i for i in instrument_data['data'].values() if i['type'] == 'futures'],
+     lambda: registry.find(type='futures')),
+  ]
+  print('%d instruments' % len(registry))
+  for name, scan, find in queries:
+    scan_seconds = timeit.timeit(scan, number=ITERATIONS) / ITERATIONS
+    find_seconds = timeit.timeit(find, number=ITERATIONS) / ITERATIONS
+    print('  %-20s scan: %6.2f us   registry: %5.2f us' % (
+      name, scan_seconds * 1e6, find_seconds * 1e6
+    ))
+
+  iterations = 200
+  parse_seconds = timeit.timeit(
+    lambda: InstrumentRegistry().on_instrument_data(instrument_data), number=iterations
+  ) / iterations
+  shared_seconds = timeit.timeit(
+    lambda: registry.on_instrument_data(instrument_data), number=iterations
+  ) / iterations
+  print('instrument_data')
+  print('  parsed by a registry:      %8.2f us' % (parse_seconds * 1e6))
+  print('  passed to a shared one:    %8.2f us' % (shared_seconds * 1e6))
+
+
+if __name__ == '__main__':
+  main()
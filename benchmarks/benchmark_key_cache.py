@@ -0,0 +1,65 @@
+"""
+Measures the per-message cost of UserStream decryption and encryption with the exchange public key
+parsed on every access (the behaviour before the key was cached) and with the cached key.
+
+Run from the root of the repository:
+  PYTHONPATH=. python benchmarks/benchmark_key_cache.py
+"""
+from __future__ import print_function
+
+import json
+import timeit
+
+import pgpy
+
+from quedex_api import Exchange, Trader, UserStream
+
+ITERATIONS = 50
+
+
+def read(path):
+  with open(path, 'r') as f:
+    return f.read()
+
+
+class UncachedExchange(Exchange):
+  @property
+  def public_key(self):
+    self.invalidate_public_key()
+    return super(UncachedExchange, self).public_key
+
+
+def create_user_stream(exchange_class):
+  trader = Trader('123456789', read('keys/trader-private-key.asc'))
+  trader.decrypt_private_key('aaa')
+  exchange = exchange_class(read('keys/quedex-public-key.asc'), 'wss://url')
+  user_stream = UserStream(exchange, trader)
+  user_stream.send_message = lambda message: None
+  return user_stream
+
+
+def create_message():
+  quedex_private_key = pgpy.PGPKey()
+  quedex_private_key.parse(read('keys/quedex-private-key.asc'))
+  trader_public_key = pgpy.PGPKey()
+  trader_public_key.parse(read('keys/trader-public-key.asc'))
+  message = pgpy.PGPMessage.new(json.dumps([{'type': 'account_state', 'balance': '3.1416'}]))
+  message |= quedex_private_key.sign(message)
+  return str(trader_public_key.encrypt(message))
+
+
+def main():
+  encrypted = create_message()
+  for name, exchange_class in [('parsed on every access', UncachedExchange), ('cached', Exchange)]:
+    user_stream = create_user_stream(exchange_class)
+    decrypt = timeit.timeit(lambda: user_stream._decrypt(encrypted), number=ITERATIONS) / ITERATIONS
+    encrypt = timeit.timeit(
+      lambda: user_stream._encrypt_send({'type': 'ping'}), number=ITERATIONS
+    ) / ITERATIONS
+    print('%-24s decrypt: %8.3f ms/message   encrypt: %8.3f ms/message' % (
+      name, decrypt * 1e3, encrypt * 1e3
+    ))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,96 @@
+"""
+Compares rebuilding the option chain of an expiry (strike-ordered lists of call and put quotes)
+from dicts of the latest quotes on every quotes message with OptionChain, which updates the cells
+of the quoted option in place, for 3 expiries of 11 strikes each, and reading the mids of all calls
+of an expiry from the rebuilt lists versus from a view of the chain.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_option_chain.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+import market_stream_fixtures
+from quedex_api import OptionChain
+
+UPDATES = 20000
+
+
+def generate_quotes(option_ids):
+  random.seed(0)
+  quotes = []
+  for _ in range(UPDATES):
+    bid = random.randint(100, 1000)
+    quotes.append({
+      'type': 'quotes', 'instrument_id': random.choice(option_ids),
+      'bid': '0.%08d' % bid, 'bid_quantity': random.randint(1, 100),
+      'ask': '0.%08d' % (bid + random.randint(1, 20)), 'ask_quantity': random.randint(1, 100),
+      'last': '0.%08d' % bid, 'last_quantity': 1, 'volume': 10, 'open_interest': 5,
+    })
+  return quotes
+
+
+def main():
+  instrument_data = market_stream_fixtures.load_instrument_data()
+  option_chain = OptionChain()
+  option_chain.on_instrument_data(instrument_data)
+  registry = option_chain.registry
+  options = [instrument for instrument in registry if instrument.is_option]
+  quotes = generate_quotes([instrument.instrument_id for instrument in options])
+  expiry = option_chain.expirations()[0]
+
+  latest = {}
+  rebuilt = {}
+
+  def rebuild(instrument):
+    # what a listener without OptionChain does: regroup the latest quotes of the expiry by strike
+    instruments = registry.find(
+      underlying_symbol=instrument.underlying_symbol, expiration_date=instrument.expiration_date
+    )
+    chain = {}
+    for option in instruments:
+      if not option.is_option:
+        continue
+      row = chain.setdefault(option.strike, {})
+      row['call' if option.is_call else 'put'] = latest.get(option.instrument_id)
+    rebuilt[(instrument.underlying_symbol, instrument.expiration_date)] = [
+      (float(strike), chain[strike].get('call'), chain[strike].get('put'))
+      for strike in sorted(chain)
+    ]
+
+  def update_rebuilt():
+    for message in quotes:
+      latest[message['instrument_id']] = dict(
+        (field, float(message[field]) if message[field] is not None else None)
+        for field in ('bid', 'ask', 'last')
+      )
+      rebuild(registry[message['instrument_id']])
+
+  def update_chain():
+    for message in quotes:
+      option_chain.on_quotes(message)
+
+  rebuilt_seconds = timeit.timeit(update_rebuilt, number=1)
+  chain_seconds = timeit.timeit(update_chain, number=1)
+  print('quotes updates')
+  print('  rebuild from dicts: %6.2f us/update' % (rebuilt_seconds / UPDATES * 1e6))
+  print('  OptionChain:        %6.2f us/update' % (chain_seconds / UPDATES * 1e6))
+
+  def mids_from_rebuilt():
+    return [(call['bid'] + call['ask']) / 2 if call else None for _, call, _ in rebuilt[expiry]]
+
+  def mids_from_chain():
+    chain = option_chain.chain(*expiry)
+    return (chain['call_bid'] + chain['call_ask']) / 2
+
+  iterations = 10000
+  print('call mids of an expiry')
+  for name, mids in [('rebuilt lists:', mids_from_rebuilt), ('chain view:', mids_from_chain)]:
+    seconds = timeit.timeit(mids, number=iterations) / iterations
+    print('  %-19s %6.2f us' % (name, seconds * 1e6))
+
+
+if __name__ == '__main__':
+  main()
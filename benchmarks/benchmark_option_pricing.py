@@ -0,0 +1,114 @@
+"""
+Compares pricing, implied volatility and Greeks of a chain of 520 options (5 expiries x 52 strikes x
+call/put) computed one option at a time in Python with OptionPricer, for the whole chain (with the
+previous implied volatilities as starting points, as after invalidate) and after a quote of a single
+option, which recomputes only that option.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_option_pricing.py
+"""
+from __future__ import print_function
+
+import math
+import random
+import timeit
+
+from quedex_api import OptionPricer
+from quedex_api.option_pricing import MILLIS_PER_YEAR, black_scholes
+
+SPOT = 0.0004
+EXPIRIES = 5
+STRIKES = 52
+NOW = 1500000000000
+
+
+def scalar_black_scholes(spot, strike, years, volatility, is_call):
+  deviation = volatility * math.sqrt(years)
+  d1 = (math.log(spot / strike) + 0.5 * volatility * volatility * years) / deviation
+  d2 = d1 - deviation
+  cdf_d1 = 0.5 * math.erfc(-d1 / math.sqrt(2))
+  cdf_d2 = 0.5 * math.erfc(-d2 / math.sqrt(2))
+  pdf_d1 = math.exp(-0.5 * d1 * d1) / math.sqrt(2 * math.pi)
+  call = spot * cdf_d1 - strike * cdf_d2
+  price = call if is_call else call - spot + strike
+  delta = cdf_d1 if is_call else cdf_d1 - 1
+  gamma = pdf_d1 / (spot * deviation)
+  vega = spot * pdf_d1 * math.sqrt(years)
+  theta = -spot * pdf_d1 * volatility / (2 * math.sqrt(years))
+  return price, delta, gamma, vega, theta
+
+
+def scalar_implied_volatility(price, spot, strike, years, is_call):
+  low, high, volatility = 1e-6, 10.0, 0.5
+  for _ in range(64):
+    model_price, _, _, vega, _ = scalar_black_scholes(spot, strike, years, volatility, is_call)
+    error = model_price - price
+    if abs(error) < 1e-10 * spot:
+      break
+    if error > 0:
+      high = volatility
+    else:
+      low = volatility
+    newton = volatility - error / vega if vega else low
+    volatility = newton if low < newton < high else (low + high) / 2
+  return volatility
+
+
+def main():
+  instruments = {}
+  quotes = []
+  options = []
+  for expiry in range(EXPIRIES):
+    expiration_date = NOW + int((expiry + 1) * 0.05 * MILLIS_PER_YEAR)
+    for strike_index in range(STRIKES):
+      strike = SPOT * (0.75 + 0.01 * strike_index)
+      for option_type in ['call_european', 'put_european']:
+        instrument_id = str(len(instruments))
+        instruments[instrument_id] = {
+          'instrument_id': instrument_id, 'type': 'option', 'underlying_symbol': 'USD',
+          'tick_size': '0.00000001', 'expiration_date': expiration_date, 'strike': '%.8f' % strike,
+          'option_type': option_type,
+        }
+        years = (expiration_date - NOW) / MILLIS_PER_YEAR
+        is_call = option_type == 'call_european'
+        price = float(black_scholes(SPOT, strike, years, 0.6 + 0.002 * strike_index, is_call)[0])
+        quotes.append({
+          'type': 'quotes', 'instrument_id': instrument_id, 'bid': '%.12f' % (price * 0.99),
+          'ask': '%.12f' % (price * 1.01),
+        })
+        options.append((price, strike, years, is_call))
+
+  pricer = OptionPricer(clock=lambda: NOW)
+  pricer.on_instrument_data({'type': 'instrument_data', 'data': instruments})
+  pricer.on_spot_data({'type': 'spot_data', 'spot_data': {'USD': {'spot_index': '%.8f' % SPOT}}})
+  for message in quotes:
+    pricer.on_quotes(message)
+
+  def scalar_chain():
+    for price, strike, years, is_call in options:
+      volatility = scalar_implied_volatility(price, SPOT, strike, years, is_call)
+      scalar_black_scholes(SPOT, strike, years, volatility, is_call)
+
+  def vectorized_chain():
+    pricer.invalidate()
+    pricer.refresh()
+
+  def vectorized_one_quote():
+    quote = random.choice(quotes)
+    bid = float(quote['bid']) * random.uniform(0.999, 1.001)
+    pricer.on_quotes(dict(quote, bid='%.12f' % bid))
+    pricer.refresh()
+
+  iterations = 20
+  print('%d options' % len(options))
+  for name, chain in [
+    ('per option, whole chain:', scalar_chain),
+    ('OptionPricer, whole chain:', vectorized_chain),
+    ('OptionPricer, after a quote:', vectorized_one_quote),
+  ]:
+    seconds = timeit.timeit(chain, number=iterations) / iterations
+    print('  %-28s %8.2f ms' % (name, seconds * 1e3))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,108 @@
+"""
+Measures OrderBookStore with 250 instruments and 20 levels per side: throughput of order_book
+updates, latency of queries and memory, compared with keeping the last order_book message of every
+instrument (lists of price strings) and computing the same from it.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_order_book.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+import tracemalloc
+
+from quedex_api import OrderBookStore
+
+INSTRUMENTS = 250
+LEVELS = 20
+UPDATES = 20000
+
+
+def generate_order_books(count):
+  # prices of every instrument walk randomly by a few ticks from update to update
+  random.seed(0)
+  mids = [random.randint(40000, 45000) for _ in range(INSTRUMENTS)]
+  order_books = []
+  for i in range(count):
+    instrument = i % INSTRUMENTS
+    mids[instrument] += random.randint(-2, 2)
+    mid = mids[instrument]
+    order_books.append({
+      'type': 'order_book',
+      'instrument_id': str(instrument),
+      'bids': [['0.%08d' % (mid - 1 - level), random.randint(1, 100)] for level in range(LEVELS)],
+      'asks': [['0.%08d' % (mid + 1 + level), random.randint(1, 100)] for level in range(LEVELS)],
+    })
+  return order_books
+
+
+def allocated(build):
+  tracemalloc.start()
+  before, _ = tracemalloc.get_traced_memory()
+  result = build()
+  after, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return result, after - before
+
+
+def main():
+  instrument_data = {
+    'type': 'instrument_data',
+    'data': dict(
+      (str(i), {'instrument_id': str(i), 'tick_size': '0.00000001'}) for i in range(INSTRUMENTS)
+    ),
+  }
+  order_books = generate_order_books(UPDATES)
+
+  def build_store():
+    store = OrderBookStore(capacity=LEVELS)
+    store.on_instrument_data(instrument_data)
+    for order_book in order_books[:INSTRUMENTS]:
+      store.on_order_book(order_book)
+    return store
+
+  def build_messages():
+    return dict(
+      (order_book['instrument_id'], order_book) for order_book in generate_order_books(INSTRUMENTS)
+    )
+
+  store, store_memory = allocated(build_store)
+  messages, messages_memory = allocated(build_messages)
+  print('memory, %d instruments x %d levels' % (INSTRUMENTS, LEVELS))
+  print('  OrderBookStore:    %8d B (arrays: %d B)' % (store_memory, store.nbytes))
+  print('  last messages:     %8d B' % messages_memory)
+
+  seconds = timeit.timeit(
+    lambda: [store.on_order_book(order_book) for order_book in order_books], number=1
+  )
+  print('updates')
+  print('  OrderBookStore:    %8.2f us/update  %8d updates/s' % (
+    seconds / UPDATES * 1e6, UPDATES / seconds
+  ))
+
+  book = store.book('0')
+  message = messages['0']
+
+  def message_ask_quantity_at(ticks):
+    return next((level[1] for level in message['asks'] if int(level[0][2:]) == ticks), 0)
+
+  queries = [
+    ('best bid', lambda: book.best_bid(),
+     lambda: (int(message['bids'][0][0][2:]), message['bids'][0][1])),
+    ('depth of 10 levels', lambda: book.bid_depth(10),
+     lambda: sum(level[1] for level in message['bids'][:10])),
+    ('quantity at price', lambda: book.ask_quantity_at(book.best_ask()[0] + 10),
+     lambda: message_ask_quantity_at(int(message['asks'][0][0][2:]) + 10)),
+  ]
+  print('queries')
+  for name, store_query, message_query in queries:
+    store_seconds = timeit.timeit(store_query, number=UPDATES) / UPDATES
+    message_seconds = timeit.timeit(message_query, number=UPDATES) / UPDATES
+    print('  %-20s OrderBookStore: %6.2f us   last message: %6.2f us' % (
+      name, store_seconds * 1e6, message_seconds * 1e6
+    ))
+
+
+if __name__ == '__main__':
+  main()
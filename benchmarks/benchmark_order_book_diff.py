@@ -0,0 +1,74 @@
+"""
+Measures OrderBookDiffer on books of 20 levels per side of which a few change on every update, and
+the work of a consumer which stores a row per level (e.g. persistence) when it processes full
+books versus deltas.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_order_book_diff.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+from quedex_api import OrderBookDiffer
+
+LEVELS = 20
+UPDATES = 20000
+
+
+def generate_order_books(changed_levels):
+  random.seed(0)
+  bids = [['0.%08d' % (41000 - level), random.randint(1, 100)] for level in range(LEVELS)]
+  asks = [['0.%08d' % (41001 + level), random.randint(1, 100)] for level in range(LEVELS)]
+  order_books = []
+  for _ in range(UPDATES):
+    bids = [list(level) for level in bids]
+    asks = [list(level) for level in asks]
+    for _ in range(changed_levels):
+      side = random.choice([bids, asks])
+      random.choice(side)[1] = random.randint(1, 100)
+    order_books.append({'type': 'order_book', 'instrument_id': '71', 'bids': bids, 'asks': asks})
+  return order_books
+
+
+def main():
+  for changed_levels in [1, 3, 10]:
+    order_books = generate_order_books(changed_levels)
+    rows = []
+
+    def consume_full_books():
+      del rows[:]
+      for order_book in order_books:
+        for side in ['bids', 'asks']:
+          for price, quantity in order_book[side]:
+            rows.append((order_book['instrument_id'], side, price, quantity))
+
+    def consume_deltas():
+      del rows[:]
+      differ = OrderBookDiffer()
+      for order_book in order_books:
+        order_book_delta = differ.diff(order_book)
+        if order_book_delta is not None:
+          for side, price, _, quantity in order_book_delta['changes']:
+            rows.append((order_book_delta['instrument_id'], side, price, quantity))
+
+    differ = OrderBookDiffer()
+    diff_seconds = timeit.timeit(
+      lambda: [differ.diff(order_book) for order_book in order_books], number=1
+    )
+    full_seconds = timeit.timeit(consume_full_books, number=1)
+    full_rows = len(rows)
+    delta_seconds = timeit.timeit(consume_deltas, number=1)
+    delta_rows = len(rows)
+    print(
+      '%2d changed levels: diff %5.2f us/update   full books: %5.2f us, %d rows/update   '
+      'deltas: %5.2f us, %.1f rows/update' % (
+        changed_levels, diff_seconds / UPDATES * 1e6, full_seconds / UPDATES * 1e6,
+        full_rows // UPDATES, delta_seconds / UPDATES * 1e6, float(delta_rows) / UPDATES
+      )
+    )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,126 @@
+"""
+Compares tracking live orders the way a bot usually does it - a dict of order dicts by
+client_order_id, with aggregates computed by scanning it - with OrderManager, for 2000 live orders
+over 50 instruments: order_placed, order_filled and order_cancelled messages, each followed by the
+queries a quoting strategy makes (open quantity and best own price of the side, quantity at the
+price of the order).
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_order_manager.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+from decimal import Decimal
+
+from quedex_api import OrderManager
+
+INSTRUMENTS = 50
+ORDERS = 2000
+EVENTS = 5000
+
+
+class DictOrders(object):
+  def __init__(self):
+    self.orders = {}
+
+  def on_order_placed(self, order_placed):
+    self.orders[order_placed['client_order_id']] = dict(
+      order_placed, limit_price=Decimal(order_placed['limit_price'])
+    )
+
+  def on_order_filled(self, order_filled):
+    order = self.orders[order_filled['client_order_id']]
+    order['quantity'] = order_filled['leaves_order_quantity']
+    if not order['quantity']:
+      del self.orders[order_filled['client_order_id']]
+
+  def on_order_cancelled(self, order_cancelled):
+    self.orders.pop(order_cancelled['client_order_id'], None)
+
+  def quantity(self, instrument_id, side):
+    return sum(
+      order['quantity'] for order in self.orders.values()
+      if order['instrument_id'] == instrument_id and order['side'] == side
+    )
+
+  def best_price(self, instrument_id, side):
+    prices = [
+      order['limit_price'] for order in self.orders.values()
+      if order['instrument_id'] == instrument_id and order['side'] == side
+    ]
+    if not prices:
+      return None
+    return max(prices) if side == 'buy' else min(prices)
+
+  def quantity_at(self, instrument_id, side, price):
+    price = Decimal(price)
+    return sum(
+      order['quantity'] for order in self.orders.values()
+      if order['instrument_id'] == instrument_id and order['side'] == side
+      and order['limit_price'] == price
+    )
+
+
+def generate_events():
+  random.seed(0)
+  live = {}
+  next_id = [1]
+
+  def place():
+    order = {
+      'type': 'order_placed', 'client_order_id': str(next_id[0]),
+      'instrument_id': str(random.randrange(INSTRUMENTS)),
+      'limit_price': '0.%08d' % random.randint(40000, 40100),
+      'side': random.choice(['buy', 'sell']), 'quantity': 100,
+    }
+    next_id[0] += 1
+    live[order['client_order_id']] = order
+    return order
+
+  welcome_pack = [place() for _ in range(ORDERS)]
+  events = []
+  for _ in range(EVENTS):
+    kind = random.random()
+    if kind < 0.4 or len(live) < ORDERS // 2:
+      events.append(place())
+    elif kind < 0.8:
+      order = live[random.choice(list(live))]
+      order['quantity'] = max(order['quantity'] - random.randint(1, 60), 0)
+      events.append({
+        'type': 'order_filled', 'client_order_id': order['client_order_id'],
+        'trade_price': order['limit_price'], 'trade_quantity': 1,
+        'leaves_order_quantity': order['quantity'], 'order': order,
+      })
+      if not order['quantity']:
+        del live[order['client_order_id']]
+    else:
+      order = live.pop(random.choice(list(live)))
+      events.append({
+        'type': 'order_cancelled', 'client_order_id': order['client_order_id'], 'order': order,
+      })
+  return welcome_pack, events
+
+
+def run(tracker, welcome_pack, events):
+  for order_placed in welcome_pack:
+    tracker.on_order_placed(order_placed)
+  for event in events:
+    order = event.get('order', event)
+    getattr(tracker, 'on_' + event['type'])(event)
+    tracker.quantity(order['instrument_id'], order['side'])
+    tracker.best_price(order['instrument_id'], order['side'])
+    tracker.quantity_at(order['instrument_id'], order['side'], order['limit_price'])
+
+
+def main():
+  welcome_pack, events = generate_events()
+  print('%d live orders, per message with queries' % ORDERS)
+  for name, tracker_class in [('dict of orders', DictOrders), ('OrderManager', OrderManager)]:
+    seconds = timeit.timeit(lambda: run(tracker_class(), welcome_pack, events), number=1)
+    print('  %-15s %9.2f us' % (name, seconds / (ORDERS + EVENTS) * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,109 @@
+"""
+Measures MarketStream.on_message with 250 instruments and 5 strategies, each interested in quotes
+and order_book of a single instrument: strategies added without a scope, filtering instruments
+themselves, compared with strategies subscribed to their instruments (add_listener with
+instrument_ids), for which messages of the other instruments are neither decoded nor dispatched.
+Market data is not verified (VerificationPolicy.only_types), as the cost of verification would
+hide that of the rest.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_subscriptions.py
+"""
+from __future__ import print_function
+
+import json
+import random
+import timeit
+
+import market_stream_fixtures
+from quedex_api import Exchange, MarketStream, MarketStreamListener, VerificationPolicy
+
+INSTRUMENTS = 250
+STRATEGIES = 5
+LEVELS = 10
+MESSAGES = 20000
+
+
+class Strategy(MarketStreamListener):
+  def __init__(self, instrument_id, filters):
+    self.instrument_id = instrument_id
+    self.filters = filters
+    self.count = 0
+
+  def on_order_book(self, order_book):
+    if self.filters and order_book['instrument_id'] != self.instrument_id:
+      return
+    self.count += 1
+
+  def on_quotes(self, quotes):
+    if self.filters and quotes['instrument_id'] != self.instrument_id:
+      return
+    self.count += 1
+
+
+def generate_messages():
+  # the signature of a fixture is reused, market data is not verified
+  template = json.loads(market_stream_fixtures.order_book_str)
+  header, _, signature = template['data'].partition('{')
+  signature = signature[signature.index('-----BEGIN PGP SIGNATURE-----'):]
+  random.seed(0)
+  messages = []
+  for i in range(MESSAGES):
+    instrument_id = str(i % INSTRUMENTS)
+    mid = random.randint(40000, 45000)
+    if random.random() < 0.5:
+      message = {
+        'type': 'order_book', 'instrument_id': instrument_id,
+        'bids': [['0.%08d' % (mid - 1 - level), random.randint(1, 100)] for level in range(LEVELS)],
+        'asks': [['0.%08d' % (mid + 1 + level), random.randint(1, 100)] for level in range(LEVELS)],
+      }
+    else:
+      message = {
+        'type': 'quotes', 'instrument_id': instrument_id, 'last': '0.%08d' % mid,
+        'last_quantity': 1, 'bid': '0.%08d' % (mid - 1), 'bid_quantity': 10,
+        'ask': '0.%08d' % (mid + 1), 'ask_quantity': 10, 'volume': 1000, 'open_interest': 100,
+        'tap': None, 'lower_limit': None, 'upper_limit': None,
+      }
+    cleartext = json.dumps(message, indent=2)
+    messages.append(json.dumps({'type': 'data', 'data': header + cleartext + '\n' + signature}))
+  return messages
+
+
+def create_market_stream(subscribe):
+  exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+  market_stream = MarketStream(
+    exchange, verification_policy=VerificationPolicy.only_types('instrument_data')
+  )
+  strategies = []
+  for i in range(STRATEGIES):
+    instrument_id = str(i * (INSTRUMENTS // STRATEGIES))
+    strategy = Strategy(instrument_id, filters=not subscribe)
+    market_stream.add_listener(strategy, instrument_ids=[instrument_id] if subscribe else None)
+    strategies.append(strategy)
+  return market_stream, strategies
+
+
+def main():
+  messages = generate_messages()
+  print('%d instruments, %d strategies of one instrument each, per message' % (
+    INSTRUMENTS, STRATEGIES
+  ))
+  for name, subscribe in [('filtered by strategies', False), ('subscriptions', True)]:
+    market_stream, strategies = create_market_stream(subscribe)
+
+    def run():
+      for message in messages:
+        market_stream.on_message(message)
+
+    seconds = timeit.timeit(run, number=1) / MESSAGES
+    print('  %-22s %7.2f us (delivered %d, skipped %s, undecoded %d)' % (
+      name,
+      seconds * 1e6,
+      sum(strategy.count for strategy in strategies),
+      market_stream.skipped_counts,
+      market_stream.skipped_undecoded_count,
+    ))
+
+
+if __name__ == '__main__':
+  main()
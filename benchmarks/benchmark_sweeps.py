@@ -0,0 +1,68 @@
+"""
+Compares VWAP and "quantity up to price" queries answered by a linear walk over the string price
+lists of an order_book message (with Decimal) with the binary searches of OrderBook, for books of
+10, 50 and 200 levels per side.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_sweeps.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+from decimal import Decimal
+
+from quedex_api import OrderBookStore
+
+ITERATIONS = 5000
+
+
+def walk_vwap(levels, quantity):
+  remaining = quantity
+  notional = Decimal(0)
+  for price, level_quantity in levels:
+    filled = min(remaining, level_quantity)
+    notional += Decimal(price) * filled
+    remaining -= filled
+    if not remaining:
+      return notional / quantity
+  return None
+
+
+def walk_quantity_up_to(levels, price):
+  quantity = 0
+  for level_price, level_quantity in levels:
+    if Decimal(level_price) > price:
+      break
+    quantity += level_quantity
+  return quantity
+
+
+def main():
+  random.seed(0)
+  for depth in [10, 50, 200]:
+    asks = [['0.%08d' % (41000 + level), random.randint(1, 100)] for level in range(depth)]
+    store = OrderBookStore()
+    store.on_instrument_data(
+      {'type': 'instrument_data', 'data': {'71': {'tick_size': '0.00000001'}}}
+    )
+    store.on_order_book({'type': 'order_book', 'instrument_id': '71', 'bids': [], 'asks': asks})
+    book = store.book('71')
+    quantity = sum(level[1] for level in asks) * 3 // 4
+    price = Decimal(asks[depth * 3 // 4][0])
+    price_ticks = 41000 + depth * 3 // 4
+    queries = [
+      ('vwap', lambda: walk_vwap(asks, quantity), lambda: book.vwap('ask', quantity)),
+      ('quantity up to', lambda: walk_quantity_up_to(asks, price),
+       lambda: book.quantity_up_to('ask', price_ticks)),
+    ]
+    for name, walk, search in queries:
+      walk_seconds = timeit.timeit(walk, number=ITERATIONS) / ITERATIONS
+      search_seconds = timeit.timeit(search, number=ITERATIONS) / ITERATIONS
+      print('%3d levels %-15s walk: %7.2f us   OrderBook: %5.2f us' % (
+        depth, name, walk_seconds * 1e6, search_seconds * 1e6
+      ))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,95 @@
+"""
+Compares several strategies each recomputing basis, carry and implied rate of all futures from
+dicts of the latest quotes and spot on every quotes and spot_data message with a single
+TermStructure updating only the affected rows, which the strategies then read from its curve.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_term_structure.py
+"""
+from __future__ import print_function
+
+import math
+import random
+import timeit
+
+import market_stream_fixtures
+from quedex_api import TermStructure
+from quedex_api.option_pricing import MILLIS_PER_YEAR
+
+STRATEGIES = 4
+UPDATES = 20000
+NOW = 1499990400000 - 10 * 24 * 3600 * 1000
+
+
+def generate_messages(futures_ids):
+  random.seed(0)
+  messages = []
+  for _ in range(UPDATES):
+    if random.random() < 0.1:
+      spot_index = '0.%08d' % random.randint(39990, 40010)
+      messages.append({'type': 'spot_data', 'spot_data': {'USD': {'spot_index': spot_index}}})
+    else:
+      mid = random.randint(40000, 40600)
+      messages.append({
+        'type': 'quotes', 'instrument_id': random.choice(futures_ids), 'bid': '0.%08d' % (mid - 1),
+        'bid_quantity': 10, 'ask': '0.%08d' % (mid + 1), 'ask_quantity': 10, 'last': None,
+        'last_quantity': 0, 'volume': 0, 'open_interest': 0,
+      })
+  return messages
+
+
+def compute_curve(futures, latest, spot):
+  # what every strategy does without TermStructure
+  curve = []
+  for instrument in futures:
+    quotes = latest.get(instrument.instrument_id)
+    if quotes is None or spot is None:
+      continue
+    mid = (float(quotes['bid']) + float(quotes['ask'])) / 2
+    years = (instrument.expiration_date - NOW) / MILLIS_PER_YEAR
+    curve.append((
+      instrument.expiration_date, mid - spot, (mid - spot) / spot / years,
+      math.log(mid / spot) / years,
+    ))
+  return curve
+
+
+def main():
+  instrument_data = market_stream_fixtures.load_instrument_data()
+  term_structure = TermStructure(clock=lambda: NOW)
+  term_structure.on_instrument_data(instrument_data)
+  futures = [instrument for instrument in term_structure.registry if instrument.type == 'futures']
+  messages = generate_messages([instrument.instrument_id for instrument in futures])
+
+  def recompute_per_strategy():
+    latest = {}
+    spot = None
+    for message in messages:
+      if message['type'] == 'quotes':
+        latest[message['instrument_id']] = message
+      else:
+        spot = float(message['spot_data']['USD']['spot_index'])
+      for _ in range(STRATEGIES):
+        curve = compute_curve(futures, latest, spot)
+        curve[-1:]
+
+  def shared_term_structure():
+    for message in messages:
+      if message['type'] == 'quotes':
+        term_structure.on_quotes(message)
+      else:
+        term_structure.on_spot_data(message)
+      for _ in range(STRATEGIES):
+        curve = term_structure.curve('USD')
+        curve[-1]['implied_rate']
+
+  print('%d strategies, per message' % STRATEGIES)
+  for name, run in [
+    ('recompute from dicts:', recompute_per_strategy), ('TermStructure:', shared_term_structure)
+  ]:
+    seconds = timeit.timeit(run, number=1)
+    print('  %-21s %6.2f us' % (name, seconds / UPDATES * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,128 @@
+"""
+Measures the cost of prices per message for several listeners: each of them parsing the decimal
+strings of order_book, quotes and trade messages (to Decimal or to float) compared with
+MarketStream in ticks mode, which converts them once, through the caches of a TickTable, to
+integer numbers of ticks the listeners read as they are. Also compares formatting the limit
+prices of outgoing orders from Decimal with formatting them from ticks.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_ticks_mode.py
+"""
+from __future__ import print_function
+
+import copy
+import random
+import timeit
+from decimal import Decimal
+
+from quedex_api import TickTable
+
+LISTENERS = 3
+INSTRUMENTS = 50
+LEVELS = 10
+UPDATES = 20000
+
+
+def generate_messages():
+  # prices of every instrument walk randomly by a few ticks from update to update
+  random.seed(0)
+  mids = [random.randint(40000, 45000) for _ in range(INSTRUMENTS)]
+  messages = []
+  for i in range(UPDATES):
+    instrument = i % INSTRUMENTS
+    mids[instrument] += random.randint(-2, 2)
+    mid = mids[instrument]
+    kind = random.random()
+    if kind < 0.6:
+      messages.append({
+        'type': 'order_book',
+        'instrument_id': str(instrument),
+        'bids': [['0.%08d' % (mid - 1 - level), random.randint(1, 100)] for level in range(LEVELS)],
+        'asks': [['0.%08d' % (mid + 1 + level), random.randint(1, 100)] for level in range(LEVELS)],
+      })
+    elif kind < 0.9:
+      messages.append({
+        'type': 'quotes', 'instrument_id': str(instrument), 'last': '0.%08d' % mid,
+        'last_quantity': 1, 'bid': '0.%08d' % (mid - 1), 'bid_quantity': 10,
+        'ask': '0.%08d' % (mid + 1), 'ask_quantity': 10, 'volume': 1000, 'open_interest': 100,
+        'tap': '0.%08d' % mid, 'lower_limit': '0.%08d' % (mid - 4000),
+        'upper_limit': '0.%08d' % (mid + 4000),
+      })
+    else:
+      messages.append({
+        'type': 'trade', 'instrument_id': str(instrument), 'trade_id': str(i), 'timestamp': 0,
+        'price': '0.%08d' % mid, 'quantity': 1, 'liquidity_provider': 'buyer',
+      })
+  return messages
+
+
+def read_prices(message, parse):
+  # what a listener does with the prices of a message
+  for _ in range(LISTENERS):
+    read_prices_once(message, parse)
+
+
+def read_prices_once(message, parse):
+  if message['type'] == 'order_book':
+    for price, _ in message['bids']:
+      parse(price)
+    for price, _ in message['asks']:
+      parse(price)
+  elif message['type'] == 'quotes':
+    for field in ('last', 'bid', 'ask', 'tap', 'lower_limit', 'upper_limit'):
+      parse(message[field])
+  else:
+    parse(message['price'])
+
+
+def main():
+  tick_table = TickTable()
+  tick_table.on_instrument_data({'data': dict(
+    (str(instrument), {'instrument_id': str(instrument), 'tick_size': '0.00000001'})
+    for instrument in range(INSTRUMENTS)
+  )})
+  messages = generate_messages()
+  # convert works in place, each run gets fresh copies (copying is not measured)
+  copies = [copy.deepcopy(messages) for _ in range(3)]
+
+  def parse_decimal():
+    for message in messages:
+      read_prices(message, Decimal)
+
+  def parse_float():
+    for message in messages:
+      read_prices(message, float)
+
+  def ticks_mode():
+    for message in copies.pop():
+      tick_table.convert(message)
+      read_prices(message, int)
+
+  print('prices per incoming message, %d listeners' % LISTENERS)
+  for name, parse in [
+    ('Decimal per listener:', parse_decimal), ('float per listener:', parse_float),
+    ('ticks mode (cold):', ticks_mode), ('ticks mode (warm):', ticks_mode),
+  ]:
+    seconds = timeit.timeit(parse, number=1)
+    print('  %-21s %6.2f us' % (name, seconds / UPDATES * 1e6))
+
+  limit_prices = [Decimal(random.randint(40000, 45000)).scaleb(-8) for _ in range(UPDATES)]
+  limit_ticks = [random.randint(40000, 45000) for _ in range(UPDATES)]
+
+  def format_decimal():
+    for price in limit_prices:
+      float(price) > 0
+      str(price)
+
+  def format_ticks():
+    for ticks in limit_ticks:
+      ticks > 0
+      tick_table.to_price_str('0', ticks)
+
+  print('limit price per outgoing order')
+  print('  from Decimal: %6.2f us' % (timeit.timeit(format_decimal, number=1) / UPDATES * 1e6))
+  print('  from ticks:   %6.2f us' % (timeit.timeit(format_ticks, number=1) / UPDATES * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,98 @@
+"""
+Compares computing mid, spread, microprice and imbalance from the strings of every order_book
+message (with Decimal) with TopOfBookCache, for 250 instruments whose top of book changes on
+about a fifth of the updates, and evaluating a signal over all instruments from the computed
+dicts versus from a snapshot of the cache.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_top_of_book.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+from decimal import Decimal
+
+from quedex_api import TopOfBookCache
+
+INSTRUMENTS = 250
+LEVELS = 10
+UPDATES = 20000
+
+
+def generate_order_books():
+  random.seed(0)
+  books = []
+  for instrument in range(INSTRUMENTS):
+    mid = random.randint(40000, 45000)
+    books.append((
+      [['0.%08d' % (mid - 1 - level), random.randint(1, 100)] for level in range(LEVELS)],
+      [['0.%08d' % (mid + 1 + level), random.randint(1, 100)] for level in range(LEVELS)],
+    ))
+  order_books = []
+  for i in range(UPDATES):
+    instrument = i % INSTRUMENTS
+    bids, asks = books[instrument]
+    bids, asks = [list(level) for level in bids], [list(level) for level in asks]
+    # most updates happen deeper in the book
+    side = random.choice([bids, asks])
+    side[0 if random.random() < 0.2 else random.randint(1, LEVELS - 1)][1] = random.randint(1, 100)
+    books[instrument] = (bids, asks)
+    order_books.append(
+      {'type': 'order_book', 'instrument_id': str(instrument), 'bids': bids, 'asks': asks}
+    )
+  return order_books
+
+
+def compute(order_book):
+  bid, bid_quantity = Decimal(order_book['bids'][0][0]), order_book['bids'][0][1]
+  ask, ask_quantity = Decimal(order_book['asks'][0][0]), order_book['asks'][0][1]
+  return {
+    'mid': (bid + ask) / 2,
+    'spread': ask - bid,
+    'microprice': (bid * ask_quantity + ask * bid_quantity) / (bid_quantity + ask_quantity),
+    'imbalance': Decimal(bid_quantity - ask_quantity) / (bid_quantity + ask_quantity),
+  }
+
+
+def main():
+  order_books = generate_order_books()
+  computed = {}
+  cache = TopOfBookCache()
+
+  def update_computed():
+    for order_book in order_books:
+      computed[order_book['instrument_id']] = compute(order_book)
+
+  def update_cache():
+    for order_book in order_books:
+      cache.on_order_book(order_book)
+
+  computed_seconds = timeit.timeit(update_computed, number=1)
+  cache_seconds = timeit.timeit(update_cache, number=1)
+  print('updates')
+  print('  per message:    %6.2f us/update' % (computed_seconds / UPDATES * 1e6))
+  print('  TopOfBookCache: %6.2f us/update (%d of %d skipped)' % (
+    cache_seconds / UPDATES * 1e6, cache.skipped_count, UPDATES
+  ))
+
+  def signal_from_dicts():
+    return [
+      instrument_id for instrument_id, values in computed.items()
+      if values['spread'] / values['mid'] > Decimal('0.0001')
+      and values['imbalance'] > Decimal('0.2')
+    ]
+
+  def signal_from_snapshot():
+    snapshot = cache.snapshot()
+    return (snapshot['spread'] / snapshot['mid'] > 0.0001) & (snapshot['imbalance'] > 0.2)
+
+  iterations = 1000
+  print('signal over %d instruments' % INSTRUMENTS)
+  for name, signal in [('dicts', signal_from_dicts), ('snapshot', signal_from_snapshot)]:
+    seconds = timeit.timeit(signal, number=iterations) / iterations
+    print('  %-15s %6.2f us' % (name + ':', seconds * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,108 @@
+"""
+Compares the dicts delivered by default with the typed messages of quedex_api.messages
+(typed_messages=True): memory retained per message, measured with tracemalloc while keeping many
+of them alive, and construction rate, i.e. messages decoded from JSON per second without and with
+building the typed object, and with reading all fields of the typed object afterwards. Typed
+messages take over the values of the decoded dicts and parse decimal strings on first access of a
+field, so the last column includes the parsing the typed column defers.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_typed_messages.py
+"""
+from __future__ import print_function
+
+import json
+import random
+import timeit
+import tracemalloc
+
+from quedex_api.messages import AccountState, OrderBook, OrderFilled, Quotes, Trade
+
+MESSAGES = 20000
+LEVELS = 10
+
+
+def generate_messages(message_class):
+  random.seed(0)
+  messages = []
+  for i in range(MESSAGES):
+    mid = random.randint(40000, 45000)
+    if message_class is OrderBook:
+      message = {
+        'type': 'order_book', 'instrument_id': str(i % 50),
+        'bids': [['0.%08d' % (mid - 1 - level), random.randint(1, 100)] for level in range(LEVELS)],
+        'asks': [['0.%08d' % (mid + 1 + level), random.randint(1, 100)] for level in range(LEVELS)],
+      }
+    elif message_class is Quotes:
+      message = {
+        'type': 'quotes', 'instrument_id': str(i % 50), 'last': '0.%08d' % mid, 'last_quantity': 1,
+        'bid': '0.%08d' % (mid - 1), 'bid_quantity': random.randint(1, 1000),
+        'ask': '0.%08d' % (mid + 1), 'ask_quantity': random.randint(1, 1000),
+        'volume': random.randint(1000, 100000),
+        'open_interest': random.randint(1000, 100000), 'tap': '0.%08d' % mid,
+        'lower_limit': '0.%08d' % (mid - 4000), 'upper_limit': '0.%08d' % (mid + 4000),
+      }
+    elif message_class is Trade:
+      message = {
+        'type': 'trade', 'instrument_id': str(i % 50), 'trade_id': str(i),
+        'timestamp': 1499867675414 + i, 'price': '0.%08d' % mid, 'quantity': random.randint(1, 100),
+        'liquidity_provider': 'buyer',
+      }
+    elif message_class is OrderFilled:
+      message = {
+        'type': 'order_filled', 'client_order_id': str(i), 'trade_price': '0.%08d' % mid,
+        'trade_quantity': random.randint(1, 100), 'leaves_order_quantity': random.randint(0, 100),
+      }
+    else:
+      message = {
+        'type': 'account_state', 'balance': '%d.%08d' % (mid, i),
+        'free_balance': '%d.%08d' % (mid - 1, i), 'total_initial_margin': '1.%08d' % i,
+        'total_maintenance_margin': '0.%08d' % i,
+        'total_unsettled_pnl': '-0.%08d' % i, 'total_locked_for_orders': '0.%08d' % mid,
+        'total_pending_withdrawal': '0', 'account_status': 'active',
+      }
+    messages.append(json.dumps(message))
+  return messages
+
+
+def retained(build):
+  tracemalloc.start()
+  kept = build()
+  size = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return size / float(len(kept))
+
+
+def main():
+  print('%-14s %22s %42s' % ('', 'bytes per message', 'thousands of messages/s'))
+  print('%-14s %10s %11s %13s %14s %14s' % ('', 'dict', 'typed', 'dict', 'typed', 'typed, read'))
+  for message_class in (OrderBook, Quotes, Trade, OrderFilled, AccountState):
+    messages = generate_messages(message_class)
+    from_dict = message_class.from_dict
+    fields = message_class._fields
+
+    def dicts():
+      return [json.loads(message) for message in messages]
+
+    def typed():
+      return [from_dict(json.loads(message)) for message in messages]
+
+    def typed_read():
+      kept = typed()
+      for message in kept:
+        for field in fields:
+          getattr(message, field)
+      return kept
+
+    print('%-14s %10.0f %11.0f %13.0f %14.0f %14.0f' % (
+      message_class.type,
+      retained(dicts),
+      retained(typed),
+      MESSAGES / timeit.timeit(dicts, number=1) / 1000,
+      MESSAGES / timeit.timeit(typed, number=1) / 1000,
+      MESSAGES / timeit.timeit(typed_read, number=1) / 1000,
+    ))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,137 @@
+"""
+Compares a listener recomputing its derived state (exposure and best own prices per instrument)
+after every entity with one recomputing it once per message in on_batch, and rebuilding from
+on_snapshot, for a welcome pack of 2000 pending orders and for fill cascades of 20 fills. Messages
+are passed to UserStream.process_data already decrypted, as decryption costs the same for both.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_user_batches.py
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+from quedex_api import Exchange, Trader, UserStream, UserStreamListener
+
+INSTRUMENTS = 50
+ORDERS = 2000
+CASCADES = 200
+FILLS = 20
+
+
+class Book(object):
+  # the state kept by the listeners: pending orders and what is derived from them
+  def __init__(self):
+    self.orders = {}
+    self.summary = None
+
+  def apply(self, entity):
+    entity_type = entity['type']
+    if entity_type == 'order_placed':
+      self.orders[entity['client_order_id']] = dict(entity)
+    elif entity_type == 'order_filled':
+      order = self.orders[entity['client_order_id']]
+      order['quantity'] = entity['leaves_order_quantity']
+      if not order['quantity']:
+        del self.orders[entity['client_order_id']]
+
+  def recompute(self):
+    summary = {}
+    for order in self.orders.values():
+      exposure, best_buy, best_sell = summary.get(order['instrument_id'], (0, None, None))
+      price = float(order['limit_price'])
+      if order['side'] == 'buy':
+        exposure += order['quantity']
+        best_buy = price if best_buy is None else max(best_buy, price)
+      else:
+        exposure -= order['quantity']
+        best_sell = price if best_sell is None else min(best_sell, price)
+      summary[order['instrument_id']] = (exposure, best_buy, best_sell)
+    self.summary = summary
+
+
+class PerEntityListener(UserStreamListener):
+  def __init__(self):
+    self.book = Book()
+
+  def on_order_placed(self, order_placed):
+    self.book.apply(order_placed)
+    self.book.recompute()
+
+  def on_order_filled(self, order_filled):
+    self.book.apply(order_filled)
+    self.book.recompute()
+
+
+class BatchListener(UserStreamListener):
+  def __init__(self):
+    self.book = Book()
+
+  def on_batch(self, entities):
+    for entity in entities:
+      self.book.apply(entity)
+    self.book.recompute()
+
+
+class SnapshotListener(BatchListener):
+  def on_snapshot(self, orders, positions, account_state):
+    self.book = Book()
+    for order in orders:
+      self.book.apply(order)
+    self.book.recompute()
+
+  def on_batch(self, entities):
+    # the welcome pack is taken from on_snapshot
+    if self.book.summary is None:
+      return
+    super(SnapshotListener, self).on_batch(entities)
+
+
+def generate_messages():
+  random.seed(0)
+  orders = [{
+    'type': 'order_placed', 'client_order_id': str(i + 1), 'instrument_id': str(i % INSTRUMENTS),
+    'limit_price': '0.%08d' % random.randint(40000, 45000),
+    'side': random.choice(['buy', 'sell']), 'quantity': 1000,
+  } for i in range(ORDERS)]
+  welcome_pack = [{'type': 'subscribed', 'nonce': 5, 'message_nonce_group': 5}] + orders + [
+    {'type': 'account_state', 'balance': '10', 'account_status': 'active'},
+  ]
+  cascades = []
+  for _ in range(CASCADES):
+    order = random.choice(orders)
+    cascades.append([{
+      'type': 'order_filled', 'client_order_id': order['client_order_id'],
+      'trade_price': order['limit_price'], 'trade_quantity': 1, 'leaves_order_quantity': 1000,
+    } for _ in range(FILLS)])
+  return welcome_pack, cascades
+
+
+def create_user_stream(listener):
+  trader = Trader('123456789', open('keys/trader-private-key.asc', 'r').read())
+  exchange = Exchange(open('keys/quedex-public-key.asc', 'r').read(), 'wss://url')
+  user_stream = UserStream(exchange, trader)
+  # the messages are already decrypted
+  user_stream._decrypt = lambda entities: entities
+  user_stream.add_listener(listener)
+  return user_stream
+
+
+def main():
+  welcome_pack, cascades = generate_messages()
+  print('%-20s %14s %18s' % ('', 'welcome pack', 'per fill cascade'))
+  for listener_class in (PerEntityListener, BatchListener, SnapshotListener):
+    user_stream = create_user_stream(listener_class())
+    startup = timeit.timeit(lambda: user_stream.process_data({'data': welcome_pack}), number=1)
+
+    def fills():
+      for cascade in cascades:
+        user_stream.process_data({'data': cascade})
+
+    burst = timeit.timeit(fills, number=1) / CASCADES
+    print('%-20s %11.1f ms %15.1f ms' % (listener_class.__name__, startup * 1e3, burst * 1e3))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,33 @@
+"""
+Compares the per-message cost of verifying clearsigned market stream messages with pgpy and with
+ClearsignVerifier.
+
+Run from the root of the repository:
+  PYTHONPATH=.:tests python benchmarks/benchmark_verification.py
+"""
+from __future__ import print_function
+
+import json
+import timeit
+
+import market_stream_fixtures
+from quedex_api import Exchange
+from quedex_api.verification import ClearsignVerifier, PgpyVerifier
+
+ITERATIONS = 500
+
+
+def main():
+  exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+  verifiers = [('pgpy', PgpyVerifier(exchange)), ('clearsign', ClearsignVerifier(exchange))]
+  for name in ['order_book_str', 'quotes_str', 'trade_str', 'instrument_data_str']:
+    message = json.loads(getattr(market_stream_fixtures, name))['data']
+    results = []
+    for verifier_name, verifier in verifiers:
+      seconds = timeit.timeit(lambda: verifier.verify(message), number=ITERATIONS) / ITERATIONS
+      results.append('%s: %8.1f us' % (verifier_name, seconds * 1e6))
+    print('%-20s %s' % (name, '   '.join(results)))
+
+
+if __name__ == '__main__':
+  main()
@@ -1,7 +1,21 @@
+from .arbitrage import ArbitrageListener, ArbitrageScanner, VIOLATION_DTYPE
+from .conflation import ConflatingListener
 from .exchange import Exchange
+from .instruments import Instrument, InstrumentRegistry
 from .market_stream import MarketStream, MarketStreamListener
 from .market_stream_client import MarketStreamClientFactory
+from .messages import Message
+from .option_chain import OPTION_CHAIN_DTYPE, OptionChain
+from .option_pricing import OPTION_RESULT_DTYPE, OptionPricer
+from .order_manager import Order, OrderManager
+from .order_book import OrderBook, OrderBookStore
+from .order_book_diff import OrderBookDiffer
+from .term_structure import TERM_STRUCTURE_DTYPE, TermStructure
+from .ticks import TickConverter, TickTable
+from .top_of_book import TOP_OF_BOOK_DTYPE, TopOfBookCache
 from .trader import Trader
 from .user_stream import UserStream, UserStreamListener
 from .user_stream_client import UserStreamClientFactory
+from .verification import VerificationPolicy
+from .verification_pool import IngestionPool, VerificationPool
 from .keys import quedex_public_key
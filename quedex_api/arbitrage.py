@@ -0,0 +1,318 @@
+import numpy as np
+
+from .dispatch import DispatchTable
+from .instruments import InstrumentRegistry
+from .market_stream import MarketStreamListener
+from .ticks import float_price
+
+# check of a violation is the index of its name in CHECKS
+CHECKS = ('put_call_parity', 'vertical_spread', 'butterfly', 'futures_synthetic')
+PUT_CALL_PARITY, VERTICAL_SPREAD, BUTTERFLY, FUTURES_SYNTHETIC = range(len(CHECKS))
+
+VIOLATION_DTYPE = np.dtype([
+  ('check', np.int8),
+  ('is_call', np.bool_),
+  ('strike', np.float64),
+  ('other_strike', np.float64),
+  ('amount', np.float64),
+])
+
+# rows of the price matrix
+_CALL_BID, _CALL_ASK, _PUT_BID, _PUT_ASK, _FUTURES_BID, _FUTURES_ASK = range(6)
+
+# multipliers selecting calls and puts out of the rows of bids (or asks) of both
+_CALLS = np.array([[1.0], [0.0]])
+_PUTS = np.array([[0.0], [1.0]])
+
+_NO_VIOLATIONS = np.zeros(0, dtype=VIOLATION_DTYPE)
+_NO_VIOLATIONS.flags.writeable = False
+
+_LAYOUT_CACHE_SIZE = 256
+
+
+class ArbitrageListener(object):
+  def on_violations(self, underlying_symbol, expiration_date, violations):
+    """
+    Called after a scan of an expiry which found violations or whose violations found by the
+    previous scan disappeared (then violations is empty).
+
+    :param violations: read-only array of VIOLATION_DTYPE, one row per violation, ordered by check
+                       and strike:
+      - check - one of PUT_CALL_PARITY, VERTICAL_SPREAD, BUTTERFLY, FUTURES_SYNTHETIC
+      - is_call - whether calls or puts are mispriced, for VERTICAL_SPREAD and BUTTERFLY only
+      - strike - PUT_CALL_PARITY: strike at which the synthetic forward (long call, short put) is
+                 bought, VERTICAL_SPREAD: the lower strike, BUTTERFLY: the middle strike,
+                 FUTURES_SYNTHETIC: strike of the synthetic forward
+      - other_strike - PUT_CALL_PARITY: strike at which the synthetic forward is sold,
+                       VERTICAL_SPREAD: the higher strike, NaN otherwise
+      - amount - profit locked in by trading the mispricing at the best bid and ask, in BTC per 1
+                 USD of notional
+    """
+    pass
+
+
+class ArbitrageScanner(MarketStreamListener):
+  """
+  MarketStreamListener checking the quotes of the options and futures of every underlying and
+  expiration (an expiry) for violations of no-arbitrage conditions, executable at the best bid and
+  ask:
+    - put-call parity - the synthetic forwards (call - put + strike) of all strikes of an expiry
+      must be equal, so one must not be buyable below where another can be sold,
+    - vertical spreads - prices of calls must not grow and prices of puts must not fall with the
+      strike, and neither may change by more than the difference of the strikes,
+    - butterflies - prices of calls and puts must be convex in the strike,
+    - futures versus synthetic - the synthetic forwards must not be buyable below the bid or
+      sellable above the ask of the futures of the expiry.
+
+  From instrument_data it builds one matrix of the bids and asks of the calls, puts and futures
+  with a column per strike of every expiry, expiries in contiguous blocks ordered by strike, and
+  quotes update single cells in place and mark their expiry as changed. scan() runs all the checks
+  over all changed expiries in a single vectorized pass and passes the violations to the
+  listeners, so it is cheap to call after every message.
+  """
+
+  def __init__(self, registry=None, tolerance=0.0, tick_table=None):
+    """
+    :param registry: InstrumentRegistry the options and futures of each expiry are taken from, a
+                     new one if None
+    :param tolerance: amount (BTC per 1 USD of notional) a violation has to exceed to be reported,
+                      e.g. to account for fees
+    :param tick_table: TickTable of the stream if it is in ticks mode - bids and asks are then read
+                       as ticks of the instrument
+    """
+    self.registry = registry if registry is not None else InstrumentRegistry()
+    self.tick_table = tick_table
+    self.tolerance = tolerance
+    self.scanned_count = 0
+    self._dispatch_table = DispatchTable(ArbitrageListener)
+    self._registry_version = None
+    self._prices = np.zeros((6, 0), dtype=np.float64)
+    self._strikes = np.zeros(0, dtype=np.float64)
+    # (underlying symbol, expiration) -> (start, stop) of the columns of the expiry
+    self._expiries = {}
+    # instrument_id -> (row of the bid, column or slice of columns, expiry)
+    self._cells = {}
+    # instrument_id -> (bid, ask) as last quoted, to rebuild the matrix on instrument_data
+    self._quotes = {}
+    # tuple of expiries -> arrays describing the columns of the expiries, see _layout
+    self._layouts = {}
+    self._violations = {}
+    self._dirty = set()
+
+  def add_listener(self, listener):
+    self._dispatch_table.add(listener)
+
+  def remove_listener(self, listener):
+    self._dispatch_table.remove(listener)
+
+  def on_instrument_data(self, instrument_data):
+    self.registry.on_instrument_data(instrument_data)
+    if self.registry.version == self._registry_version:
+      return
+    self._registry_version = self.registry.version
+    options = sorted(
+      (instrument for instrument in self.registry
+       if instrument.is_option and instrument.strike is not None
+       and instrument.expiration_date is not None),
+      key=lambda instrument: (
+        instrument.underlying_symbol, instrument.expiration_date, instrument.strike
+      )
+    )
+    columns = {}
+    strikes = []
+    self._expiries = {}
+    for instrument in options:
+      expiry = (instrument.underlying_symbol, instrument.expiration_date)
+      if (expiry, instrument.strike) not in columns:
+        column = columns[(expiry, instrument.strike)] = len(strikes)
+        strikes.append(float(instrument.strike))
+        start, _ = self._expiries.get(expiry, (column, column))
+        self._expiries[expiry] = (start, column + 1)
+    self._cells = {}
+    for instrument in options:
+      expiry = (instrument.underlying_symbol, instrument.expiration_date)
+      row = _CALL_BID if instrument.is_call else _PUT_BID
+      self._cells[instrument.instrument_id] = (row, columns[(expiry, instrument.strike)], expiry)
+    for instrument in self.registry:
+      expiry = (instrument.underlying_symbol, instrument.expiration_date)
+      if not instrument.is_option and expiry in self._expiries:
+        self._cells[instrument.instrument_id] = (
+          _FUTURES_BID, slice(*self._expiries[expiry]), expiry
+        )
+    self._prices = np.full((6, len(strikes)), np.nan)
+    self._strikes = np.array(strikes, dtype=np.float64)
+    # the last bid and ask of every instrument are replayed into the new price matrix
+    quotes = self._quotes
+    self._quotes = {}
+    for instrument_id, (bid, ask) in quotes.items():
+      self._update(instrument_id, bid, ask)
+    self._layouts = {}
+    self._violations = dict(
+      (expiry, violations) for expiry, violations in self._violations.items()
+      if expiry in self._expiries
+    )
+    self._dirty = set(self._expiries)
+
+  def on_quotes(self, quotes):
+    expiry = self._update(quotes['instrument_id'], quotes['bid'], quotes['ask'])
+    if expiry is not None:
+      self._dirty.add(expiry)
+
+  def _update(self, instrument_id, bid, ask):
+    cell = self._cells.get(instrument_id)
+    if cell is None or self._quotes.get(instrument_id) == (bid, ask):
+      return None
+    self._quotes[instrument_id] = (bid, ask)
+    row, columns, expiry = cell
+    self._prices[row, columns] = float_price(bid, self.tick_table, instrument_id)
+    self._prices[row + 1, columns] = float_price(ask, self.tick_table, instrument_id)
+    return expiry
+
+  def scan(self):
+    """
+    Checks all expiries whose quotes changed since the previous scan.
+
+    :return: number of violations found
+    """
+    if not self._dirty:
+      return 0
+    expiries = tuple(sorted(self._dirty))
+    self._dirty = set()
+    layout = self._layouts.get(expiries)
+    if layout is None:
+      if len(self._layouts) >= _LAYOUT_CACHE_SIZE:
+        self._layouts.clear()
+      layout = self._layouts[expiries] = self._layout(expiries)
+    columns = layout[0]
+    prices = self._prices if columns is None else self._prices[:, columns]
+    found = _find_violations(prices, layout, self.tolerance)
+    self.scanned_count += len(expiries)
+    handlers = self._dispatch_table.handlers('on_violations')
+    if found is None:
+      for expiry in expiries:
+        previous = self._violations.get(expiry)
+        self._violations[expiry] = _NO_VIOLATIONS
+        if previous is not None and len(previous):
+          for handler in handlers:
+            handler(expiry[0], expiry[1], _NO_VIOLATIONS)
+      return 0
+    violations, violation_blocks = found
+    violations.flags.writeable = False
+    bounds = np.searchsorted(violation_blocks, np.arange(len(expiries) + 1))
+    for block, expiry in enumerate(expiries):
+      expiry_violations = violations[bounds[block]:bounds[block + 1]]
+      previous = self._violations.get(expiry)
+      self._violations[expiry] = expiry_violations
+      if len(expiry_violations) or (previous is not None and len(previous)):
+        for handler in handlers:
+          handler(expiry[0], expiry[1], expiry_violations)
+    return len(violations)
+
+  def _layout(self, expiries):
+    if len(expiries) == len(self._expiries):
+      # the columns of all expiries are ordered as the sorted expiries
+      columns = None
+      strikes = self._strikes
+    else:
+      columns = np.concatenate([np.arange(*self._expiries[expiry]) for expiry in expiries])
+      strikes = self._strikes[columns]
+    lengths = np.array(
+      [stop - start for start, stop in (self._expiries[expiry] for expiry in expiries)]
+    )
+    blocks = np.repeat(np.arange(len(expiries)), lengths)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      weights = (strikes[2:] - strikes[1:-1]) / (strikes[2:] - strikes[:-2])
+    return (
+      columns,
+      strikes,
+      blocks,
+      np.cumsum(lengths) - lengths,
+      # adjacent strikes of the same expiry
+      strikes[1:] - strikes[:-1],
+      blocks[:-1] == blocks[1:],
+      # three adjacent strikes of the same expiry, the wings weighted to replicate the middle strike
+      weights,
+      1 - weights,
+      blocks[:-2] == blocks[2:],
+    )
+
+  def expirations(self, underlying_symbol=None):
+    """
+    :return: sorted list of tuples (<underlying symbol>, <expiration in millis>) of all expiries
+    """
+    return sorted(expiry for expiry in self._expiries if underlying_symbol in (None, expiry[0]))
+
+  def violations(self, underlying_symbol, expiration_date):
+    """
+    :return: read-only array of VIOLATION_DTYPE with the violations of the expiry found by the last
+             scan, see ArbitrageListener.on_violations
+    """
+    return self._violations.get((underlying_symbol, expiration_date), _NO_VIOLATIONS)
+
+
+def _find_violations(prices, layout, tolerance):
+  """
+  :return: None if there are no violations, otherwise tuple (<array of VIOLATION_DTYPE ordered by
+           expiry, check and strike>, <array of indexes of the expiries (blocks) of the violations>)
+  """
+  _, strikes, blocks, starts, widths, pairs, weights, complement_weights, triples = layout
+  call_bids, call_asks, put_bids, put_asks, futures_bids, futures_asks = prices
+  # NaN (missing quotes) propagates through the arithmetic and is never greater than tolerance
+  forward_asks = strikes + call_asks - put_bids
+  forward_bids = strikes + call_bids - put_asks
+  best_forward_bids = np.fmax.reduceat(forward_bids, starts)
+  parity = best_forward_bids[blocks] - forward_asks
+  futures = np.fmax(futures_bids - forward_asks, forward_bids - futures_asks)
+  # calls in the first row, puts in the second
+  bids = prices[_CALL_BID:_FUTURES_BID:2]
+  asks = prices[_CALL_ASK:_FUTURES_BID:2]
+  rising = bids[:, 1:] - asks[:, :-1]
+  falling = bids[:, :-1] - asks[:, 1:]
+  verticals = np.fmax(rising - _PUTS * widths, falling - _CALLS * widths)
+  butterflies = bids[:, 1:-1] - weights * asks[:, :-2] - complement_weights * asks[:, 2:]
+
+  found_parity = parity > tolerance
+  found_verticals = (verticals > tolerance) & pairs
+  found_butterflies = (butterflies > tolerance) & triples
+  found_futures = futures > tolerance
+  if not (found_parity.any() or found_verticals.any() or found_butterflies.any()
+          or found_futures.any()):
+    return None
+
+  no_strikes = np.full(len(strikes), np.nan)
+  parity_columns = np.flatnonzero(found_parity)
+  # the first column of each expiry with its best forward bid - expiries without any (no put and
+  # call quoted at one strike) are left at 0, they have no parity violations to point at it
+  best = np.flatnonzero(forward_bids == best_forward_bids[blocks])
+  best_blocks, first_best = np.unique(blocks[best], return_index=True)
+  best_columns = np.zeros(len(starts), dtype=np.int64)
+  best_columns[best_blocks] = best[first_best]
+  best_columns = best_columns[blocks[parity_columns]]
+  vertical_kinds, vertical_columns = np.nonzero(found_verticals)
+  butterfly_kinds, butterfly_columns = np.nonzero(found_butterflies)
+  futures_columns = np.flatnonzero(found_futures)
+  parts = [
+    (PUT_CALL_PARITY, False, parity[parity_columns], blocks[parity_columns],
+     strikes[parity_columns], strikes[best_columns]),
+    (VERTICAL_SPREAD, vertical_kinds == 0, verticals[vertical_kinds, vertical_columns],
+     blocks[vertical_columns], strikes[vertical_columns], strikes[vertical_columns + 1]),
+    (BUTTERFLY, butterfly_kinds == 0, butterflies[butterfly_kinds, butterfly_columns],
+     blocks[butterfly_columns], strikes[butterfly_columns + 1], no_strikes[butterfly_columns]),
+    (FUTURES_SYNTHETIC, False, futures[futures_columns], blocks[futures_columns],
+     strikes[futures_columns], no_strikes[futures_columns]),
+  ]
+  violations = np.zeros(sum(len(part[2]) for part in parts), dtype=VIOLATION_DTYPE)
+  violation_blocks = np.zeros(len(violations), dtype=np.int64)
+  start = 0
+  for check, is_call, amounts, amount_blocks, amount_strikes, other_strikes in parts:
+    stop = start + len(amounts)
+    violations['check'][start:stop] = check
+    violations['is_call'][start:stop] = is_call
+    violations['strike'][start:stop] = amount_strikes
+    violations['other_strike'][start:stop] = other_strikes
+    violations['amount'][start:stop] = amounts
+    violation_blocks[start:stop] = amount_blocks
+    start = stop
+  # stable, so that the violations of an expiry stay ordered by check and strike
+  order = np.argsort(violation_blocks, kind='mergesort')
+  return violations[order], violation_blocks[order]
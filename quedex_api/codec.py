@@ -0,0 +1,104 @@
+import json
+
+try:
+  string_types = basestring
+except NameError:
+  string_types = str
+
+
+class JsonCodec(object):
+  """
+  Decodes and encodes messages of the streams with the json module of the standard library. Other
+  codecs decode to the same dicts, lists, strings and integers.
+
+  Codecs able to decode straight from a buffer (bytes, bytearray, memoryview) of UTF-8 also have a
+  loads_buffer method, it is None for the others.
+  """
+  name = 'json'
+  loads_buffer = None
+
+  def loads(self, message_str):
+    return json.loads(message_str)
+
+  def dumps(self, entity):
+    return json.dumps(entity)
+
+
+class OrjsonCodec(JsonCodec):
+  name = 'orjson'
+
+  def __init__(self):
+    import orjson
+    self._orjson = orjson
+
+  def loads(self, message_str):
+    return self._orjson.loads(message_str)
+
+  def loads_buffer(self, message_buffer):
+    return self._orjson.loads(message_buffer)
+
+  def dumps(self, entity):
+    return self._orjson.dumps(entity).decode('utf8')
+
+
+class SimdjsonCodec(JsonCodec):
+  # encoding is not what simdjson is good at, so it is left to the standard library
+  name = 'simdjson'
+
+  def __init__(self):
+    import simdjson
+    self._simdjson = simdjson
+
+  def loads(self, message_str):
+    return self._simdjson.loads(message_str)
+
+  def loads_buffer(self, message_buffer):
+    return self._simdjson.loads(message_buffer)
+
+
+class UjsonCodec(JsonCodec):
+  name = 'ujson'
+
+  def __init__(self):
+    import ujson
+    self._ujson = ujson
+
+  def loads(self, message_str):
+    return self._ujson.loads(message_str)
+
+  def dumps(self, entity):
+    return self._ujson.dumps(entity)
+
+
+# from the fastest
+CODECS = [OrjsonCodec, SimdjsonCodec, UjsonCodec, JsonCodec]
+
+
+def available_codecs():
+  """
+  :return: list of names of codecs whose libraries are installed, the fastest first
+  """
+  names = []
+  for codec_class in CODECS:
+    try:
+      codec_class()
+    except ImportError:
+      continue
+    names.append(codec_class.name)
+  return names
+
+
+def get_codec(codec='json'):
+  """
+  :param codec: name of a codec ("json", "orjson", "simdjson", "ujson" - the faster ones have to
+                be installed separately, see available_codecs), "auto" for the fastest installed
+                one or a codec object with loads and dumps methods, returned as is
+  """
+  if not isinstance(codec, string_types):
+    return codec
+  if codec == 'auto':
+    codec = available_codecs()[0]
+  for codec_class in CODECS:
+    if codec_class.name == codec:
+      return codec_class()
+  raise ValueError('Unknown codec: %s' % codec)
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+import itertools
+
+from .dispatch import DispatchTable
+from .market_stream import MarketStreamListener, dispatch_message
+from .order_book_diff import OrderBookDiffer
+
+
+class ConflatingListener(MarketStreamListener):
+  """
+  Wraps a MarketStreamListener which cannot keep up with the market stream. Messages are queued
+  instead of being passed on, and of the order_book and quotes messages of an instrument only the
+  newest one is kept - an older one still queued is dropped (coalesced) and the newest one takes
+  its place at the end of the queue, so that the wrapped listener never sees messages out of order.
+  trade, session_state, instrument_data and any other messages are never conflated.
+
+  Add the wrapper (not the wrapped listener) to MarketStream and call flush whenever the wrapped
+  listener is ready to process messages, e.g. from twisted LoopingCall. on_ready, on_error and
+  on_disconnect are passed on immediately. If the wrapped listener implements on_order_book_delta,
+  deltas are computed between the books it actually receives.
+
+  A retraction (on_verification_failed) of a message still queued drops the message, of a message
+  coalesced away is dropped itself, as the wrapped listener has never seen the message - coalesced
+  messages are remembered for that, up to coalesced_memory of the most recent ones (retractions of
+  older ones are passed on).
+
+  The wrapper reads messages as dicts, a MarketStream with typed_messages does not accept it.
+  """
+
+  CONFLATED_TYPES = ('order_book', 'quotes')
+
+  def __init__(self, listener, coalesced_memory=4096):
+    """
+    :param coalesced_memory: number of the most recently coalesced messages remembered to drop
+                             their retractions
+    """
+    self.coalesced_memory = coalesced_memory
+    self.coalesced_count = 0
+    self.delivered_count = 0
+    self._listener = listener
+    self._dispatch_table = DispatchTable(MarketStreamListener)
+    self._dispatch_table.add(listener)
+    self._queue = OrderedDict()
+    self._sequence = itertools.count()
+    self._order_book_differ = OrderBookDiffer()
+    # id -> message coalesced away, the message is kept so that its id is not reused
+    self._coalesced = OrderedDict()
+
+  @property
+  def listener(self):
+    return self._listener
+
+  @property
+  def tick_table(self):
+    # checked by MarketStream.add_listener, AttributeError if the wrapped listener does not read
+    # prices - the property itself marks the wrapper as reading dicts
+    return self._listener.tick_table
+
+  @property
+  def pending(self):
+    """
+    Number of queued messages.
+    """
+    return len(self._queue)
+
+  def on_message(self, message):
+    message_type = message['type']
+    if message_type in self.CONFLATED_TYPES:
+      key = (message_type, message['instrument_id'])
+      coalesced = self._queue.pop(key, None)
+      if coalesced is not None:
+        self.coalesced_count += 1
+        self._coalesced[id(coalesced)] = coalesced
+        if len(self._coalesced) > self.coalesced_memory:
+          self._coalesced.popitem(last=False)
+    else:
+      key = next(self._sequence)
+    self._queue[key] = message
+
+  def flush(self, max_messages=None):
+    """
+    Passes queued messages on to the wrapped listener, oldest first.
+
+    :param max_messages: maximum number of messages to pass on, all queued messages if None
+    :return: number of messages passed on
+    """
+    delivered = 0
+    while self._queue and (max_messages is None or delivered < max_messages):
+      _, message = self._queue.popitem(last=False)
+      delivered += 1
+      dispatch_message(self._dispatch_table, self._order_book_differ, message)
+    self.delivered_count += delivered
+    return delivered
+
+  def on_verification_failed(self, message):
+    # the wrapped listener is told only about retracted messages it has received
+    message_type = message['type']
+    key = None
+    if message_type in self.CONFLATED_TYPES:
+      key = (message_type, message.get('instrument_id'))
+    if key is not None and self._queue.get(key) is message:
+      del self._queue[key]
+      return
+    for key, queued_message in self._queue.items():
+      if queued_message is message:
+        del self._queue[key]
+        return
+    if self._coalesced.pop(id(message), None) is message:
+      return
+    if message_type == 'order_book':
+      self._order_book_differ.reset([message.get('instrument_id')])
+    for handler in self._dispatch_table.handlers('on_verification_failed'):
+      handler(message)
+
+  def on_ready(self):
+    for handler in self._dispatch_table.handlers('on_ready'):
+      handler()
+
+  def on_error(self, error):
+    for handler in self._dispatch_table.handlers('on_error'):
+      handler(error)
+
+  def on_disconnect(self, message):
+    for handler in self._dispatch_table.handlers('on_disconnect'):
+      handler(message)
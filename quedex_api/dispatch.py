@@ -0,0 +1,117 @@
+class DispatchTable(object):
+  """
+  Keeps the listeners of a stream together with, per listener method name, the bound methods to be
+  called - listeners which inherit the method unchanged from the base listener class (where it is
+  a no-op) are left out. The table is rebuilt whenever a listener is added or removed, so that
+  dispatching a message is a single dictionary lookup.
+
+  A listener may be added with a scope - instrument ids and/or message types. Handlers of messages
+  are then looked up per message type and instrument id (cached the same way), a listener scoped
+  to instruments receives messages of other instruments only if they are not of any instrument
+  (e.g. spot_data).
+  """
+
+  def __init__(self, base_listener_class):
+    self._base_listener_class = base_listener_class
+    self._method_names = [name for name in dir(base_listener_class) if name.startswith('on_')]
+    self._listeners = []
+    # (instrument ids, message types) per listener, None where not limited
+    self._scopes = []
+    self._by_method_name = {}
+    self._by_message_type = {}
+    self._by_scope = {}
+    self.scoped = False
+    self.receives_all = False
+
+  @property
+  def listeners(self):
+    return list(self._listeners)
+
+  def add(self, listener, instrument_ids=None, message_types=None):
+    """
+    :param instrument_ids: optional collection of instrument ids the listener is limited to
+    :param message_types: optional collection of message types the listener is limited to
+    """
+    self._listeners.append(listener)
+    self._scopes.append((
+      frozenset(instrument_ids) if instrument_ids is not None else None,
+      frozenset(message_types) if message_types is not None else None,
+    ))
+    self._rebuild()
+
+  def remove(self, listener):
+    index = self._listeners.index(listener)
+    del self._listeners[index]
+    del self._scopes[index]
+    self._rebuild()
+
+  def handlers(self, method_name, message_type=None, instrument_id=None):
+    """
+    :param message_type: type of the message the handlers are called for - if given, listeners
+                         whose scope excludes the message are left out
+    :param instrument_id: instrument of the message, None for messages not of any instrument
+    :return: list of bound methods to be called for method_name, in the order of adding listeners
+    """
+    if message_type is not None and self.scoped:
+      key = (method_name, message_type, instrument_id)
+      handlers = self._by_scope.get(key)
+      if handlers is None:
+        handlers = self._by_scope[key] = self._collect(method_name, message_type, instrument_id)
+      return handlers
+    handlers = self._by_method_name.get(method_name)
+    if handlers is None:
+      # a method name the base listener class does not know about, e.g. a new message type
+      handlers = self._by_method_name[method_name] = self._collect(method_name)
+    return handlers
+
+  def message_handlers(self, message_type, instrument_id=None):
+    """
+    :return: list of bound methods to be called for a message of message_type, i.e. on_<type>
+    """
+    if self.scoped:
+      return self.handlers('on_' + message_type, message_type, instrument_id)
+    handlers = self._by_message_type.get(message_type)
+    if handlers is None:
+      handlers = self._by_message_type[message_type] = self.handlers('on_' + message_type)
+    return handlers
+
+  def _rebuild(self):
+    self.scoped = any(scope != (None, None) for scope in self._scopes)
+    self._by_method_name = dict((name, self._collect(name)) for name in self._method_names)
+    self._by_message_type = {}
+    self._by_scope = {}
+    # an unscoped on_message receives every message
+    self.receives_all = any(
+      scope == (None, None) and _implements(listener, 'on_message', self._base_listener_class)
+      for listener, scope in zip(self._listeners, self._scopes)
+    )
+
+  def _collect(self, method_name, message_type=None, instrument_id=None):
+    return [
+      getattr(listener, method_name) for listener, scope in zip(self._listeners, self._scopes)
+      if _implements(listener, method_name, self._base_listener_class)
+      and (message_type is None or _in_scope(scope, message_type, instrument_id))
+    ]
+
+
+def _in_scope(scope, message_type, instrument_id):
+  instrument_ids, message_types = scope
+  return (
+    (message_types is None or message_type in message_types) and
+    (instrument_ids is None or instrument_id is None or instrument_id in instrument_ids)
+  )
+
+
+def _implements(listener, method_name, base_listener_class):
+  if method_name in getattr(listener, '__dict__', {}):
+    return True
+  method = getattr(listener.__class__, method_name, None)
+  if method is None:
+    return False
+  base_method = getattr(base_listener_class, method_name, None)
+  return base_method is None or _function(method) is not _function(base_method)
+
+
+def _function(method):
+  # unbound methods in Python 2 wrap the function
+  return getattr(method, '__func__', method)
@@ -0,0 +1,101 @@
+import codecs
+import json
+import re
+from json.decoder import scanstring
+
+# the exchange sends envelopes with "type" as the first key followed by "data", if present
+_TYPE_PATTERN = re.compile(r'\s*\{\s*"type"\s*:\s*"([a-z_]*)"\s*,?')
+_DATA_PATTERN = re.compile(r'\s*"data"\s*:\s*"')
+_BYTES_TYPE_PATTERN = re.compile(_TYPE_PATTERN.pattern.encode('ascii'))
+_MESSAGE_TYPE_PATTERN = re.compile(r'"type"\s*:\s*"([a-z_]*)"')
+_INSTRUMENT_ID_PATTERN = re.compile(r'"instrument_id"\s*:\s*"([^"\\]*)"')
+
+
+def parse_envelope(message_wrapper_str, loads=json.loads, loads_buffer=None):
+  """
+  Parses the JSON envelope in which both streams wrap their messages without decoding the whole of
+  it: the type is found with a regular expression, keepalives are not decoded at all and for data
+  messages only the data string is unescaped, in place. Envelopes of any other shape are decoded
+  with loads.
+
+  :param message_wrapper_str: the envelope as str or as a buffer (bytes, bytearray or memoryview)
+                              of UTF-8 received from the WebSocket - buffers are decoded to str
+                              only if loads_buffer is not given
+  :param loads: function decoding JSON, e.g. loads of a codec
+  :param loads_buffer: optional function decoding JSON straight from a buffer, e.g. loads_buffer of
+                       a codec - if given, data messages received as buffers are decoded with it
+                       without copying the envelope to a str first
+  :return: tuple (<message type>, <message wrapper dict or None for keepalive>) - for data
+           messages the wrapper holds only "type" and "data"
+  """
+  is_buffer = is_buffer_message(message_wrapper_str)
+  type_match = (_BYTES_TYPE_PATTERN if is_buffer else _TYPE_PATTERN).match(message_wrapper_str)
+  if type_match is not None:
+    message_type = type_match.group(1)
+    if is_buffer:
+      message_type = message_type.decode('ascii')
+    if message_type == 'keepalive':
+      return message_type, None
+    if message_type == 'data':
+      if is_buffer:
+        if loads_buffer is not None:
+          return message_type, loads_buffer(message_wrapper_str)
+        message_wrapper_str = decode_message(message_wrapper_str)
+        is_buffer = False
+      data_match = _DATA_PATTERN.match(message_wrapper_str, type_match.end())
+      if data_match is not None:
+        data, _ = scanstring(message_wrapper_str, data_match.end())
+        return message_type, {'type': message_type, 'data': data}
+
+  if is_buffer:
+    if loads_buffer is not None:
+      message_wrapper = loads_buffer(message_wrapper_str)
+      return message_wrapper['type'], message_wrapper
+    message_wrapper_str = decode_message(message_wrapper_str)
+  message_wrapper = loads(message_wrapper_str)
+  return message_wrapper['type'], message_wrapper
+
+
+def peek_message(message_str):
+  """
+  Finds the type and the instrument of a message without decoding it, so that messages no listener
+  is interested in need not be decoded. Only flat messages are peeked into (e.g. order_book,
+  quotes, trade), in which "type" is a key only once - the keys of nested objects (e.g. the
+  instruments of instrument_data) might be taken for those of the message.
+
+  :param message_str: the message (cleartext of the data of the envelope) as str
+  :return: tuple (<message type>, <instrument id or None>) or None if the message is not flat or
+           its type cannot be found
+  """
+  if message_str.count('"type"') != 1:
+    return None
+  type_match = _MESSAGE_TYPE_PATTERN.search(message_str)
+  if type_match is None:
+    return None
+  instrument_id = None
+  if '"instrument_id"' in message_str:
+    if message_str.count('"instrument_id"') != 1:
+      return None
+    instrument_match = _INSTRUMENT_ID_PATTERN.search(message_str)
+    if instrument_match is None:
+      return None
+    instrument_id = instrument_match.group(1)
+  return type_match.group(1), instrument_id
+
+
+def is_buffer_message(message):
+  """
+  :return: True if the message is a buffer of UTF-8 rather than str
+  """
+  return isinstance(message, (bytes, bytearray, memoryview)) and not isinstance(message, str)
+
+
+def decode_message(message):
+  """
+  :param message: str or buffer (bytes, bytearray or memoryview) of UTF-8
+  :return: the message as str (returned as is if it already is one)
+  """
+  if not is_buffer_message(message):
+    return message
+  # utf_8_decode reads any buffer directly, without an intermediate copy to bytes
+  return codecs.utf_8_decode(message)[0]
@@ -2,8 +2,16 @@ import pgpy
 
 
 class Exchange(object):
-  def __init__(self, public_key_str, api_url):
+  def __init__(self, public_key_str, api_url, public_key_fingerprint=None):
+    """
+    :param public_key_fingerprint: optional fingerprint (hex string, spaces allowed) the parsed
+                                   public key is checked against, ValueError is raised on mismatch
+    """
     self._public_key_str = public_key_str
+    self._public_key_fingerprint = None
+    if public_key_fingerprint is not None:
+      self._public_key_fingerprint = public_key_fingerprint.replace(' ', '').upper()
+    self._public_key = None
     self.api_url = api_url
 
   @property
@@ -14,8 +22,40 @@ class Exchange(object):
   def user_stream_url(self):
     return self.api_url + '/user_stream'
 
+  @property
+  def public_key_str(self):
+    return self._public_key_str
+
   @property
   def public_key(self):
+    """
+    The parsed public key of the exchange - the key is parsed on first access and cached, call
+    invalidate_public_key to force parsing it again.
+    """
+    if self._public_key is None:
+      self._parse_key()
+    return self._public_key
+
+  @property
+  def public_key_fingerprint(self):
+    return self.public_key.fingerprint
+
+  def invalidate_public_key(self, public_key_str=None):
+    """
+    Drops the cached public key so that it is parsed again on next access.
+
+    :param public_key_str: optional new armored public key to be used from now on
+    """
+    if public_key_str is not None:
+      self._public_key_str = public_key_str
+    self._public_key = None
+
+  def _parse_key(self):
     public_key = pgpy.PGPKey()
     public_key.parse(self._public_key_str)
-    return public_key
+    expected_fingerprint = self._public_key_fingerprint
+    if expected_fingerprint is not None and str(public_key.fingerprint) != expected_fingerprint:
+      raise ValueError('Public key fingerprint %s does not match expected %s' % (
+        public_key.fingerprint, expected_fingerprint
+      ))
+    self._public_key = public_key
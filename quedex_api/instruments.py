@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from .market_stream import MarketStreamListener
+
+_EPOCH = datetime(1970, 1, 1)
+
+_DECIMAL_FIELDS = ('tick_size', 'fee', 'taker_to_maker', 'initial_margin', 'maintenance_margin')
+
+
+class Instrument(object):
+  """
+  An instrument from instrument_data with decimals parsed to Decimal and timestamps (millis from
+  epoch UTC) additionally available as naive datetimes in UTC. The dict received from the exchange
+  is available as data.
+  """
+
+  def __init__(self, data):
+    self.data = data
+    self.instrument_id = data['instrument_id']
+    self.type = data['type']
+    self.symbol = data.get('symbol')
+    self.underlying_symbol = data.get('underlying_symbol')
+    self.notional_amount = data.get('notional_amount')
+    for field in _DECIMAL_FIELDS:
+      setattr(self, field, _parse_decimal(data.get(field)))
+    self.issue_date = data.get('issue_date')
+    self.expiration_date = data.get('expiration_date')
+    self.issue = _parse_timestamp(self.issue_date)
+    self.expiration = _parse_timestamp(self.expiration_date)
+    # options only
+    self.strike = _parse_decimal(data.get('strike'))
+    self.option_type = data.get('option_type')
+
+  @property
+  def is_option(self):
+    return self.option_type is not None
+
+  @property
+  def is_call(self):
+    return self.option_type == 'call_european'
+
+  @property
+  def is_put(self):
+    return self.option_type == 'put_european'
+
+  def __repr__(self):
+    return 'Instrument(%s, %s)' % (self.instrument_id, self.symbol)
+
+
+class InstrumentRegistry(MarketStreamListener):
+  """
+  MarketStreamListener keeping the instruments from instrument_data as Instrument objects, indexed
+  by type, underlying, expiration (millis), strike (Decimal) and option type.
+
+  A registry may be shared by several components: each of them passes the instrument_data it
+  receives to on_instrument_data, the payload is parsed only once - the same message object is
+  recognised, and instruments whose data did not change are not parsed again. version grows with
+  every change, so that dependent structures know when to rebuild.
+  """
+
+  INDEXES = ('type', 'underlying_symbol', 'expiration_date', 'strike', 'option_type')
+
+  def __init__(self):
+    self.version = 0
+    self._instrument_data = None
+    self._instruments = {}
+    self._indexes = dict((field, {}) for field in self.INDEXES)
+
+  def on_instrument_data(self, instrument_data):
+    if instrument_data is self._instrument_data:
+      return
+    self._instrument_data = instrument_data
+    instruments = {}
+    for instrument_id, data in instrument_data['data'].items():
+      instrument = self._instruments.get(instrument_id)
+      if instrument is None or instrument.data != data:
+        instrument = Instrument(data)
+      instruments[instrument_id] = instrument
+    if instruments == self._instruments:
+      return
+    self._instruments = instruments
+    self._rebuild_indexes()
+    self.version += 1
+
+  def _rebuild_indexes(self):
+    self._indexes = dict((field, {}) for field in self.INDEXES)
+    for instrument in self._sorted(self._instruments.values()):
+      for field in self.INDEXES:
+        value = getattr(instrument, field)
+        if value is not None:
+          self._indexes[field].setdefault(value, []).append(instrument)
+
+  def get(self, instrument_id):
+    """
+    :return: Instrument or None if there is no instrument of the id
+    """
+    return self._instruments.get(instrument_id)
+
+  def __getitem__(self, instrument_id):
+    return self._instruments[instrument_id]
+
+  def __contains__(self, instrument_id):
+    return instrument_id in self._instruments
+
+  def __len__(self):
+    return len(self._instruments)
+
+  def __iter__(self):
+    return iter(self._sorted(self._instruments.values()))
+
+  def find(self, type=None, underlying_symbol=None, expiration_date=None, strike=None,
+           option_type=None):
+    """
+    :param strike: Decimal or string
+    :return: list of the instruments matching all given criteria, ordered by expiration, strike and
+             id
+    """
+    criteria = [
+      ('type', type),
+      ('underlying_symbol', underlying_symbol),
+      ('expiration_date', expiration_date),
+      ('strike', _parse_decimal(strike)),
+      ('option_type', option_type),
+    ]
+    candidates = None
+    for field, value in criteria:
+      if value is None:
+        continue
+      instruments = self._indexes[field].get(value, [])
+      if candidates is None:
+        candidates = instruments
+      else:
+        # the indexes are short, intersecting through ids keeps the order of the candidates
+        ids = set(instrument.instrument_id for instrument in instruments)
+        candidates = [instrument for instrument in candidates if instrument.instrument_id in ids]
+    if candidates is None:
+      return list(self)
+    return list(candidates)
+
+  def values(self, field):
+    """
+    :param field: one of INDEXES
+    :return: sorted list of distinct values of the field, e.g. all expirations
+    """
+    return sorted(self._indexes[field])
+
+  def expirations(self, underlying_symbol=None, type=None):
+    """
+    :return: sorted list of distinct expirations (millis) of the matching instruments
+    """
+    instruments = self.find(type=type, underlying_symbol=underlying_symbol)
+    return sorted(set(
+      instrument.expiration_date for instrument in instruments
+      if instrument.expiration_date is not None
+    ))
+
+  def strikes(self, expiration_date, underlying_symbol=None):
+    """
+    :return: sorted list of distinct strikes (Decimal) of the options of the expiration
+    """
+    instruments = self.find(expiration_date=expiration_date, underlying_symbol=underlying_symbol)
+    return sorted(set(
+      instrument.strike for instrument in instruments if instrument.strike is not None
+    ))
+
+  @staticmethod
+  def _sorted(instruments):
+    return sorted(instruments, key=lambda instrument: (
+      instrument.expiration_date or 0, instrument.strike or 0, _id_key(instrument.instrument_id)
+    ))
+
+
+def _id_key(instrument_id):
+  # ids are numeric strings, ordered as numbers
+  return (len(instrument_id), instrument_id)
+
+
+def _parse_decimal(value):
+  if value is None or isinstance(value, Decimal):
+    return value
+  return Decimal(str(value))
+
+
+def _parse_timestamp(millis):
+  if millis is None:
+    return None
+  return _EPOCH + timedelta(milliseconds=millis)
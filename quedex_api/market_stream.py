@@ -1,6 +1,14 @@
-import json
+import functools
 
-import pgpy
+from .codec import get_codec
+from .dispatch import DispatchTable
+from .envelope import decode_message, parse_envelope, peek_message
+from .messages import MARKET_STREAM_MESSAGES
+from .order_book_diff import OrderBookDiffer
+from .verification import ClearsignVerifier, PgpyVerifier, VerificationPolicy, extract_cleartext
+
+
+_UNKNOWN = object()
 
 
 class MarketStreamListener(object):
@@ -58,6 +66,26 @@ class MarketStreamListener(object):
     """
     pass
 
+  def on_order_book_delta(self, order_book_delta):
+    """
+    Called after on_order_book with the levels of the order book which changed since the previous
+    order_book message of the instrument. Previous books are kept only while some listener
+    implements this method, so the first delta of an instrument after such a listener is added to
+    a stream without one holds all levels of the book, as added - listeners added later should take
+    the initial state from on_order_book. Not called if no level changed.
+
+    :param order_book_delta: a dict of the following format:
+      {
+        "type": "order_book_delta",
+        "instrument_id": "<string id of the instrument>",
+        "changes": [["bid"/"ask", "<decimal price as string>", <int old quantity>,
+                     <int new quantity>], ...]
+      }
+      where old quantity is 0 for an added level and new quantity is 0 for a removed one - prices
+      are integer numbers of ticks when the stream is in ticks mode, as in order_book
+    """
+    pass
+
   def on_quotes(self, quotes):
     """
     :param quotes: a dict of the following format:
@@ -126,6 +154,18 @@ class MarketStreamListener(object):
     """
     pass
 
+  def on_verification_failed(self, message):
+    """
+    Called when verification of the signature of a message fails after the message has already been
+    delivered to the listeners, which happens only with a VerificationPolicy verifying after
+    delivery (optimistic dispatch) - the message should be treated as retracted. The failure is
+    also reported through on_error. The next order_book_delta of the instrument of a retracted
+    order_book holds all levels of the book, as the first one.
+
+    :param message: the dict previously delivered to the listeners
+    """
+    pass
+
   def on_error(self, error):
     """
     Called when an error with market stream occurs (data parsing, signature verification, webosocket error). This means
@@ -156,24 +196,128 @@ class MarketStream(object):
   but that's not necessary) and add an instance via add_listener method. Methods of listener will
   be called when respective objects arrive on the market stream. For the format of the data see
   comments on MarketStreamListener.
+
+  Messages which no listener receives - of types no listener implements or is subscribed to, or of
+  instruments no listener is subscribed to (see add_listener) - are not dispatched, and flat
+  messages (order_book, quotes, trade) are not even decoded; with a VerificationPolicy which does
+  not verify all messages before delivery they are not verified either. skipped_counts tells how
+  many messages were skipped per reason: "message_type" or "instrument";
+  skipped_undecoded_count how many of them were skipped before decoding.
   """
 
-  def __init__(self, exchange):
+  def __init__(self, exchange, fast_verification=False, verification_pool=None, ingestion_pool=None,
+               verification_policy=None, codec='json', tick_table=None, typed_messages=False):
+    """
+    :param fast_verification: if True, signatures are verified with ClearsignVerifier which checks
+                              the clearsigned format used by Quedex directly with cryptography and
+                              falls back to pgpy for any other format
+    :param verification_pool: optional VerificationPool - if given, signatures are verified on its
+                              workers instead of the reactor thread, listeners are still called on
+                              the reactor thread in the order in which messages arrived
+    :param ingestion_pool: optional IngestionPool - if given, raw messages are parsed, verified and
+                           decoded on its workers, listeners are called as with verification_pool
+    :param verification_policy: optional VerificationPolicy deciding which messages are verified and
+                                when, by default all messages are verified before delivery (the
+                                policy does not apply to messages ingested on an IngestionPool)
+    :param codec: JSON codec used to decode messages - name of a codec (see quedex_api.codec,
+                  "orjson", "simdjson" or "ujson" are faster than the default "json" when
+                  installed, "auto" picks the fastest installed one) or a codec object
+    :param tick_table: optional TickTable - if given, the stream is in ticks mode: prices of
+                       order_book, order_book_delta, quotes and trade are delivered as integer
+                       numbers of ticks of the instrument (see TickTable.convert) and
+                       instrument_data updates the table. Listeners of this package which read
+                       prices (OrderBookStore, TopOfBookCache, option and futures analytics) take
+                       the table too, add_listener rejects them if their tick_table does not
+                       match the mode of the stream
+    :param typed_messages: if True, order_book, quotes and trade are delivered (also to on_message)
+                           as objects of the classes of quedex_api.messages, with __slots__ and
+                           parsed prices, instead of dicts - other messages are still dicts. They
+                           take over the values of the decoded dicts and parse prices on first
+                           access, they save memory where listeners keep messages. Listeners of
+                           this package reading prices do not accept them, on_order_book_delta and
+                           on_verification_failed still receive dicts
+    """
     self._exchange = exchange
-    self._quedex_key = exchange.public_key
-    self._listeners = []
-
-  def add_listener(self, market_stream_listener):
-    self._listeners.append(market_stream_listener)
+    # parse the key eagerly so that an invalid key is reported on construction, the key itself
+    # is cached by the exchange and read from there on every message
+    exchange.public_key
+    self._codec = get_codec(codec)
+    self._loads_buffer = getattr(self._codec, 'loads_buffer', None)
+    self._verifier = ClearsignVerifier(exchange) if fast_verification else PgpyVerifier(exchange)
+    self._verification_pool = verification_pool
+    if verification_pool is not None:
+      verification_pool.start(exchange, fast_verification, self._codec)
+    self._ingestion_pool = ingestion_pool
+    if ingestion_pool is not None:
+      ingestion_pool.start(exchange, fast_verification, self._codec)
+    self._verification_policy = verification_policy or VerificationPolicy.full()
+    self._tick_table = tick_table
+    self._message_classes = MARKET_STREAM_MESSAGES if typed_messages else None
+    self._dispatch_table = DispatchTable(MarketStreamListener)
+    self._order_book_differ = OrderBookDiffer()
+    self.skipped_counts = {'message_type': 0, 'instrument': 0}
+    self.skipped_undecoded_count = 0
+    # (message type, instrument id) -> reason to skip, None if delivered
+    self._skip_reasons = {}
+
+  def add_listener(self, market_stream_listener, instrument_ids=None, message_types=None):
+    """
+    :param instrument_ids: optional collection of instrument ids - if given, the listener receives
+                           order_book, order_book_delta, quotes and trade (also in on_message) only
+                           of these instruments, messages not of any instrument are not limited
+    :param message_types: optional collection of message types (e.g. "quotes",
+                          "order_book_delta") - if given, the listener receives (also in on_message)
+                          only messages of these types; on_ready, on_error, on_disconnect and
+                          on_verification_failed are called regardless of the scope
+    :raises ValueError: if the listener has a tick_table attribute (listeners of this package
+                        reading prices) which is None in ticks mode or a table otherwise, or at
+                        all with typed_messages, as such listeners read dicts - wrappers such as
+                        ConflatingListener declare tick_table on the class, they read dicts even
+                        if the wrapped listener reads no prices
+    """
+    tick_table = getattr(market_stream_listener, 'tick_table', _UNKNOWN)
+    reads_dicts = tick_table is not _UNKNOWN or hasattr(type(market_stream_listener), 'tick_table')
+    if reads_dicts and self._message_classes is not None:
+      raise ValueError('%s reads messages as dicts, the stream delivers typed messages' % (
+        type(market_stream_listener).__name__
+      ))
+    if tick_table is not _UNKNOWN and (tick_table is None) != (self._tick_table is None):
+      raise ValueError('%s does not read prices in the units of the stream: %s' % (
+        type(market_stream_listener).__name__,
+        'the stream is in ticks mode' if tick_table is None else 'the stream is not in ticks mode',
+      ))
+    self._dispatch_table.add(market_stream_listener, instrument_ids, message_types)
+    self._on_listeners_changed()
 
   def remove_listener(self, market_stream_listener):
-    self._listeners.remove(market_stream_listener)
+    self._dispatch_table.remove(market_stream_listener)
+    self._on_listeners_changed()
+
+  def _on_listeners_changed(self):
+    self._skip_reasons = {}
+    # previous books are kept only for instruments whose deltas are computed on every order_book -
+    # the book of an instrument nobody takes deltas of any more would go stale while its order_book
+    # messages are skipped, and the deltas of a listener subscribing to it later would be wrong
+    dispatch_table = self._dispatch_table
+    self._order_book_differ.reset([
+      instrument_id for instrument_id in self._order_book_differ.instrument_ids
+      if not dispatch_table.handlers('on_order_book_delta', 'order_book_delta', instrument_id)
+    ])
 
   def on_message(self, message_wrapper_str):
+    """
+    :param message_wrapper_str: message received from the WebSocket as str or as a buffer (bytes,
+                                bytearray, memoryview) of UTF-8, which is decoded only if the codec
+                                cannot decode buffers
+    """
+    if self._ingestion_pool is not None:
+      self._ingestion_pool.submit(message_wrapper_str, self._on_ingested)
+      return
     try:
 
-      message_wrapper = json.loads(message_wrapper_str)
-      message_type = message_wrapper['type']
+      message_type, message_wrapper = parse_envelope(
+        message_wrapper_str, self._codec.loads, self._loads_buffer
+      )
 
       if message_type == 'keepalive':
         return
@@ -195,39 +339,250 @@ class MarketStream(object):
 
   def process_data(self, message_wrapper):
     clearsigned_message_str = message_wrapper['data']
+    policy = self._verification_policy
+
+    if policy.verifies_all_before_delivery:
+      policy.verified_count += 1
+      if self._verification_pool is not None:
+        self._verification_pool.submit(clearsigned_message_str, self._on_verified)
+        return
 
-    clearsigned_message = pgpy.PGPMessage().from_blob(clearsigned_message_str)
-    if not self._quedex_key.verify(clearsigned_message):
+      verified, message_str = self._verifier.verify(clearsigned_message_str)
+      if not verified:
+        self.on_error(Exception(
+          'Signature verification failed on message: %s' % clearsigned_message_str
+        ))
+
+      self._parse_message(message_str)
+      return
+
+    message_str = extract_cleartext(clearsigned_message_str)
+    if self._skips_undecoded(message_str):
+      return
+    message = self._codec.loads(message_str)
+    if not policy.should_verify(message['type']):
+      self._deliver(message)
+    elif policy.after_delivery:
+      self._deliver(message)
+      if self._verification_pool is not None:
+        self._verification_pool.submit(
+          clearsigned_message_str, functools.partial(self._on_verified_after_delivery, message),
+          ordered=False,
+        )
+      else:
+        policy.schedule(self._verify_after_delivery, message, clearsigned_message_str)
+    elif self._verification_pool is not None:
+      self._verification_pool.submit(
+        clearsigned_message_str, functools.partial(self._on_verified_before_delivery, message)
+      )
+    else:
+      verified, _ = self._verifier.verify(clearsigned_message_str)
+      if not verified:
+        self.on_error(Exception(
+          'Signature verification failed on message: %s' % clearsigned_message_str
+        ))
+      self._dispatch(message)
+
+  def _deliver(self, message):
+    # messages verified on the pool are delivered in order, so the rest has to queue up behind them
+    if self._verification_pool is not None:
+      self._verification_pool.submit_done(message, self._on_delivered_in_order)
+    else:
+      self._dispatch(message)
+
+  def _on_delivered_in_order(self, message):
+    try:
+      self._dispatch(message)
+    except Exception as e:
+      self.on_error(e)
+
+  def _verify_after_delivery(self, message, clearsigned_message_str):
+    try:
+      verified, _ = self._verifier.verify(clearsigned_message_str)
+    except Exception as e:
+      self.on_error(e)
+      self.on_verification_failed(message)
+      return
+    self._on_verified_after_delivery(message, clearsigned_message_str, verified, None, None)
+
+  def _on_verified_after_delivery(self, message, clearsigned_message_str, verified, message_str,
+                                  error):
+    if error is not None:
+      self.on_error(Exception('Signature verification error: %s' % error))
+    elif not verified:
       self.on_error(Exception('Signature verification failed on message: %s' % clearsigned_message_str))
+    else:
+      return
+    self.on_verification_failed(message)
 
-    self._parse_message(clearsigned_message.message)
+  def _on_verified_before_delivery(self, message, clearsigned_message_str, verified, message_str,
+                                   error):
+    try:
+      if error is not None:
+        self.on_error(Exception('Signature verification error: %s' % error))
+      elif not verified:
+        self.on_error(Exception(
+          'Signature verification failed on message: %s' % clearsigned_message_str
+        ))
+      self._dispatch(message)
+    except Exception as e:
+      self.on_error(e)
+
+  def _on_verified(self, clearsigned_message_str, verified, message_str, error):
+    try:
+      if error is not None:
+        self.on_error(Exception('Signature verification error: %s' % error))
+        return
+      if not verified:
+        self.on_error(Exception(
+          'Signature verification failed on message: %s' % clearsigned_message_str
+        ))
+
+      self._parse_message(message_str)
+    except Exception as e:
+      self.on_error(e)
+
+  def _on_ingested(self, message_wrapper_str, message_type, payload, verified, error):
+    try:
+      if error is not None:
+        self.on_error(Exception('Message ingestion error: %s' % error))
+      elif message_type == 'error':
+        self.process_error({'type': message_type, 'error_code': payload})
+      elif message_type == 'data':
+        if not verified:
+          self.on_error(Exception(
+            'Signature verification failed on message: %s' % decode_message(message_wrapper_str)
+          ))
+        self._dispatch(payload)
+    except Exception as e:
+      self.on_error(e)
 
   def _parse_message(self, message_str):
-    message = json.loads(message_str)
-    for listener in self._listeners:
-      if hasattr(listener, 'on_message'):
-        listener.on_message(message)
+    if self._skips_undecoded(message_str):
+      return
+    self._dispatch(self._codec.loads(message_str))
+
+  def _skips_undecoded(self, message_str):
+    if self._dispatch_table.receives_all:
+      return False
+    peeked = peek_message(message_str)
+    if peeked is None:
+      return False
+    reason = self._skip_reason(*peeked)
+    if reason is None:
+      return False
+    self.skipped_counts[reason] += 1
+    self.skipped_undecoded_count += 1
+    return True
+
+  def _skip_reason(self, message_type, instrument_id):
+    """
+    :return: None if some listener receives the message, otherwise the reason to skip it
+    """
+    key = (message_type, instrument_id)
+    reason = self._skip_reasons.get(key, _UNKNOWN)
+    if reason is _UNKNOWN:
+      # instrument_data keeps the tick table up to date
+      if self._wanted(message_type, instrument_id) or message_type == 'instrument_data':
+        reason = None
+      elif instrument_id is not None and self._wanted(message_type, None):
+        reason = 'instrument'
+      else:
+        reason = 'message_type'
+      self._skip_reasons[key] = reason
+    return reason
+
+  def _wanted(self, message_type, instrument_id):
+    dispatch_table = self._dispatch_table
+    return bool(
+      dispatch_table.handlers('on_message', message_type, instrument_id) or
+      dispatch_table.message_handlers(message_type, instrument_id) or
+      message_type == 'order_book' and
+      dispatch_table.handlers('on_order_book_delta', 'order_book_delta', instrument_id)
+    )
+
+  def _dispatch(self, message):
+    message_type = message['type']
+    instrument_id = message.get('instrument_id')
+    if not self._dispatch_table.receives_all:
+      reason = self._skip_reason(message_type, instrument_id)
+      if reason is not None:
+        self.skipped_counts[reason] += 1
+        return
+
+    if self._tick_table is not None:
+      self._tick_table.convert(message)
+
+    delivered = message
+    if self._message_classes is not None:
+      message_class = self._message_classes.get(message_type)
+      if message_class is not None:
+        delivered = message_class.from_dict(message)
 
-    listener_name = 'on_' + message['type']
-    for listener in self._listeners:
-      if hasattr(listener, listener_name):
-        getattr(listener, listener_name)(message)
+    dispatch_message(self._dispatch_table, self._order_book_differ, message, delivered)
 
   def on_error(self, error):
-    for listener in self._listeners:
-      if hasattr(listener, 'on_error'):
-        listener.on_error(error)
+    for handler in self._dispatch_table.handlers('on_error'):
+      handler(error)
+
+  def on_verification_failed(self, message):
+    if message.get('type') == 'order_book':
+      # the retracted book must not be the base of the next delta
+      self._order_book_differ.reset([message.get('instrument_id')])
+    for handler in self._dispatch_table.handlers('on_verification_failed'):
+      handler(message)
 
   def on_disconnect(self, message):
-    for listener in self._listeners:
-      if hasattr(listener, 'on_disconnect'):
-        listener.on_disconnect(message)
+    for handler in self._dispatch_table.handlers('on_disconnect'):
+      handler(message)
 
   def on_ready(self):
-    for listener in self._listeners:
-      if hasattr(listener, 'on_ready'):
-        listener.on_ready()
+    for handler in self._dispatch_table.handlers('on_ready'):
+      handler()
+
+  @property
+  def verification_policy(self):
+    return self._verification_policy
+
+  @property
+  def verification_pool(self):
+    return self._verification_pool
+
+  @property
+  def ingestion_pool(self):
+    return self._ingestion_pool
 
   @property
   def market_stream_url(self):
     return self._exchange.market_stream_url
+
+
+def dispatch_message(dispatch_table, order_book_differ, message, delivered=None):
+  """
+  Calls the listeners of a DispatchTable of MarketStreamListeners with a market stream message:
+  on_message, on_<type> and, for order_book, on_order_book_delta with the delta computed by
+  order_book_differ. Listeners out of the scope of the message are left out.
+
+  :param delivered: what the listeners receive instead of message (e.g. a typed message), message
+                    if None - deltas are always computed from message
+  """
+  if delivered is None:
+    delivered = message
+  message_type = message['type']
+  instrument_id = message.get('instrument_id')
+
+  for handler in dispatch_table.handlers('on_message', message_type, instrument_id):
+    handler(delivered)
+
+  for handler in dispatch_table.message_handlers(message_type, instrument_id):
+    handler(delivered)
+
+  if message_type == 'order_book':
+    delta_handlers = dispatch_table.handlers(
+      'on_order_book_delta', 'order_book_delta', instrument_id
+    )
+    if delta_handlers:
+      order_book_delta = order_book_differ.diff(message)
+      if order_book_delta is not None:
+        for handler in delta_handlers:
+          handler(order_book_delta)
@@ -6,8 +6,8 @@ class MarketStreamClientProtocol(WebSocketClientProtocol):
     self.factory.market_stream.on_ready()
 
   def onMessage(self, payload, isbinary):
-    # explicit decode for Python 3 compatibility
-    self.factory.market_stream.on_message(payload.decode('utf8'))
+    # the payload is passed on as bytes, it is decoded only where needed
+    self.factory.market_stream.on_message(payload)
 
   def onClose(self, wasclean, code, reason):
     if not wasclean:
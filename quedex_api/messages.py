@@ -0,0 +1,339 @@
+from abc import ABCMeta, abstractmethod
+from decimal import Decimal
+
+from .codec import string_types
+
+# ABCMeta applied in a way both Python 2 and 3 accept
+_AbstractBase = ABCMeta('_AbstractBase', (object,), {'__slots__': ()})
+
+
+class Message(_AbstractBase):
+  """
+  Base of the typed messages delivered by MarketStream and UserStream with typed_messages=True:
+  compact objects with __slots__ instead of dicts, fields available as attributes named as the keys
+  of the dicts and decimal strings parsed to Decimal (prices in ticks, see TickTable, are kept as
+  integers). type is a class attribute.
+
+  A message is built from the dict decoded from JSON, which is dropped right away, by taking over
+  its values - decimal strings (and the levels of order books) are parsed on first access of the
+  field, so building a message costs one small object and messages of which only a few fields are
+  read never parse the rest. Typed messages take less memory than dicts while listeners keep them,
+  most for messages of many fields, little for order books whose levels take most of the memory.
+
+  The classes are imported from quedex_api.messages - OrderBook of this module is the message,
+  not quedex_api.OrderBook of OrderBookStore.
+  """
+
+  __slots__ = ()
+  type = None
+  # names of the fields, the slots of decimal fields are prefixed with _
+  _fields = ()
+
+  @classmethod
+  @abstractmethod
+  def from_dict(cls, data):
+    """
+    :param data: the message as decoded from JSON
+    """
+
+  def to_dict(self):
+    """
+    :return: the message as a dict, as delivered without typed_messages (decimal fields remain
+             Decimal)
+    """
+    data = dict((field, getattr(self, field)) for field in self._fields)
+    data['type'] = self.type
+    return data
+
+  def __eq__(self, other):
+    return type(self) is type(other) and all(
+      getattr(self, field) == getattr(other, field) for field in self._fields
+    )
+
+  def __ne__(self, other):
+    return not self == other
+
+  __hash__ = None
+
+  def __repr__(self):
+    return '%s(%s)' % (
+      self.__class__.__name__,
+      ', '.join('%s=%r' % (field, getattr(self, field)) for field in self._fields),
+    )
+
+
+def _decimal_field(slot):
+  """
+  :return: property of a decimal field kept in slot as received and parsed on first access
+  """
+  def get(self):
+    value = getattr(self, slot)
+    if isinstance(value, string_types):
+      value = Decimal(value)
+      setattr(self, slot, value)
+    return value
+
+  def set(self, value):
+    setattr(self, slot, value)
+
+  return property(get, set)
+
+
+def _levels_field(slot):
+  """
+  :return: property of levels kept in slot as received and parsed on first access to a list of
+           (price, quantity) tuples
+  """
+  def get(self):
+    levels = getattr(self, slot)
+    if levels and not isinstance(levels[0], tuple):
+      levels = [(_decimal(price), quantity) for price, quantity in levels]
+      setattr(self, slot, levels)
+    return levels
+
+  def set(self, levels):
+    setattr(self, slot, levels)
+
+  return property(get, set)
+
+
+class OrderBook(Message):
+  """
+  bids and asks are lists of (price, quantity) tuples.
+  """
+
+  __slots__ = ('instrument_id', '_bids', '_asks')
+  _fields = ('instrument_id', 'bids', 'asks')
+  type = 'order_book'
+
+  bids = _levels_field('_bids')
+  asks = _levels_field('_asks')
+
+  def __init__(self, instrument_id, bids, asks):
+    self.instrument_id = instrument_id
+    self._bids = bids
+    self._asks = asks
+
+  @classmethod
+  def from_dict(cls, data):
+    return cls(data['instrument_id'], data['bids'], data['asks'])
+
+
+class Quotes(Message):
+  __slots__ = (
+    'instrument_id', '_last', 'last_quantity', '_bid', 'bid_quantity', '_ask', 'ask_quantity',
+    'volume', 'open_interest', '_tap', '_lower_limit', '_upper_limit',
+  )
+  _fields = (
+    'instrument_id', 'last', 'last_quantity', 'bid', 'bid_quantity', 'ask', 'ask_quantity',
+    'volume', 'open_interest', 'tap', 'lower_limit', 'upper_limit',
+  )
+  type = 'quotes'
+
+  last = _decimal_field('_last')
+  bid = _decimal_field('_bid')
+  ask = _decimal_field('_ask')
+  tap = _decimal_field('_tap')
+  lower_limit = _decimal_field('_lower_limit')
+  upper_limit = _decimal_field('_upper_limit')
+
+  def __init__(self, instrument_id, last, last_quantity, bid, bid_quantity, ask, ask_quantity,
+               volume, open_interest, tap=None, lower_limit=None, upper_limit=None):
+    self.instrument_id = instrument_id
+    self._last = last
+    self.last_quantity = last_quantity
+    self._bid = bid
+    self.bid_quantity = bid_quantity
+    self._ask = ask
+    self.ask_quantity = ask_quantity
+    self.volume = volume
+    self.open_interest = open_interest
+    self._tap = tap
+    self._lower_limit = lower_limit
+    self._upper_limit = upper_limit
+
+  @classmethod
+  def from_dict(cls, data):
+    get = data.get
+    return cls(
+      data['instrument_id'], get('last'), get('last_quantity'), get('bid'), get('bid_quantity'),
+      get('ask'), get('ask_quantity'), get('volume'), get('open_interest'), get('tap'),
+      get('lower_limit'), get('upper_limit'),
+    )
+
+
+class Trade(Message):
+  __slots__ = ('instrument_id', 'trade_id', 'timestamp', '_price', 'quantity', 'liquidity_provider')
+  _fields = ('instrument_id', 'trade_id', 'timestamp', 'price', 'quantity', 'liquidity_provider')
+  type = 'trade'
+
+  price = _decimal_field('_price')
+
+  def __init__(self, instrument_id, trade_id, timestamp, price, quantity, liquidity_provider):
+    self.instrument_id = instrument_id
+    self.trade_id = trade_id
+    self.timestamp = timestamp
+    self._price = price
+    self.quantity = quantity
+    self.liquidity_provider = liquidity_provider
+
+  @classmethod
+  def from_dict(cls, data):
+    get = data.get
+    return cls(
+      data['instrument_id'], get('trade_id'), get('timestamp'), get('price'), get('quantity'),
+      get('liquidity_provider'),
+    )
+
+
+class AccountState(Message):
+  __slots__ = (
+    '_balance', '_free_balance', '_total_initial_margin', '_total_maintenance_margin',
+    '_total_unsettled_pnl', '_total_locked_for_orders', '_total_pending_withdrawal',
+    'account_status',
+  )
+  _fields = (
+    'balance', 'free_balance', 'total_initial_margin', 'total_maintenance_margin',
+    'total_unsettled_pnl', 'total_locked_for_orders', 'total_pending_withdrawal', 'account_status',
+  )
+  type = 'account_state'
+
+  balance = _decimal_field('_balance')
+  free_balance = _decimal_field('_free_balance')
+  total_initial_margin = _decimal_field('_total_initial_margin')
+  total_maintenance_margin = _decimal_field('_total_maintenance_margin')
+  total_unsettled_pnl = _decimal_field('_total_unsettled_pnl')
+  total_locked_for_orders = _decimal_field('_total_locked_for_orders')
+  total_pending_withdrawal = _decimal_field('_total_pending_withdrawal')
+
+  def __init__(self, balance, free_balance, total_initial_margin, total_maintenance_margin,
+               total_unsettled_pnl, total_locked_for_orders, total_pending_withdrawal,
+               account_status):
+    self._balance = balance
+    self._free_balance = free_balance
+    self._total_initial_margin = total_initial_margin
+    self._total_maintenance_margin = total_maintenance_margin
+    self._total_unsettled_pnl = total_unsettled_pnl
+    self._total_locked_for_orders = total_locked_for_orders
+    self._total_pending_withdrawal = total_pending_withdrawal
+    self.account_status = account_status
+
+  @classmethod
+  def from_dict(cls, data):
+    get = data.get
+    return cls(
+      get('balance'), get('free_balance'), get('total_initial_margin'),
+      get('total_maintenance_margin'), get('total_unsettled_pnl'), get('total_locked_for_orders'),
+      get('total_pending_withdrawal'), get('account_status'),
+    )
+
+
+class OpenPosition(Message):
+  """
+  pnl is None for options.
+  """
+
+  __slots__ = (
+    'instrument_id', '_pnl', '_maintenance_margin', '_initial_margin', 'side', 'quantity',
+    '_average_opening_price',
+  )
+  _fields = (
+    'instrument_id', 'pnl', 'maintenance_margin', 'initial_margin', 'side', 'quantity',
+    'average_opening_price',
+  )
+  type = 'open_position'
+
+  pnl = _decimal_field('_pnl')
+  maintenance_margin = _decimal_field('_maintenance_margin')
+  initial_margin = _decimal_field('_initial_margin')
+  average_opening_price = _decimal_field('_average_opening_price')
+
+  def __init__(self, instrument_id, pnl, maintenance_margin, initial_margin, side, quantity,
+               average_opening_price):
+    self.instrument_id = instrument_id
+    self._pnl = pnl
+    self._maintenance_margin = maintenance_margin
+    self._initial_margin = initial_margin
+    self.side = side
+    self.quantity = quantity
+    self._average_opening_price = average_opening_price
+
+  @classmethod
+  def from_dict(cls, data):
+    get = data.get
+    return cls(
+      get('instrument_id'), get('pnl'), get('maintenance_margin'), get('initial_margin'),
+      get('side'), get('quantity'), get('average_opening_price'),
+    )
+
+
+class OrderPlaced(Message):
+  __slots__ = ('client_order_id', 'instrument_id', '_limit_price', 'side', 'quantity')
+  _fields = ('client_order_id', 'instrument_id', 'limit_price', 'side', 'quantity')
+  type = 'order_placed'
+
+  limit_price = _decimal_field('_limit_price')
+
+  def __init__(self, client_order_id, instrument_id, limit_price, side, quantity):
+    self.client_order_id = client_order_id
+    self.instrument_id = instrument_id
+    self._limit_price = limit_price
+    self.side = side
+    self.quantity = quantity
+
+  @classmethod
+  def from_dict(cls, data):
+    get = data.get
+    return cls(
+      data['client_order_id'], get('instrument_id'), get('limit_price'), get('side'),
+      get('quantity'),
+    )
+
+
+class OrderFilled(Message):
+  __slots__ = ('client_order_id', '_trade_price', 'trade_quantity', 'leaves_order_quantity')
+  _fields = ('client_order_id', 'trade_price', 'trade_quantity', 'leaves_order_quantity')
+  type = 'order_filled'
+
+  trade_price = _decimal_field('_trade_price')
+
+  def __init__(self, client_order_id, trade_price, trade_quantity, leaves_order_quantity):
+    self.client_order_id = client_order_id
+    self._trade_price = trade_price
+    self.trade_quantity = trade_quantity
+    self.leaves_order_quantity = leaves_order_quantity
+
+  @classmethod
+  def from_dict(cls, data):
+    get = data.get
+    return cls(
+      data['client_order_id'], get('trade_price'), get('trade_quantity'),
+      get('leaves_order_quantity'),
+    )
+
+
+class OrderCancelled(Message):
+  __slots__ = ('client_order_id',)
+  _fields = __slots__
+  type = 'order_cancelled'
+
+  def __init__(self, client_order_id):
+    self.client_order_id = client_order_id
+
+  @classmethod
+  def from_dict(cls, data):
+    return cls(data['client_order_id'])
+
+
+# message type -> class, messages of other types (e.g. instrument_data, spot_data, which are rare
+# and read by the components of this package) are delivered as dicts also with typed_messages
+MARKET_STREAM_MESSAGES = dict((cls.type, cls) for cls in (OrderBook, Quotes, Trade))
+USER_STREAM_MESSAGES = dict(
+  (cls.type, cls) for cls in (AccountState, OpenPosition, OrderPlaced, OrderFilled, OrderCancelled)
+)
+
+
+def _decimal(value):
+  if isinstance(value, string_types):
+    return Decimal(value)
+  return value
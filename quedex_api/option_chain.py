@@ -0,0 +1,124 @@
+import numpy as np
+
+from .instruments import InstrumentRegistry
+from .market_stream import MarketStreamListener
+from .ticks import float_price
+
+_QUOTE_FIELDS = [
+  ('bid', np.float64),
+  ('ask', np.float64),
+  ('last', np.float64),
+  ('bid_quantity', np.int64),
+  ('ask_quantity', np.int64),
+  ('volume', np.int64),
+  ('open_interest', np.int64),
+]
+
+# one row per strike, prices are NaN until quoted
+OPTION_CHAIN_DTYPE = np.dtype(
+  [('strike', np.float64)] +
+  [('call_' + name, dtype) for name, dtype in _QUOTE_FIELDS] +
+  [('put_' + name, dtype) for name, dtype in _QUOTE_FIELDS]
+)
+
+
+class OptionChain(MarketStreamListener):
+  """
+  MarketStreamListener keeping, for every underlying and expiration (expiry), a preallocated array
+  of OPTION_CHAIN_DTYPE with one row per strike, in ascending order, holding the quotes of the call
+  and the put of the strike. The arrays are built from instrument_data (through a shareable
+  InstrumentRegistry) and quotes update the cells of a single option in place.
+
+  chain() returns read-only views of the arrays, which are not copied - they always show the
+  current quotes until instrument_data changes the instruments.
+  """
+
+  def __init__(self, registry=None, tick_table=None):
+    """
+    :param registry: InstrumentRegistry the options are grouped into expiries from (e.g. the one of
+                     an OptionPricer), a new one if None
+    :param tick_table: the TickTable of a MarketStream in ticks mode, to convert the prices of
+                       quotes from ticks; None for a stream delivering decimal strings
+    """
+    self.registry = registry if registry is not None else InstrumentRegistry()
+    self.tick_table = tick_table
+    self._registry_version = None
+    # (underlying symbol, expiration) -> (array, read-only view, call ids, put ids)
+    self._chains = {}
+    # instrument_id -> (row, columns of the option - views of the fields of the chain array)
+    self._cells = {}
+
+  def on_instrument_data(self, instrument_data):
+    self.registry.on_instrument_data(instrument_data)
+    if self.registry.version == self._registry_version:
+      return
+    self._registry_version = self.registry.version
+    groups = {}
+    for instrument in self.registry:
+      if (instrument.is_option and instrument.strike is not None
+          and instrument.expiration_date is not None):
+        expiry = (instrument.underlying_symbol, instrument.expiration_date)
+        groups.setdefault(expiry, []).append(instrument)
+    previous_cells = self._cells
+    self._chains = {}
+    self._cells = {}
+    for expiry, instruments in groups.items():
+      strikes = sorted(set(instrument.strike for instrument in instruments))
+      rows = dict((strike, row) for row, strike in enumerate(strikes))
+      chain = np.zeros(len(strikes), dtype=OPTION_CHAIN_DTYPE)
+      chain['strike'] = [float(strike) for strike in strikes]
+      for name in OPTION_CHAIN_DTYPE.names:
+        if name.endswith(('bid', 'ask', 'last')):
+          chain[name] = np.nan
+      call_ids = [None] * len(strikes)
+      put_ids = [None] * len(strikes)
+      for instrument in instruments:
+        row = rows[instrument.strike]
+        prefix = 'call_' if instrument.is_call else 'put_'
+        (call_ids if instrument.is_call else put_ids)[row] = instrument.instrument_id
+        columns = tuple(chain[prefix + name] for name, _ in _QUOTE_FIELDS)
+        self._cells[instrument.instrument_id] = (row, columns)
+        # an option still listed keeps its quotes, copied from the arrays of the old layout
+        previous = previous_cells.get(instrument.instrument_id)
+        if previous is not None:
+          previous_row, previous_columns = previous
+          for column, previous_column in zip(columns, previous_columns):
+            column[row] = previous_column[previous_row]
+      view = chain.view()
+      view.flags.writeable = False
+      self._chains[expiry] = (chain, view, call_ids, put_ids)
+
+  def on_quotes(self, quotes):
+    instrument_id = quotes['instrument_id']
+    cell = self._cells.get(instrument_id)
+    if cell is None:
+      return
+    row, (bid, ask, last, bid_quantity, ask_quantity, volume, open_interest) = cell
+    tick_table = self.tick_table
+    bid[row] = float_price(quotes['bid'], tick_table, instrument_id)
+    ask[row] = float_price(quotes['ask'], tick_table, instrument_id)
+    last[row] = float_price(quotes['last'], tick_table, instrument_id)
+    bid_quantity[row] = quotes['bid_quantity'] or 0
+    ask_quantity[row] = quotes['ask_quantity'] or 0
+    volume[row] = quotes['volume'] or 0
+    open_interest[row] = quotes['open_interest'] or 0
+
+  def expirations(self, underlying_symbol=None):
+    """
+    :return: sorted list of tuples (<underlying symbol>, <expiration in millis>) of all expiries
+    """
+    return sorted(expiry for expiry in self._chains if underlying_symbol in (None, expiry[0]))
+
+  def chain(self, underlying_symbol, expiration_date):
+    """
+    :return: read-only view of the array (OPTION_CHAIN_DTYPE) of the expiry, rows ordered by strike
+    """
+    return self._chains[(underlying_symbol, expiration_date)][1]
+
+  def instrument_ids(self, underlying_symbol, expiration_date):
+    """
+    :return: tuple (<ids of calls>, <ids of puts>), lists ordered as the rows of the chain, None
+             where there is no option of the strike
+    """
+    _, _, call_ids, put_ids = self._chains[(underlying_symbol, expiration_date)]
+    return list(call_ids), list(put_ids)
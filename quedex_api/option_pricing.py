@@ -0,0 +1,368 @@
+import math
+import time
+
+import numpy as np
+
+from .instruments import InstrumentRegistry
+from .market_stream import MarketStreamListener
+from .ticks import float_price
+
+MILLIS_PER_YEAR = 365 * 24 * 3600 * 1000.0
+
+OPTION_RESULT_DTYPE = np.dtype([
+  ('strike', np.float64),
+  ('is_call', np.bool_),
+  ('mid', np.float64),
+  ('implied_volatility', np.float64),
+  ('volatility', np.float64),
+  ('price', np.float64),
+  ('delta', np.float64),
+  ('gamma', np.float64),
+  ('vega', np.float64),
+  ('theta', np.float64),
+])
+
+# coefficients of the approximation 26.2.17 from Abramowitz and Stegun, absolute error < 7.5e-8
+_P = 0.2316419
+_B = (0.319381530, -0.356563782, 1.781477937, -1.821255978, 1.330274429)
+_SQRT_2_PI = math.sqrt(2 * math.pi)
+
+
+def norm_pdf(x):
+  return np.exp(-0.5 * x * x) / _SQRT_2_PI
+
+
+def norm_cdf(x):
+  """
+  Cumulative distribution function of the standard normal distribution, vectorized.
+  """
+  x = np.asarray(x, dtype=np.float64)
+  t = 1.0 / (1.0 + _P * np.abs(x))
+  polynomial = t * (_B[0] + t * (_B[1] + t * (_B[2] + t * (_B[3] + t * _B[4]))))
+  upper_tail = norm_pdf(x) * polynomial
+  return np.where(x >= 0, 1.0 - upper_tail, upper_tail)
+
+
+def black_scholes(spot, strikes, times, volatilities, is_call, rate=0.0):
+  """
+  Prices European options and computes their Greeks, all arguments are broadcast against each other.
+
+  Quedex options are options on USD quoted in BTC: spot is the spot_index of the underlying (price
+  of 1 USD in BTC), strikes are in BTC and prices are in BTC per 1 USD of notional.
+
+  :param times: times to expiration in years
+  :param volatilities: annualized volatilities
+  :param is_call: True for calls, False for puts
+  :param rate: continuously compounded risk free rate
+  :return: tuple of arrays (price, delta, gamma, vega, theta), vega per 1.0 of volatility and theta
+           per year
+  """
+  spot = np.asarray(spot, dtype=np.float64)
+  strikes = np.asarray(strikes, dtype=np.float64)
+  times = np.asarray(times, dtype=np.float64)
+  volatilities = np.asarray(volatilities, dtype=np.float64)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    sqrt_times = np.sqrt(times)
+    deviations = volatilities * sqrt_times
+    d1 = (np.log(spot / strikes) + (rate + 0.5 * volatilities * volatilities) * times) / deviations
+    d2 = d1 - deviations
+    discounted_strikes = strikes * np.exp(-rate * times)
+    pdf_d1 = norm_pdf(d1)
+    cdf_d1 = norm_cdf(d1)
+    cdf_d2 = norm_cdf(d2)
+    call_price = spot * cdf_d1 - discounted_strikes * cdf_d2
+    put_price = call_price - spot + discounted_strikes
+    price = np.where(is_call, call_price, put_price)
+    delta = np.where(is_call, cdf_d1, cdf_d1 - 1.0)
+    gamma = pdf_d1 / (spot * deviations)
+    vega = spot * pdf_d1 * sqrt_times
+    decay = -spot * pdf_d1 * volatilities / (2 * sqrt_times)
+    theta = np.where(
+      is_call,
+      decay - rate * discounted_strikes * cdf_d2,
+      decay + rate * discounted_strikes * (1.0 - cdf_d2),
+    )
+  return price, delta, gamma, vega, theta
+
+
+def implied_volatility(prices, spot, strikes, times, is_call, rate=0.0, tolerance=1e-10,
+                       iterations=64, initial_volatilities=None):
+  """
+  Inverts black_scholes for volatility, vectorized: Newton steps kept within a shrinking bracket,
+  with bisection whenever a step would leave it. Options drop out of the iteration as they
+  converge, so that the steps are taken only for the ones still pending.
+
+  :param prices: option prices, NaN where there is no price
+  :param tolerance: maximal absolute error of the price, relative to spot
+  :param initial_volatilities: starting points of the iteration, e.g. the implied volatilities at
+                               the previous prices - NaN (or None for all) where the starting point
+                               is estimated from the price
+  :return: array of implied volatilities, NaN where the price is out of the no-arbitrage bounds
+  """
+  prices, spot, strikes, times, is_call = np.broadcast_arrays(
+    np.asarray(prices, dtype=np.float64), np.asarray(spot, dtype=np.float64),
+    np.asarray(strikes, dtype=np.float64), np.asarray(times, dtype=np.float64), np.asarray(is_call),
+  )
+  discounted_strikes = strikes * np.exp(-rate * times)
+  lower_bound = np.where(
+    is_call, np.maximum(spot - discounted_strikes, 0), np.maximum(discounted_strikes - spot, 0)
+  )
+  upper_bound = np.where(is_call, spot, discounted_strikes)
+  with np.errstate(invalid='ignore'):
+    valid = (prices > lower_bound) & (prices < upper_bound) & (times > 0)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # Brenner and Subrahmanyam approximation on the time value as the starting point
+    volatilities = np.clip(np.sqrt(2 * math.pi / times) * (prices - lower_bound) / spot, 0.01, 5.0)
+  if initial_volatilities is not None:
+    initial_volatilities = np.asarray(initial_volatilities, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+      volatilities = np.where(
+        (initial_volatilities > 1e-6) & (initial_volatilities < 10.0), initial_volatilities,
+        volatilities,
+      )
+  results = np.where(valid, volatilities, np.nan).ravel()
+  # flat indexes of the options still iterated, their arguments and brackets
+  pending = np.flatnonzero(valid)
+  prices, spot, discounted_strikes, times, is_call = [
+    array.ravel()[pending] for array in (prices, spot, discounted_strikes, times, is_call)
+  ]
+  volatilities = results[pending]
+  low = np.full(len(pending), 1e-6)
+  high = np.full(len(pending), 10.0)
+  for _ in range(iterations):
+    price, vega = _price_and_vega(spot, discounted_strikes, times, volatilities, is_call)
+    errors = price - prices
+    unconverged = np.abs(errors) > tolerance * spot
+    if not unconverged.any():
+      results[pending] = volatilities
+      break
+    if not unconverged.all():
+      results[pending] = volatilities
+      arrays = [
+        array[unconverged] for array in (
+          pending, prices, spot, discounted_strikes, times, is_call, volatilities, low, high,
+          errors, vega,
+        )
+      ]
+      pending, prices, spot, discounted_strikes, times, is_call = arrays[:6]
+      volatilities, low, high, errors, vega = arrays[6:]
+    high = np.where(errors > 0, volatilities, high)
+    low = np.where(errors < 0, volatilities, low)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      newton = volatilities - errors / vega
+    inside = (newton > low) & (newton < high)
+    volatilities = np.where(inside, newton, (low + high) / 2)
+  else:
+    results[pending] = volatilities
+  return results.reshape(valid.shape)
+
+
+def _price_and_vega(spot, discounted_strikes, times, volatilities, is_call):
+  # the part of black_scholes needed by implied_volatility, without the other Greeks
+  with np.errstate(divide='ignore', invalid='ignore'):
+    sqrt_times = np.sqrt(times)
+    deviations = volatilities * sqrt_times
+    d1 = np.log(spot / discounted_strikes) / deviations + 0.5 * deviations
+    pdf_d1 = norm_pdf(d1)
+    call_price = spot * norm_cdf(d1) - discounted_strikes * norm_cdf(d1 - deviations)
+  price = np.where(is_call, call_price, call_price - spot + discounted_strikes)
+  return price, spot * pdf_d1 * sqrt_times
+
+
+class OptionPricer(MarketStreamListener):
+  """
+  MarketStreamListener pricing all options with Black-Scholes (see black_scholes), vectorized: from
+  instrument_data it builds one array of OPTION_RESULT_DTYPE with the options of every underlying
+  and expiration (an expiry) in a contiguous block ordered by strike, quotes set mids of the options
+  and spot_data the spot of the underlying. Expiries are recomputed only when read after a change,
+  all changed ones in a single vectorized pass: implied volatilities from the mids, then prices and
+  Greeks at the volatility set with set_volatility or, if none is set, at the implied volatility of
+  each option. A quote changes only its own option, so only the quoted options of an expiry are
+  recomputed, unless the whole expiry changed. Times to expiration are taken at recomputation of
+  each option - call invalidate to bring all of them to the current time.
+  """
+
+  def __init__(self, registry=None, rate=0.0, clock=None, tick_table=None):
+    """
+    :param registry: InstrumentRegistry with the strikes and expirations of the options, which may
+                     also feed an OptionChain; a new one if None
+    :param rate: continuously compounded risk free rate
+    :param clock: function returning current time in millis from epoch, from time.time by default
+    :param tick_table: TickTable of a stream in ticks mode, mids are then computed from bids and
+                       asks in ticks
+    """
+    self.registry = registry if registry is not None else InstrumentRegistry()
+    self.tick_table = tick_table
+    self.rate = rate
+    self.recomputed_count = 0
+    self._clock = clock or (lambda: time.time() * 1000)
+    self._registry_version = None
+    self._spots = {}
+    self._results = np.zeros(0, dtype=OPTION_RESULT_DTYPE)
+    self._expiration_dates = np.zeros(0, dtype=np.int64)
+    self._instrument_ids = []
+    # (underlying symbol, expiration) -> (start, stop) of the rows of the expiry
+    self._expiries = {}
+    self._dirty = set()
+    # expiry -> rows of the quoted options of an expiry which is not dirty as a whole
+    self._dirty_rows = {}
+    # instrument_id -> (row, expiry)
+    self._rows = {}
+
+  def on_instrument_data(self, instrument_data):
+    self.registry.on_instrument_data(instrument_data)
+    if self.registry.version == self._registry_version:
+      return
+    self._registry_version = self.registry.version
+    options = sorted(
+      (instrument for instrument in self.registry
+       if instrument.is_option and instrument.strike is not None
+       and instrument.expiration_date is not None),
+      key=lambda instrument: (
+        instrument.underlying_symbol, instrument.expiration_date, instrument.strike,
+        not instrument.is_call,
+      )
+    )
+    results = np.zeros(len(options), dtype=OPTION_RESULT_DTYPE)
+    results['strike'] = [float(instrument.strike) for instrument in options]
+    results['is_call'] = [instrument.is_call for instrument in options]
+    results['mid'] = np.nan
+    results['volatility'] = np.nan
+    # mids and volatilities of the instruments still traded are carried over, field by field -
+    # indexing with several fields gives a copy on older numpy, so assigning through it is lost
+    for row, instrument in enumerate(options):
+      previous = self._rows.get(instrument.instrument_id)
+      if previous is not None:
+        results['mid'][row] = self._results['mid'][previous[0]]
+        results['volatility'][row] = self._results['volatility'][previous[0]]
+    self._results = results
+    self._expiration_dates = np.array(
+      [instrument.expiration_date for instrument in options], dtype=np.int64
+    )
+    self._instrument_ids = [instrument.instrument_id for instrument in options]
+    self._expiries = {}
+    self._rows = {}
+    for row, instrument in enumerate(options):
+      expiry = (instrument.underlying_symbol, instrument.expiration_date)
+      start, _ = self._expiries.get(expiry, (row, row))
+      self._expiries[expiry] = (start, row + 1)
+      self._rows[instrument.instrument_id] = (row, expiry)
+    self._dirty = set(self._expiries)
+    self._dirty_rows = {}
+
+  def on_spot_data(self, spot_data):
+    for underlying_symbol, data in spot_data['spot_data'].items():
+      spot = float(data['spot_index'])
+      if self._spots.get(underlying_symbol) != spot:
+        self._spots[underlying_symbol] = spot
+        self._dirty.update(expiry for expiry in self._expiries if expiry[0] == underlying_symbol)
+
+  def on_quotes(self, quotes):
+    instrument_id = quotes['instrument_id']
+    position = self._rows.get(instrument_id)
+    if position is None:
+      return
+    row, expiry = position
+    # NaN if either side is missing
+    mid = (
+      float_price(quotes['bid'], self.tick_table, instrument_id) +
+      float_price(quotes['ask'], self.tick_table, instrument_id)
+    ) / 2
+    previous = self._results['mid'][row]
+    if mid != previous and not (np.isnan(mid) and np.isnan(previous)):
+      self._results['mid'][row] = mid
+      if expiry not in self._dirty:
+        self._dirty_rows.setdefault(expiry, []).append(row)
+
+  def set_volatility(self, volatility, underlying_symbol=None, expiration_date=None):
+    """
+    Sets the volatility at which prices and Greeks are computed, for all options or those of the
+    given underlying and/or expiration. None reverts to the implied volatility of each option.
+
+    :param volatility: annualized volatility - a number or, when setting a single expiry, an array
+                       of volatilities ordered as the options of the expiry
+    """
+    for expiry, (start, stop) in self._expiries.items():
+      if underlying_symbol not in (None, expiry[0]) or expiration_date not in (None, expiry[1]):
+        continue
+      self._results['volatility'][start:stop] = np.nan if volatility is None else volatility
+      self._dirty.add(expiry)
+
+  def expirations(self, underlying_symbol=None):
+    """
+    :return: sorted list of tuples (<underlying symbol>, <expiration in millis>) of all expiries
+    """
+    return sorted(expiry for expiry in self._expiries if underlying_symbol in (None, expiry[0]))
+
+  def instrument_ids(self, underlying_symbol, expiration_date):
+    """
+    :return: ids of the options of the expiry, ordered as the rows of results
+    """
+    start, stop = self._expiries[(underlying_symbol, expiration_date)]
+    return self._instrument_ids[start:stop]
+
+  def results(self, underlying_symbol, expiration_date):
+    """
+    :return: read-only view of the rows (OPTION_RESULT_DTYPE) of the options of the expiry,
+             recomputed first if anything changed - valid until the next recomputation
+    """
+    expiry = (underlying_symbol, expiration_date)
+    start, stop = self._expiries[expiry]
+    if expiry in self._dirty or expiry in self._dirty_rows:
+      self.refresh()
+    results = self._results[start:stop]
+    results.flags.writeable = False
+    return results
+
+  def refresh(self):
+    """
+    Recomputes all expiries which changed.
+
+    :return: list of tuples (<underlying symbol>, <expiration in millis>) of the recomputed expiries
+    """
+    if not self._dirty and not self._dirty_rows:
+      return []
+    recomputed = sorted(self._dirty.union(self._dirty_rows))
+    if len(self._dirty) == len(self._expiries):
+      rows = slice(None)
+    else:
+      rows = np.concatenate(
+        [np.arange(*self._expiries[expiry]) for expiry in self._dirty] +
+        [np.array(expiry_rows, dtype=np.intp) for expiry, expiry_rows in self._dirty_rows.items()
+         if expiry not in self._dirty]
+      )
+    spots = np.empty(len(self._results), dtype=np.float64)
+    for expiry, (start, stop) in self._expiries.items():
+      spots[start:stop] = self._spots.get(expiry[0], np.nan)
+    self._recompute(rows, spots[rows])
+    self._dirty = set()
+    self._dirty_rows = {}
+    self.recomputed_count += len(recomputed)
+    return recomputed
+
+  def invalidate(self):
+    """
+    Marks all expiries for recomputation, e.g. to account for the passage of time.
+    """
+    self._dirty = set(self._expiries)
+
+  def _recompute(self, rows, spots):
+    results = self._results[rows]
+    years = np.maximum(self._expiration_dates[rows] - self._clock(), 0) / MILLIS_PER_YEAR
+    # the previous implied volatilities are close when the mids or the spot move a little
+    results['implied_volatility'] = implied_volatility(
+      results['mid'], spots, results['strike'], years, results['is_call'], self.rate,
+      initial_volatilities=results['implied_volatility'],
+    )
+    volatilities = np.where(
+      np.isnan(results['volatility']), results['implied_volatility'], results['volatility']
+    )
+    price, delta, gamma, vega, theta = black_scholes(
+      spots, results['strike'], years, volatilities, results['is_call'], self.rate
+    )
+    results['price'] = price
+    results['delta'] = delta
+    results['gamma'] = gamma
+    results['vega'] = vega
+    results['theta'] = theta
+    self._results[rows] = results
@@ -0,0 +1,405 @@
+from decimal import Decimal
+
+import numpy as np
+
+from .market_stream import MarketStreamListener
+from .ticks import TickConverter
+
+
+class OrderBook(object):
+  """
+  Order book of a single instrument, kept in preallocated NumPy arrays of int64: prices as numbers
+  of ticks and quantities. Bids are ordered from the highest price, asks from the lowest, so the
+  best level of each side is at index 0.
+
+  The arrays returned by the properties are read-only views valid until the next update of the
+  book - copy them to keep the state. The views are created once per update of the side.
+
+  The best levels are kept as Python ints, taken at the update, and depths are read from
+  cumulative quantities of the side, summed on the first depth query after the levels of the side
+  change - that query costs about as much as summing the last order_book message, the following
+  ones less.
+
+  Sweep queries (vwap, sweep_price, price_impact, quantity_up_to) take the side of the book, "bid"
+  or "ask", to be swept - "ask" for buying. They binary search cumulative quantity and notional
+  (price in ticks times quantity) arrays of the side, which are rebuilt on the first query after
+  the levels of the side change.
+  """
+
+  def __init__(self, instrument_id, tick_converter, capacity=16, in_ticks=False):
+    """
+    :param tick_converter: TickConverter for the tick size of the instrument
+    :param capacity: number of levels per side allocated upfront, grown when needed
+    :param in_ticks: if True, prices of the levels passed to update are already numbers of ticks
+    """
+    self.instrument_id = instrument_id
+    self.tick_converter = tick_converter
+    self._to_ticks = int if in_ticks else tick_converter.to_ticks
+    self.updates = 0
+    self._bid_prices = np.zeros(capacity, dtype=np.int64)
+    self._bid_quantities = np.zeros(capacity, dtype=np.int64)
+    self._ask_prices = np.zeros(capacity, dtype=np.int64)
+    self._ask_quantities = np.zeros(capacity, dtype=np.int64)
+    self._bid_count = 0
+    self._ask_count = 0
+    # levels from which the arrays were filled, a side equal to them is not converted again
+    self._bids = None
+    self._asks = None
+    # side -> (cumulative quantities, cumulative notionals) or None until the next sweep query
+    self._cumulative = {'bid': None, 'ask': None}
+    # side -> list of cumulative quantities or None until the next depth query
+    self._depths = {'bid': None, 'ask': None}
+    # name of an array property -> its read-only view, until the next update of the side
+    self._views = {}
+    self._best_bid = None
+    self._best_ask = None
+
+  def update(self, bids, asks):
+    """
+    Replaces the content of the book.
+
+    :param bids: list of [<decimal price as string or ticks>, <int quantity>] as in order_book
+                 messages
+    :param asks: as bids
+    """
+    if bids != self._bids:
+      self._bid_count = self._fill_bids(bids)
+      self._bids = bids
+      self._best_bid = _best_level(self._bid_prices, self._bid_quantities, self._bid_count)
+      self._cumulative['bid'] = None
+      self._depths['bid'] = None
+      self._views.pop('bid_prices', None)
+      self._views.pop('bid_quantities', None)
+    if asks != self._asks:
+      self._ask_count = self._fill_asks(asks)
+      self._asks = asks
+      self._best_ask = _best_level(self._ask_prices, self._ask_quantities, self._ask_count)
+      self._cumulative['ask'] = None
+      self._depths['ask'] = None
+      self._views.pop('ask_prices', None)
+      self._views.pop('ask_quantities', None)
+    self.updates += 1
+
+  def _fill_bids(self, levels):
+    count = len(levels)
+    if count > len(self._bid_prices):
+      self._bid_prices = np.zeros(_grown_capacity(count), dtype=np.int64)
+      self._bid_quantities = np.zeros(_grown_capacity(count), dtype=np.int64)
+    _fill_side(self._bid_prices, self._bid_quantities, levels, self._to_ticks, descending=True)
+    return count
+
+  def _fill_asks(self, levels):
+    count = len(levels)
+    if count > len(self._ask_prices):
+      self._ask_prices = np.zeros(_grown_capacity(count), dtype=np.int64)
+      self._ask_quantities = np.zeros(_grown_capacity(count), dtype=np.int64)
+    _fill_side(self._ask_prices, self._ask_quantities, levels, self._to_ticks, descending=False)
+    return count
+
+  @property
+  def tick_size(self):
+    return self.tick_converter.tick_size
+
+  @property
+  def bid_prices(self):
+    view = self._views.get('bid_prices')
+    if view is None:
+      view = self._views['bid_prices'] = _read_only(self._bid_prices[:self._bid_count])
+    return view
+
+  @property
+  def bid_quantities(self):
+    view = self._views.get('bid_quantities')
+    if view is None:
+      view = self._views['bid_quantities'] = _read_only(self._bid_quantities[:self._bid_count])
+    return view
+
+  @property
+  def ask_prices(self):
+    view = self._views.get('ask_prices')
+    if view is None:
+      view = self._views['ask_prices'] = _read_only(self._ask_prices[:self._ask_count])
+    return view
+
+  @property
+  def ask_quantities(self):
+    view = self._views.get('ask_quantities')
+    if view is None:
+      view = self._views['ask_quantities'] = _read_only(self._ask_quantities[:self._ask_count])
+    return view
+
+  @property
+  def bid_levels(self):
+    return self._bid_count
+
+  @property
+  def ask_levels(self):
+    return self._ask_count
+
+  def best_bid(self):
+    """
+    :return: tuple (<price in ticks>, <quantity>) or None if there are no bids
+    """
+    return self._best_bid
+
+  def best_ask(self):
+    """
+    :return: tuple (<price in ticks>, <quantity>) or None if there are no asks
+    """
+    return self._best_ask
+
+  def spread(self):
+    """
+    :return: difference of the best ask and the best bid in ticks or None if a side is empty
+    """
+    if self._best_bid is None or self._best_ask is None:
+      return None
+    return self._best_ask[0] - self._best_bid[0]
+
+  def bid_depth(self, levels=None):
+    """
+    :param levels: number of the best levels to sum, all levels if None
+    :return: total quantity of the levels
+    """
+    return self._depth('bid', levels)
+
+  def ask_depth(self, levels=None):
+    """
+    :param levels: number of the best levels to sum, all levels if None
+    :return: total quantity of the levels
+    """
+    return self._depth('ask', levels)
+
+  def bid_quantity_at(self, price_ticks):
+    """
+    :return: quantity bid at exactly the given price (in ticks), 0 if there is no such level
+    """
+    prices = self._bid_prices[:self._bid_count]
+    # bids are descending, so the position is found in the negated prices
+    index = int(np.searchsorted(-prices, -price_ticks))
+    if index < self._bid_count and prices[index] == price_ticks:
+      return int(self._bid_quantities[index])
+    return 0
+
+  def ask_quantity_at(self, price_ticks):
+    """
+    :return: quantity offered at exactly the given price (in ticks), 0 if there is no such level
+    """
+    prices = self._ask_prices[:self._ask_count]
+    index = int(np.searchsorted(prices, price_ticks))
+    if index < self._ask_count and prices[index] == price_ticks:
+      return int(self._ask_quantities[index])
+    return 0
+
+  def vwap(self, side, quantity):
+    """
+    :param side: "bid" or "ask"
+    :param quantity: quantity to be filled from the best level of the side on
+    :return: average price (in ticks, float) of filling the quantity or None if the side does not
+             hold as much
+    """
+    level, notional = self._sweep(side, quantity)
+    if level is None:
+      return None
+    return float(notional) / quantity
+
+  def sweep_price(self, side, quantity):
+    """
+    :return: price (in ticks) of the worst level reached when filling the quantity from the side or
+             None if the side does not hold as much
+    """
+    level, _ = self._sweep(side, quantity)
+    if level is None:
+      return None
+    return int(self._prices(side)[level])
+
+  def price_impact(self, side, quantity):
+    """
+    :return: difference (in ticks, float, not negative) between vwap of the quantity and the best
+             price of the side or None if the side does not hold as much
+    """
+    vwap = self.vwap(side, quantity)
+    if vwap is None:
+      return None
+    return abs(vwap - int(self._prices(side)[0]))
+
+  def quantity_up_to(self, side, price_ticks):
+    """
+    :return: total quantity of the levels of the side at the price (in ticks) or better - for bids
+             at the price or higher, for asks at the price or lower
+    """
+    prices = self._prices(side)
+    cumulative_quantities, _ = self._cumulative_arrays(side)
+    if side == 'bid':
+      levels = int(np.searchsorted(-prices, -price_ticks, side='right'))
+    else:
+      levels = int(np.searchsorted(prices, price_ticks, side='right'))
+    return int(cumulative_quantities[levels - 1]) if levels else 0
+
+  def _sweep(self, side, quantity):
+    # returns (index of the last level reached, notional of the fill) or (None, None)
+    if quantity <= 0:
+      raise ValueError('Quantity has to be positive, got: %s' % quantity)
+    cumulative_quantities, cumulative_notionals = self._cumulative_arrays(side)
+    level = int(np.searchsorted(cumulative_quantities, quantity))
+    if level == len(cumulative_quantities):
+      return None, None
+    notional = int(self._prices(side)[level]) * quantity
+    if level:
+      filled = int(cumulative_quantities[level - 1])
+      notional += int(cumulative_notionals[level - 1]) - int(self._prices(side)[level]) * filled
+    return level, notional
+
+  def _depth(self, side, levels):
+    depths = self._depths[side]
+    if depths is None:
+      if side == 'bid':
+        quantities = self._bid_quantities[:self._bid_count]
+      else:
+        quantities = self._ask_quantities[:self._ask_count]
+      depths = self._depths[side] = np.cumsum(quantities).tolist()
+    if not depths or levels == 0:
+      return 0
+    return depths[-1] if levels is None or levels >= len(depths) else depths[levels - 1]
+
+  def _prices(self, side):
+    if side == 'bid':
+      return self._bid_prices[:self._bid_count]
+    elif side == 'ask':
+      return self._ask_prices[:self._ask_count]
+    raise ValueError('Side has to be "bid" or "ask", got: %s' % side)
+
+  def _cumulative_arrays(self, side):
+    prices = self._prices(side)
+    cumulative = self._cumulative[side]
+    if cumulative is None:
+      if side == 'bid':
+        quantities = self._bid_quantities[:self._bid_count]
+      else:
+        quantities = self._ask_quantities[:self._ask_count]
+      cumulative = self._cumulative[side] = (np.cumsum(quantities), np.cumsum(prices * quantities))
+    return cumulative
+
+  def to_price(self, ticks):
+    """
+    :return: the price in ticks as Decimal
+    """
+    return self.tick_converter.to_price(ticks)
+
+  @property
+  def nbytes(self):
+    """
+    Memory taken by the arrays of the book, in bytes.
+    """
+    return (self._bid_prices.nbytes + self._bid_quantities.nbytes + self._ask_prices.nbytes +
+            self._ask_quantities.nbytes)
+
+
+class OrderBookStore(MarketStreamListener):
+  """
+  MarketStreamListener keeping an OrderBook for every instrument for which order_book messages
+  arrive. Prices are converted to ticks with the tick sizes from instrument_data, which the
+  exchange sends before any other message.
+
+  Add an instance to MarketStream with add_listener and read the books with book(instrument_id).
+  """
+
+  def __init__(self, capacity=16, tick_table=None):
+    """
+    :param capacity: number of levels per side allocated upfront for every book
+    :param tick_table: TickTable of a stream in ticks mode - levels arrive in ticks and are stored
+                       as they are, the books share the converters of the table
+    """
+    self.tick_table = tick_table
+    self._capacity = capacity
+    self._tick_converters = {}
+    self._tick_converters_by_size = {}
+    self._books = {}
+
+  def on_instrument_data(self, instrument_data):
+    for instrument_id, instrument in instrument_data['data'].items():
+      tick_size = Decimal(instrument['tick_size'])
+      previous = self._tick_converters.get(instrument_id)
+      if previous is None or previous.tick_size != tick_size:
+        # instruments of the same tick size share the converter and its cache
+        tick_converter = self._tick_converters_by_size.get(tick_size)
+        if tick_converter is None:
+          if self.tick_table is not None:
+            # the stream has already updated the table with this instrument_data
+            tick_converter = self.tick_table.converter(instrument_id)
+          else:
+            tick_converter = TickConverter(tick_size)
+          self._tick_converters_by_size[tick_size] = tick_converter
+        self._tick_converters[instrument_id] = tick_converter
+        # a book of a different tick size would be inconsistent, it is rebuilt on the next update
+        self._books.pop(instrument_id, None)
+
+  def on_order_book(self, order_book):
+    instrument_id = order_book['instrument_id']
+    book = self._books.get(instrument_id)
+    if book is None:
+      book = self._create_book(instrument_id)
+    book.update(order_book['bids'], order_book['asks'])
+
+  def _create_book(self, instrument_id):
+    tick_converter = self._tick_converters.get(instrument_id)
+    if tick_converter is None:
+      raise ValueError(
+        'Order book of instrument %s received before its instrument data' % instrument_id
+      )
+    book = self._books[instrument_id] = OrderBook(
+      instrument_id, tick_converter, self._capacity, in_ticks=self.tick_table is not None
+    )
+    return book
+
+  def book(self, instrument_id):
+    """
+    :return: OrderBook of the instrument or None if no order_book message arrived for it yet
+    """
+    return self._books.get(instrument_id)
+
+  def tick_converter(self, instrument_id):
+    """
+    :return: TickConverter of the instrument or None if it is not known from instrument_data
+    """
+    return self._tick_converters.get(instrument_id)
+
+  @property
+  def instrument_ids(self):
+    return list(self._books)
+
+  @property
+  def nbytes(self):
+    """
+    Memory taken by the arrays of all books, in bytes.
+    """
+    return sum(book.nbytes for book in self._books.values())
+
+
+def _fill_side(prices, quantities, levels, to_ticks, descending):
+  count = len(levels)
+  prices[:count] = [to_ticks(level[0]) for level in levels]
+  quantities[:count] = [level[1] for level in levels]
+  # the exchange sends levels from the best one, anything else is sorted
+  if count > 1:
+    steps = np.diff(prices[:count])
+    if (descending and (steps >= 0).any()) or (not descending and (steps <= 0).any()):
+      order = np.argsort(-prices[:count] if descending else prices[:count], kind='mergesort')
+      prices[:count] = prices[:count][order]
+      quantities[:count] = quantities[:count][order]
+
+
+def _grown_capacity(count):
+  capacity = 1
+  while capacity < count:
+    capacity *= 2
+  return capacity
+
+
+def _best_level(prices, quantities, count):
+  return (int(prices[0]), int(quantities[0])) if count else None
+
+
+def _read_only(array):
+  array.flags.writeable = False
+  return array
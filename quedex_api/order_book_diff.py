@@ -0,0 +1,62 @@
+class OrderBookDiffer(object):
+  """
+  Compares every order_book message with the previous one of the same instrument and produces
+  order_book_delta messages holding only the levels which changed. Levels are identified by the
+  price strings as sent by the exchange.
+  """
+
+  def __init__(self):
+    # instrument_id -> (<dict bid price -> quantity>, <dict ask price -> quantity>)
+    self._books = {}
+
+  def diff(self, order_book):
+    """
+    :param order_book: order_book message, see MarketStreamListener.on_order_book
+    :return: order_book_delta message (see MarketStreamListener.on_order_book_delta) or None if no
+             level changed - the first order_book of an instrument yields all its levels as added
+    """
+    instrument_id = order_book['instrument_id']
+    previous_bids, previous_asks = self._books.get(instrument_id, ({}, {}))
+    changes = []
+    bids = _diff_side('bid', previous_bids, order_book['bids'], changes)
+    asks = _diff_side('ask', previous_asks, order_book['asks'], changes)
+    self._books[instrument_id] = (bids, asks)
+    if not changes:
+      return None
+    return {'type': 'order_book_delta', 'instrument_id': instrument_id, 'changes': changes}
+
+  def reset(self, instrument_ids=None):
+    """
+    Forgets the previous order books of the instruments, the next order_book of each of them yields
+    all its levels.
+
+    :param instrument_ids: ids of the instruments, all instruments if None
+    """
+    if instrument_ids is None:
+      self._books = {}
+      return
+    for instrument_id in instrument_ids:
+      self._books.pop(instrument_id, None)
+
+  @property
+  def instrument_ids(self):
+    """
+    Ids of the instruments whose previous order books are kept.
+    """
+    return list(self._books)
+
+  def __len__(self):
+    return len(self._books)
+
+
+def _diff_side(side, previous, levels, changes):
+  # previous is consumed: what is left after popping the current levels has been removed
+  current = {}
+  for price, quantity in levels:
+    current[price] = quantity
+    old_quantity = previous.pop(price, 0)
+    if old_quantity != quantity:
+      changes.append([side, price, old_quantity, quantity])
+  for price, old_quantity in previous.items():
+    changes.append([side, price, old_quantity, 0])
+  return current
@@ -0,0 +1,385 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from decimal import Decimal
+from numbers import Integral
+
+from .messages import Message
+from .user_stream import UserStreamListener
+
+BUY = 'buy'
+SELL = 'sell'
+
+
+class Order(object):
+  """
+  A live order. price is a Decimal, or an integer number of ticks if the OrderManager has a
+  tick_table, quantity is the quantity left to fill. externally_modified is True if the order has
+  been modified by a command the manager has not seen (sent by another session or nonce group) -
+  its price may then be stale, until the order is placed again or the welcome pack arrives.
+  """
+
+  __slots__ = (
+    'client_order_id', 'instrument_id', 'side', 'price', 'quantity', 'filled_quantity',
+    'externally_modified',
+  )
+
+  def __init__(self, client_order_id, instrument_id, side, price, quantity, filled_quantity=0):
+    self.client_order_id = client_order_id
+    self.instrument_id = instrument_id
+    self.side = side
+    self.price = price
+    self.quantity = quantity
+    self.filled_quantity = filled_quantity
+    self.externally_modified = False
+
+  def __repr__(self):
+    return 'Order(%s, %s, %s %s @ %s)' % (
+      self.client_order_id, self.instrument_id, self.side, self.quantity, self.price
+    )
+
+
+class _Level(object):
+  __slots__ = ('quantity', 'orders')
+
+  def __init__(self):
+    self.quantity = 0
+    # client_order_id -> Order, in the order of placing
+    self.orders = {}
+
+
+class _Side(object):
+  # live orders of one side of one instrument, indexed by price level
+  __slots__ = ('quantity', 'orders', 'prices', 'levels')
+
+  def __init__(self):
+    self.quantity = 0
+    self.orders = {}
+    # ascending
+    self.prices = []
+    # price -> _Level
+    self.levels = {}
+
+
+class OrderManager(UserStreamListener):
+  """
+  UserStreamListener keeping the live orders of the account, built from order_placed and kept up
+  to date with fills, modifications and cancellations - orders are forgotten when filled or
+  cancelled. Orders are indexed by client_order_id, by instrument and side (with total quantity)
+  and by price level (with total quantity per level, prices kept sorted), so that lookups and
+  aggregates are O(1) and finding levels by price O(log n).
+
+  The state is cleared on on_ready and rebuilt from the welcome pack (on_snapshot), so that it is
+  correct after reconnecting. Works with dicts and with typed messages (typed_messages of
+  UserStream).
+
+  Prices are kept as Decimals, or as integer numbers of ticks if the manager is given the
+  TickTable of a UserStream in ticks mode - decimal strings are then converted to ticks, while
+  ticks without a table are rejected with ValueError, so that prices of different units never
+  mix. This applies to the prices given to the query methods too.
+
+  order_modified carries only client_order_id - the new price and quantity are taken from the
+  modify_order commands, which UserStream passes to on_modify_order as they are sent (and as the
+  timers of time triggered batches trigger). If order_modified carries new_limit_price or
+  new_quantity, it settles the pending modification of the order with the same values and its
+  values are applied. Otherwise it settles the oldest pending modification, as the exchange
+  executes the commands of a session in the order of sending, and so does
+  order_modification_failed. An order modified with no pending modification, or with none matching
+  order_modified, or whose fill does not add up with its quantity, is marked externally_modified
+  (its quantity is refreshed by fills and by order_modified carrying it).
+
+  client_order_ids are kept as strings, as received from the exchange, but may be given as
+  integers to all methods.
+  """
+
+  def __init__(self, tick_table=None):
+    """
+    :param tick_table: the TickTable of a UserStream in ticks mode, to keep prices in ticks; None
+                       for a stream delivering decimal strings
+    """
+    self.tick_table = tick_table
+    # client_order_id -> Order
+    self._orders = {}
+    # (instrument_id, side) -> _Side
+    self._sides = {}
+    # client_order_id -> deque of (new price or None, new quantity or None) of the sent
+    # modify_order commands not yet settled, oldest first
+    self._modifications = {}
+
+  def on_ready(self):
+    self.clear()
+
+  def on_snapshot(self, orders, positions, account_state):
+    self.clear()
+    for order_placed in orders:
+      self.on_order_placed(order_placed)
+
+  def on_order_placed(self, order_placed):
+    client_order_id = str(_field(order_placed, 'client_order_id'))
+    if client_order_id in self._orders:
+      self._remove(self._orders[client_order_id])
+    instrument_id = _field(order_placed, 'instrument_id')
+    self._add(Order(
+      client_order_id,
+      instrument_id,
+      _field(order_placed, 'side').lower(),
+      self._price(_field(order_placed, 'limit_price'), instrument_id),
+      _field(order_placed, 'quantity'),
+    ))
+
+  def on_order_filled(self, order_filled):
+    order = self._orders.get(str(_field(order_filled, 'client_order_id')))
+    if order is None:
+      return
+    trade_quantity = _field(order_filled, 'trade_quantity') or 0
+    leaves_order_quantity = _field(order_filled, 'leaves_order_quantity')
+    if order.quantity - trade_quantity != leaves_order_quantity:
+      order.externally_modified = True
+    order.filled_quantity += trade_quantity
+    self._set_quantity(order, leaves_order_quantity)
+
+  def on_modify_order(self, modify_order_command):
+    """
+    Called by UserStream with every modify_order command it sends - not to be called directly
+    when the manager is a listener of the stream.
+
+    :param modify_order_command: the command as sent
+    """
+    client_order_id = str(modify_order_command['client_order_id'])
+    modifications = self._modifications.get(client_order_id)
+    if modifications is None:
+      modifications = self._modifications[client_order_id] = deque()
+    modifications.append(
+      (modify_order_command.get('new_price'), modify_order_command.get('new_quantity'))
+    )
+
+  def on_order_modified(self, order_modified):
+    client_order_id = str(_field(order_modified, 'client_order_id'))
+    order = self._orders.get(client_order_id)
+    new_price = _field(order_modified, 'new_limit_price')
+    new_quantity = _field(order_modified, 'new_quantity')
+    if order is None:
+      self._settle_modification(client_order_id)
+      return
+    if new_price is not None:
+      new_price = self._price(new_price, order.instrument_id)
+    if new_price is None and new_quantity is None:
+      modification = self._settle_modification(client_order_id)
+      if modification is None:
+        order.externally_modified = True
+        return
+      new_price, new_quantity = modification
+      if new_price is not None:
+        new_price = self._price(new_price, order.instrument_id)
+    elif not self._settle_matching_modification(order, new_price, new_quantity):
+      order.externally_modified = True
+    if new_price is not None:
+      self._remove(order)
+      order.price = new_price
+      self._add(order)
+    if new_quantity is not None:
+      self._set_quantity(order, new_quantity)
+
+  def on_order_modification_failed(self, order_modification_failed):
+    self._settle_modification(str(_field(order_modification_failed, 'client_order_id')))
+
+  def on_order_cancelled(self, order_cancelled):
+    self._forget(_field(order_cancelled, 'client_order_id'))
+
+  def on_order_forcefully_cancelled(self, order_forcefully_cancelled):
+    self._forget(_field(order_forcefully_cancelled, 'client_order_id'))
+
+  def on_all_orders_cancelled(self, all_orders_cancelled):
+    self.clear()
+
+  def clear(self):
+    self._orders = {}
+    self._sides = {}
+    self._modifications = {}
+
+  def get(self, client_order_id):
+    """
+    :return: Order or None if there is no live order of the id
+    """
+    return self._orders.get(str(client_order_id))
+
+  def __contains__(self, client_order_id):
+    return str(client_order_id) in self._orders
+
+  def __len__(self):
+    return len(self._orders)
+
+  def __iter__(self):
+    return iter(list(self._orders.values()))
+
+  def orders(self, instrument_id, side=None):
+    """
+    :param side: "buy", "sell" or None for both
+    :return: list of the live orders of the instrument (and side), in the order of placing per side
+    """
+    orders = []
+    for one_side in (BUY, SELL) if side is None else (side,):
+      side_index = self._sides.get((instrument_id, one_side))
+      if side_index is not None:
+        orders.extend(side_index.orders.values())
+    return orders
+
+  def quantity(self, instrument_id, side):
+    """
+    :return: total quantity left to fill of the orders of the instrument and side
+    """
+    side_index = self._sides.get((instrument_id, side))
+    return side_index.quantity if side_index is not None else 0
+
+  def best_price(self, instrument_id, side):
+    """
+    :return: the highest price of the buy orders or the lowest of the sell orders of the instrument,
+             None if there are none
+    """
+    side_index = self._sides.get((instrument_id, side))
+    if side_index is None:
+      return None
+    return side_index.prices[-1] if side == BUY else side_index.prices[0]
+
+  def levels(self, instrument_id, side):
+    """
+    :return: list of tuples (<price>, <total quantity>) of the orders of the instrument and side,
+             best price first
+    """
+    side_index = self._sides.get((instrument_id, side))
+    if side_index is None:
+      return []
+    prices = reversed(side_index.prices) if side == BUY else side_index.prices
+    return [(price, side_index.levels[price].quantity) for price in prices]
+
+  def orders_at(self, instrument_id, side, price):
+    """
+    :param price: Decimal or decimal string, or integer number of ticks with a tick_table
+    :return: list of the orders of the instrument and side at the price, in the order of placing
+    """
+    level = self._level(instrument_id, side, price)
+    return list(level.orders.values()) if level is not None else []
+
+  def quantity_at(self, instrument_id, side, price):
+    """
+    :return: total quantity left to fill of the orders of the instrument and side at the price
+    """
+    level = self._level(instrument_id, side, price)
+    return level.quantity if level is not None else 0
+
+  def quantity_between(self, instrument_id, side, low_price, high_price):
+    """
+    :return: total quantity left to fill of the orders of the instrument and side with prices from
+             low_price to high_price (inclusive)
+    """
+    side_index = self._sides.get((instrument_id, side))
+    if side_index is None:
+      return 0
+    prices = side_index.prices
+    start = bisect_left(prices, self._price(low_price, instrument_id))
+    end = bisect_right(prices, self._price(high_price, instrument_id), start)
+    levels = side_index.levels
+    return sum(levels[price].quantity for price in prices[start:end])
+
+  def _level(self, instrument_id, side, price):
+    side_index = self._sides.get((instrument_id, side))
+    if side_index is None:
+      return None
+    return side_index.levels.get(self._price(price, instrument_id))
+
+  def _price(self, price, instrument_id):
+    if self.tick_table is not None:
+      if isinstance(price, Integral):
+        return price
+      return self.tick_table.to_ticks(instrument_id, price)
+    if isinstance(price, Integral):
+      raise ValueError(
+        'Price %r of instrument %s is in ticks, the OrderManager has no tick_table' % (
+          price, instrument_id
+        )
+      )
+    return price if isinstance(price, Decimal) else Decimal(price)
+
+  def _settle_modification(self, client_order_id):
+    """
+    :return: the oldest pending modification of the order, None if there is none
+    """
+    modifications = self._modifications.get(client_order_id)
+    if modifications is None:
+      return None
+    modification = modifications.popleft()
+    if not modifications:
+      del self._modifications[client_order_id]
+    return modification
+
+  def _settle_matching_modification(self, order, new_price, new_quantity):
+    """
+    :param new_price: the price carried by order_modified, normalized by _price, or None
+    :return: True if a pending modification of the order with the values was settled
+    """
+    modifications = self._modifications.get(order.client_order_id)
+    if modifications is None:
+      return False
+    for modification in modifications:
+      price, quantity = modification
+      if new_price is not None and (
+          price is None or self._price(price, order.instrument_id) != new_price):
+        continue
+      if new_quantity is not None and quantity != new_quantity:
+        continue
+      modifications.remove(modification)
+      if not modifications:
+        del self._modifications[order.client_order_id]
+      return True
+    return False
+
+  def _add(self, order):
+    key = (order.instrument_id, order.side)
+    side_index = self._sides.get(key)
+    if side_index is None:
+      side_index = self._sides[key] = _Side()
+    level = side_index.levels.get(order.price)
+    if level is None:
+      level = side_index.levels[order.price] = _Level()
+      insort(side_index.prices, order.price)
+    level.orders[order.client_order_id] = order
+    level.quantity += order.quantity
+    side_index.orders[order.client_order_id] = order
+    side_index.quantity += order.quantity
+    self._orders[order.client_order_id] = order
+
+  def _remove(self, order):
+    key = (order.instrument_id, order.side)
+    side_index = self._sides[key]
+    level = side_index.levels[order.price]
+    del level.orders[order.client_order_id]
+    level.quantity -= order.quantity
+    if not level.orders:
+      del side_index.levels[order.price]
+      del side_index.prices[bisect_left(side_index.prices, order.price)]
+    del side_index.orders[order.client_order_id]
+    side_index.quantity -= order.quantity
+    if not side_index.orders:
+      del self._sides[key]
+    del self._orders[order.client_order_id]
+
+  def _set_quantity(self, order, quantity):
+    if not quantity:
+      self._remove(order)
+      return
+    change = quantity - order.quantity
+    order.quantity = quantity
+    self._sides[(order.instrument_id, order.side)].quantity += change
+    self._sides[(order.instrument_id, order.side)].levels[order.price].quantity += change
+
+  def _forget(self, client_order_id):
+    client_order_id = str(client_order_id)
+    self._modifications.pop(client_order_id, None)
+    order = self._orders.get(client_order_id)
+    if order is not None:
+      self._remove(order)
+
+
+def _field(entity, name):
+  if isinstance(entity, Message):
+    return getattr(entity, name)
+  return entity.get(name)
@@ -0,0 +1,208 @@
+import math
+import time
+
+import numpy as np
+
+from .instruments import InstrumentRegistry
+from .market_stream import MarketStreamListener
+from .option_pricing import MILLIS_PER_YEAR
+from .ticks import float_price
+
+# one row per futures, prices are NaN until quoted and the derived values until spot is known
+TERM_STRUCTURE_DTYPE = np.dtype([
+  ('expiration_date', np.int64),
+  ('years', np.float64),
+  ('bid', np.float64),
+  ('ask', np.float64),
+  ('mid', np.float64),
+  ('basis', np.float64),
+  ('carry', np.float64),
+  ('implied_rate', np.float64),
+])
+
+
+class TermStructure(MarketStreamListener):
+  """
+  MarketStreamListener keeping the term structure of the futures of every underlying: for every
+  futures, ordered by expiration, its bid, ask and mid, basis (mid - spot), annualized carry
+  (basis / spot / years to expiration) and the continuously compounded rate implied by the mid
+  (ln(mid / spot) / years to expiration), in one structured NumPy array of TERM_STRUCTURE_DTYPE
+  per underlying.
+
+  The arrays are built from instrument_data (through a shareable InstrumentRegistry). quotes of a
+  futures update only its row and only when its bid or ask changed, spot_data recomputes the rows
+  of the underlying, vectorized, only when the spot index changed. Times to expiration are taken
+  at the update, refresh() recomputes all rows to account for the passage of time.
+
+  curve() returns read-only views of the arrays, which are not copied - they always show the
+  current values until instrument_data changes the instruments.
+  """
+
+  def __init__(self, registry=None, clock=None, tick_table=None):
+    """
+    :param registry: InstrumentRegistry the futures of every underlying are taken from, a new one
+                     if None
+    :param clock: function returning current time in millis from epoch, from time.time by default
+    :param tick_table: to be given when the stream delivers prices in ticks, so that bids and asks
+                       of the futures are converted with the tick size of each of them
+    """
+    self.registry = registry if registry is not None else InstrumentRegistry()
+    self.tick_table = tick_table
+    self._clock = clock or (lambda: time.time() * 1000)
+    self._registry_version = None
+    self._spots = {}
+    # underlying symbol -> (array, read-only view, instrument ids ordered as the rows)
+    self._curves = {}
+    # instrument_id -> (underlying symbol, row, expiration)
+    self._rows = {}
+    # instrument_id -> (bid, ask) as last quoted, unchanged quotes are not recomputed
+    self._quotes = {}
+
+  def on_instrument_data(self, instrument_data):
+    self.registry.on_instrument_data(instrument_data)
+    if self.registry.version == self._registry_version:
+      return
+    self._registry_version = self.registry.version
+    groups = {}
+    for instrument in self.registry:
+      if not instrument.is_option and instrument.expiration_date is not None:
+        groups.setdefault(instrument.underlying_symbol, []).append(instrument)
+    self._curves = {}
+    self._rows = {}
+    for underlying_symbol, futures in groups.items():
+      # the registry iterates ordered by expiration
+      curve = np.zeros(len(futures), dtype=TERM_STRUCTURE_DTYPE)
+      curve['expiration_date'] = [instrument.expiration_date for instrument in futures]
+      for name in TERM_STRUCTURE_DTYPE.names[1:]:
+        curve[name] = np.nan
+      for row, instrument in enumerate(futures):
+        self._rows[instrument.instrument_id] = (underlying_symbol, row, instrument.expiration_date)
+      view = curve.view()
+      view.flags.writeable = False
+      instrument_ids = [instrument.instrument_id for instrument in futures]
+      self._curves[underlying_symbol] = (curve, view, instrument_ids)
+    # quotes of futures no longer listed are forgotten, the others refill the new curves
+    self._quotes = dict(
+      (instrument_id, quotes) for instrument_id, quotes in self._quotes.items()
+      if instrument_id in self._rows
+    )
+    for instrument_id, (bid, ask) in self._quotes.items():
+      underlying_symbol, row, _ = self._rows[instrument_id]
+      curve = self._curves[underlying_symbol][0]
+      curve['bid'][row] = float_price(bid, self.tick_table, instrument_id)
+      curve['ask'][row] = float_price(ask, self.tick_table, instrument_id)
+    self.refresh()
+
+  def on_spot_data(self, spot_data):
+    for underlying_symbol, data in spot_data['spot_data'].items():
+      spot = float(data['spot_index'])
+      if self._spots.get(underlying_symbol) != spot:
+        self._spots[underlying_symbol] = spot
+        if underlying_symbol in self._curves:
+          self._recompute(underlying_symbol, self._clock())
+
+  def on_quotes(self, quotes):
+    instrument_id = quotes['instrument_id']
+    position = self._rows.get(instrument_id)
+    if position is None:
+      return
+    bid_str, ask_str = quotes['bid'], quotes['ask']
+    if self._quotes.get(instrument_id) == (bid_str, ask_str):
+      return
+    self._quotes[instrument_id] = (bid_str, ask_str)
+    underlying_symbol, row, expiration_date = position
+    bid = float_price(bid_str, self.tick_table, instrument_id)
+    ask = float_price(ask_str, self.tick_table, instrument_id)
+    mid = (bid + ask) / 2
+    spot = self._spots.get(underlying_symbol, np.nan)
+    years = (expiration_date - self._clock()) / MILLIS_PER_YEAR
+    basis = mid - spot
+    if years > 0 and spot > 0 and mid > 0:
+      carry = basis / spot / years
+      implied_rate = math.log(mid / spot) / years
+    else:
+      carry = implied_rate = np.nan
+    # one tuple assignment of the row instead of eight field writes
+    self._curves[underlying_symbol][0][row] = (
+      expiration_date, years, bid, ask, mid, basis, carry, implied_rate
+    )
+
+  def refresh(self):
+    """
+    Recomputes the rows of all underlyings at the current time.
+    """
+    now = self._clock()
+    for underlying_symbol in self._curves:
+      self._recompute(underlying_symbol, now)
+
+  def _recompute(self, underlying_symbol, now):
+    curve = self._curves[underlying_symbol][0]
+    spot = self._spots.get(underlying_symbol, np.nan)
+    years = (curve['expiration_date'] - now) / MILLIS_PER_YEAR
+    mid = (curve['bid'] + curve['ask']) / 2
+    basis = mid - spot
+    with np.errstate(divide='ignore', invalid='ignore'):
+      expired = years <= 0
+      carry = basis / spot / years
+      implied_rate = np.log(mid / spot) / years
+    carry[expired] = np.nan
+    implied_rate[expired] = np.nan
+    curve['years'] = years
+    curve['mid'] = mid
+    curve['basis'] = basis
+    curve['carry'] = carry
+    curve['implied_rate'] = implied_rate
+
+  @property
+  def underlying_symbols(self):
+    return sorted(self._curves)
+
+  def curve(self, underlying_symbol):
+    """
+    :return: read-only view of the array (TERM_STRUCTURE_DTYPE) of the underlying, rows ordered by
+             expiration
+    """
+    return self._curves[underlying_symbol][1]
+
+  def instrument_ids(self, underlying_symbol):
+    """
+    :return: ids of the futures of the underlying, ordered as the rows of curve
+    """
+    return list(self._curves[underlying_symbol][2])
+
+  def get(self, instrument_id):
+    """
+    :return: copy of the row of the futures (fields as in TERM_STRUCTURE_DTYPE) or None if there is
+             no futures of the id
+    """
+    position = self._rows.get(instrument_id)
+    if position is None:
+      return None
+    underlying_symbol, row, _ = position
+    return self._curves[underlying_symbol][0][row].copy()
+
+  def interpolate(self, underlying_symbol, expiration_dates, field='implied_rate'):
+    """
+    Interpolates linearly in expiration between the futures with known values of the field, flat
+    beyond the first and the last of them.
+
+    :param expiration_dates: expiration or array of expirations in millis from epoch UTC
+    :param field: one of the fields of TERM_STRUCTURE_DTYPE
+    :return: the interpolated value(s), NaN if no futures of the underlying has a value
+    """
+    curve = self._curves[underlying_symbol][0]
+    values = curve[field]
+    known = ~np.isnan(values)
+    if not known.any():
+      return np.full(np.shape(expiration_dates), np.nan)[()]
+    return np.interp(expiration_dates, curve['expiration_date'][known], values[known])
+
+  def forward_price(self, underlying_symbol, expiration_dates):
+    """
+    :param expiration_dates: expiration or array of expirations in millis from epoch UTC
+    :return: forward price(s) of the underlying for the expiration(s), from the spot index and the
+             interpolated implied rate
+    """
+    spot = self._spots.get(underlying_symbol, np.nan)
+    years = (np.asarray(expiration_dates) - self._clock()) / MILLIS_PER_YEAR
+    return spot * np.exp(self.interpolate(underlying_symbol, expiration_dates) * years)
@@ -0,0 +1,197 @@
+from decimal import Decimal, InvalidOperation
+
+_NAN = float('nan')
+
+
+class TickConverter(object):
+  """
+  Converts decimal prices, as strings received from the exchange, to integer numbers of ticks of an
+  instrument and back. Prices which are not a whole number of ticks are rejected with ValueError.
+  """
+
+  def __init__(self, tick_size, cache_size=16384):
+    """
+    :param tick_size: tick size of the instrument as string or Decimal
+    :param cache_size: number of converted prices remembered (each way) - prices in order books
+                       repeat from message to message, the caches are cleared when full
+    """
+    self.tick_size = Decimal(tick_size)
+    self.cache_size = cache_size
+    self._cache = {}
+    self._price_strs = {}
+    if self.tick_size <= 0:
+      raise ValueError('Tick size has to be positive, got: %s' % tick_size)
+    # tick sizes of the form 10^-n (all instruments at Quedex) are converted without Decimal
+    sign, digits, exponent = self.tick_size.normalize().as_tuple()
+    self._decimals = -exponent if digits == (1,) and exponent <= 0 else None
+    self._scale = float(10 ** self._decimals) if self._decimals is not None else None
+
+  def to_ticks(self, price_str):
+    """
+    :param price_str: decimal price as string (or Decimal)
+    :return: the price as integer number of ticks
+    """
+    ticks = self._cache.get(price_str)
+    if ticks is None:
+      ticks = self._to_ticks(price_str)
+      if len(self._cache) >= self.cache_size:
+        self._cache.clear()
+      self._cache[price_str] = ticks
+    return ticks
+
+  def _to_ticks(self, price_str):
+    decimals = self._decimals
+    if decimals is not None and not isinstance(price_str, Decimal):
+      whole, _, fraction = price_str.partition('.')
+      if len(fraction) <= decimals:
+        try:
+          return int(whole + fraction + '0' * (decimals - len(fraction)))
+        except ValueError:
+          # e.g. exponent notation, left to Decimal
+          pass
+    try:
+      price = Decimal(price_str)
+    except InvalidOperation:
+      raise ValueError('Malformed price: %r' % (price_str,))
+    ticks, remainder = divmod(price, self.tick_size)
+    if remainder:
+      raise ValueError('Price %s is not a multiple of tick size %s' % (price_str, self.tick_size))
+    return int(ticks)
+
+  def to_price(self, ticks):
+    """
+    :param ticks: price as integer number of ticks
+    :return: the price as Decimal
+    """
+    if self._decimals is not None:
+      return Decimal(int(ticks)).scaleb(-self._decimals)
+    return int(ticks) * self.tick_size
+
+  def to_float(self, ticks):
+    """
+    :param ticks: price as integer number of ticks
+    :return: the price as float, equal to float of its decimal string
+    """
+    if self._scale is not None:
+      # division of exact integers is correctly rounded, as is parsing the decimal string
+      return ticks / self._scale
+    return float(self.to_price(ticks))
+
+  def to_price_str(self, ticks):
+    """
+    :param ticks: price as integer number of ticks
+    :return: the price as decimal string, as sent to the exchange
+    """
+    price_str = self._price_strs.get(ticks)
+    if price_str is None:
+      decimals = self._decimals
+      if decimals and ticks >= 0:
+        digits = '%0*d' % (decimals + 1, ticks)
+        price_str = digits[:-decimals] + '.' + digits[-decimals:]
+      else:
+        price_str = str(self.to_price(ticks))
+      if len(self._price_strs) >= self.cache_size:
+        self._price_strs.clear()
+      self._price_strs[ticks] = price_str
+    return price_str
+
+
+def float_price(price, tick_table=None, instrument_id=None):
+  """
+  :param price: decimal price as string (or Decimal) as in quotes, None if there is none
+  :param tick_table: TickTable if the price is an integer number of ticks (ticks mode of
+                     MarketStream)
+  :param instrument_id: instrument of the price, needed with tick_table
+  :return: the price as float, NaN if None - as kept in the arrays of the option and futures
+           analytics
+  """
+  if price is None:
+    return _NAN
+  if tick_table is not None:
+    return tick_table.converter(instrument_id).to_float(price)
+  return float(price)
+
+
+class TickTable(object):
+  """
+  TickConverters of all instruments, with the tick sizes from instrument_data - instruments of the
+  same tick size share one converter and so its cache of converted prices.
+
+  A table passed to MarketStream and UserStream (tick_table parameter) switches them to ticks mode,
+  in which prices are integer numbers of ticks instead of decimal strings. A single table may be
+  shared by both streams, the market stream keeps it up to date with instrument_data.
+  """
+
+  # fields of market stream messages holding a single price of the instrument of the message
+  PRICE_FIELDS = {
+    'quotes': ('last', 'bid', 'ask', 'tap', 'lower_limit', 'upper_limit'),
+    'trade': ('price',),
+  }
+
+  def __init__(self, cache_size=16384):
+    """
+    :param cache_size: number of converted prices remembered per tick size, see TickConverter
+    """
+    self.cache_size = cache_size
+    self._converters = {}
+    self._converters_by_size = {}
+
+  def on_instrument_data(self, instrument_data):
+    converters = {}
+    for instrument_id, instrument in instrument_data['data'].items():
+      tick_size = Decimal(instrument['tick_size'])
+      converter = self._converters_by_size.get(tick_size)
+      if converter is None:
+        converter = self._converters_by_size[tick_size] = TickConverter(tick_size, self.cache_size)
+      converters[instrument_id] = converter
+    self._converters = converters
+
+  def __contains__(self, instrument_id):
+    return instrument_id in self._converters
+
+  def converter(self, instrument_id):
+    """
+    :return: TickConverter of the instrument
+    """
+    converter = self._converters.get(instrument_id)
+    if converter is None:
+      raise ValueError(
+        'Prices of instrument %s received before its instrument data' % instrument_id
+      )
+    return converter
+
+  def to_ticks(self, instrument_id, price_str):
+    return self.converter(instrument_id).to_ticks(price_str)
+
+  def to_price_str(self, instrument_id, ticks):
+    return self.converter(instrument_id).to_price_str(ticks)
+
+  def convert(self, message):
+    """
+    Converts the prices of a market stream message to ticks, in place - levels of order_book and
+    prices of quotes and trade. instrument_data updates the table, other messages (e.g. the
+    indices of spot_data, which are not prices of any instrument) are left as they are.
+
+    :return: the message
+    """
+    message_type = message['type']
+    if message_type == 'order_book':
+      converter = self.converter(message['instrument_id'])
+      # cache hits (nearly all levels) are looked up without the method call
+      cached, to_ticks = converter._cache.get, converter.to_ticks
+      for side in (message['bids'], message['asks']):
+        for level in side:
+          price = level[0]
+          ticks = cached(price)
+          level[0] = ticks if ticks is not None else to_ticks(price)
+    elif message_type in self.PRICE_FIELDS:
+      converter = self.converter(message['instrument_id'])
+      cached, to_ticks = converter._cache.get, converter.to_ticks
+      for field in self.PRICE_FIELDS[message_type]:
+        price = message.get(field)
+        if price is not None:
+          ticks = cached(price)
+          message[field] = ticks if ticks is not None else to_ticks(price)
+    elif message_type == 'instrument_data':
+      self.on_instrument_data(message)
+    return message
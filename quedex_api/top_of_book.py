@@ -0,0 +1,169 @@
+import numpy as np
+
+from .market_stream import MarketStreamListener
+from .ticks import float_price
+
+# prices are floats (NaN when a side is empty), quantities are summed over the top levels
+TOP_OF_BOOK_DTYPE = np.dtype([
+  ('bid', np.float64),
+  ('ask', np.float64),
+  ('bid_quantity', np.int64),
+  ('ask_quantity', np.int64),
+  ('mid', np.float64),
+  ('spread', np.float64),
+  ('microprice', np.float64),
+  ('imbalance', np.float64),
+  ('updates', np.int64),
+])
+
+
+class TopOfBookCache(MarketStreamListener):
+  """
+  MarketStreamListener keeping mid, spread, microprice (mid weighted by the quantities of the best
+  levels) and imbalance ((bid depth - ask depth) / (bid depth + ask depth) over the top levels) of
+  every instrument in a structured NumPy array of TOP_OF_BOOK_DTYPE, one row per instrument. The
+  values are recomputed only when the top levels change, so that signals of all instruments can be
+  evaluated at once on snapshot().
+
+  order_book messages update all values. quotes carry only the best level - with levels over 1 the
+  depth below it is taken from the last order_book of the instrument, without the levels the quoted
+  best price has crossed.
+  """
+
+  def __init__(self, levels=1, capacity=64, tick_table=None):
+    """
+    :param levels: number of the top levels of each side summed in imbalance (and in bid_quantity,
+                   ask_quantity)
+    :param capacity: number of instruments allocated upfront, grown when needed
+    :param tick_table: TickTable of a stream in ticks mode - prices of order_book and quotes are
+                       then converted from ticks, the rows still hold prices
+    """
+    self.levels = levels
+    self.tick_table = tick_table
+    self.skipped_count = 0
+    self._rows = np.zeros(capacity, dtype=TOP_OF_BOOK_DTYPE)
+    self._instrument_ids = []
+    self._indexes = {}
+    # instrument_id -> the top levels from which the row was computed
+    self._top_levels = {}
+    self._best_levels = {}
+    # instrument_id -> (bids, asks) of the last order_book, for the depth below quotes
+    self._books = {}
+
+  def on_order_book(self, order_book):
+    instrument_id = order_book['instrument_id']
+    bids = order_book['bids'][:self.levels]
+    asks = order_book['asks'][:self.levels]
+    top_levels = (bids, asks)
+    if self._top_levels.get(instrument_id) == top_levels:
+      self.skipped_count += 1
+      return
+    self._top_levels[instrument_id] = top_levels
+    if self.levels > 1:
+      self._books[instrument_id] = (order_book['bids'], order_book['asks'])
+    self._best_levels[instrument_id] = (
+      bids[0][0] if bids else None, bids[0][1] if bids else 0,
+      asks[0][0] if asks else None, asks[0][1] if asks else 0,
+    )
+    self._update(
+      instrument_id,
+      bids[0][0] if bids else None, asks[0][0] if asks else None,
+      sum(level[1] for level in bids), sum(level[1] for level in asks),
+      bids[0][1] if bids else 0, asks[0][1] if asks else 0,
+    )
+
+  def on_quotes(self, quotes):
+    instrument_id = quotes['instrument_id']
+    best_levels = (
+      quotes['bid'], quotes['bid_quantity'] or 0, quotes['ask'], quotes['ask_quantity'] or 0
+    )
+    if self._best_levels.get(instrument_id) == best_levels:
+      self.skipped_count += 1
+      return
+    self._best_levels[instrument_id] = best_levels
+    # the next order_book has to be compared with the whole book again
+    self._top_levels.pop(instrument_id, None)
+    bid, bid_quantity, ask, ask_quantity = best_levels
+    bid_depth, ask_depth = bid_quantity, ask_quantity
+    book = self._books.get(instrument_id)
+    if book is not None:
+      if bid is not None:
+        best_bid = float(bid)
+        bid_depth += self._depth_below(book[0], lambda price: price < best_bid)
+      if ask is not None:
+        best_ask = float(ask)
+        ask_depth += self._depth_below(book[1], lambda price: price > best_ask)
+    self._update(instrument_id, bid, ask, bid_depth, ask_depth, bid_quantity, ask_quantity)
+
+  def _depth_below(self, side, is_below):
+    # quantity of the levels-1 best levels of the side below the quoted best level, prices compared
+    # in the units of the stream (decimal strings or ticks as float)
+    depth = 0
+    count = 0
+    for price, quantity in side:
+      if count == self.levels - 1:
+        break
+      if is_below(float(price)):
+        depth += quantity
+        count += 1
+    return depth
+
+  def _index(self, instrument_id):
+    index = self._indexes.get(instrument_id)
+    if index is None:
+      index = self._indexes[instrument_id] = len(self._instrument_ids)
+      self._instrument_ids.append(instrument_id)
+      if index == len(self._rows):
+        rows = np.zeros(2 * len(self._rows), dtype=TOP_OF_BOOK_DTYPE)
+        rows[:index] = self._rows
+        self._rows = rows
+    return index
+
+  def _update(self, instrument_id, bid_price, ask_price, bid_depth, ask_depth, best_bid_quantity,
+              best_ask_quantity):
+    index = self._index(instrument_id)
+    bid = float_price(bid_price, self.tick_table, instrument_id)
+    ask = float_price(ask_price, self.tick_table, instrument_id)
+    best_quantity = best_bid_quantity + best_ask_quantity
+    depth = bid_depth + ask_depth
+    # a whole row is assigned at once, which is much cheaper than field by field
+    self._rows[index] = (
+      bid,
+      ask,
+      bid_depth,
+      ask_depth,
+      (bid + ask) / 2,
+      ask - bid,
+      (bid * best_ask_quantity + ask * best_bid_quantity) / best_quantity
+      if best_quantity else np.nan,
+      float(bid_depth - ask_depth) / depth if depth else np.nan,
+      self._rows[index]['updates'] + 1,
+    )
+
+  @property
+  def instrument_ids(self):
+    """
+    Ids of the instruments in the order of the rows of snapshot().
+    """
+    return list(self._instrument_ids)
+
+  def index(self, instrument_id):
+    """
+    :return: row of the instrument in snapshot() or None if nothing was received for it yet
+    """
+    return self._indexes.get(instrument_id)
+
+  def get(self, instrument_id):
+    """
+    :return: copy of the row of the instrument (fields as in TOP_OF_BOOK_DTYPE) or None
+    """
+    index = self._indexes.get(instrument_id)
+    if index is None:
+      return None
+    return self._rows[index].copy()
+
+  def snapshot(self):
+    """
+    :return: copy of the rows of all instruments, ordered as instrument_ids
+    """
+    return self._rows[:len(self._instrument_ids)].copy()
@@ -24,6 +24,17 @@ class Trader(object):
       self._parse_key()
     return self._private_key
 
+  @property
+  def private_key_fingerprint(self):
+    return self.private_key.fingerprint
+
+  def invalidate_private_key(self):
+    """
+    Drops the cached private key so that it is parsed again on next access - decrypt_private_key
+    has to be called again afterwards.
+    """
+    self._private_key = None
+
   def _parse_key(self):
     self._private_key = pgpy.PGPKey()
     self._private_key.parse(self._private_key_str)
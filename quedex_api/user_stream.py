@@ -1,8 +1,15 @@
-import json
-
 import pgpy
 
+from collections import deque
 from enum import Enum
+from numbers import Integral
+
+from .codec import get_codec
+from .dispatch import DispatchTable
+from .envelope import parse_envelope
+from .messages import USER_STREAM_MESSAGES
+
+_UNKNOWN = object()
 
 class UserStreamListener(object):
   def on_ready(self):
@@ -21,6 +28,29 @@ class UserStreamListener(object):
     """
     pass
 
+  def on_batch(self, entities):
+    """
+    Called once per message received from the exchange, after on_message and the callbacks of the
+    types of all its entities, with the list of these entities (e.g. a fill cascade or the welcome
+    pack), so that a listener may update its state once per message instead of once per entity.
+    A listener which implements only on_batch receives every entity exactly once.
+
+    :param entities: list of the entities (as delivered to on_message) in the order of the message
+    """
+    pass
+
+  def on_snapshot(self, orders, positions, account_state):
+    """
+    Called once after the welcome pack (see on_ready) has been delivered entity by entity, with all
+    of its entities - a listener may rebuild its state from the snapshot instead of from separate
+    callbacks.
+
+    :param orders: list of order_placed (see on_order_placed) of all pending orders
+    :param positions: list of open_position (see on_open_position) of all open positions
+    :param account_state: the initial account_state (see on_account_state)
+    """
+    pass
+
   def on_account_state(self, account_state):
     """
     :param account_state: a dict of the following format:
@@ -136,6 +166,17 @@ class UserStreamListener(object):
     """
     pass
 
+  def on_modify_order(self, modify_order_command):
+    """
+    Called with every modify_order command once it has been sent on its own or in a batch, in the
+    order of sending - order_modified carries only client_order_id. Commands of a time triggered
+    batch are passed when timer_triggered of its timer arrives, before on_timer_triggered (the
+    commands of the latest update confirmed with timer_updated, if the batch was updated).
+
+    :param modify_order_command: the command as sent, with new_price (if any) as a decimal string
+    """
+    pass
+
   def on_order_modified(self, order_modified):
     """
     :param order_modified: a dict of the following format:
@@ -312,11 +353,30 @@ class UserStream(object):
     TIME_TRIGGERED_CREATE = 2
     TIME_TRIGGERED_UPDATE = 3
 
-  def __init__(self, exchange, trader, nonce_group=5):
+  def __init__(self, exchange, trader, nonce_group=5, codec='json', tick_table=None,
+               typed_messages=False):
     """
     :param nonce_group: value between 0 and 9, has to be different for every WebSocket connection
                         opened to the exchange (e.g. browser and trading bot); our webapp uses
                         nonce_group=0
+    :param codec: JSON codec used to decode and encode messages - name of a codec (see
+                  quedex_api.codec, "orjson", "simdjson" or "ujson" are faster than the default
+                  "json" when installed, "auto" picks the fastest installed one) or a codec object
+    :param tick_table: optional TickTable, usually shared with MarketStream which keeps it up to
+                       date - if given, the stream is in ticks mode: limit_price of order_placed and
+                       trade_price of order_filled are delivered as integer numbers of ticks of the
+                       instrument, and limit_price of place_order and new_price of modify_order
+                       commands may be given in ticks (decimal strings are still accepted). Prices
+                       which need not be a whole number of ticks (average_opening_price,
+                       close_price) and amounts stay decimal strings. An order_filled of an
+                       order whose instrument is not known cannot be converted, it is not
+                       delivered and a ValueError is passed to on_error instead
+    :param typed_messages: if True, account_state, open_position, order_placed, order_filled and
+                           order_cancelled are delivered (also to on_message) as objects of the
+                           classes of quedex_api.messages, with __slots__ and parsed decimals,
+                           instead of dicts - other messages are still dicts. They take over the
+                           values of the decoded dicts and parse decimals on first access, they
+                           pay off in memory where listeners keep many of them
     """
     super(UserStream, self).__init__()
     self.send_message = None
@@ -324,20 +384,44 @@ class UserStream(object):
 
     self._exchange = exchange
     self._trader = trader
+    self._codec = get_codec(codec)
+    self._loads_buffer = getattr(self._codec, 'loads_buffer', None)
 
-    self._listeners = []
+    self._dispatch_table = DispatchTable(UserStreamListener)
     self._nonce_group = nonce_group
     self._nonce = None
     self._initialized = False
     self._batch = None
     self._batch_mode = None
     self._time_triggered_batch_command = None
+    self._tick_table = tick_table
+    self._message_classes = USER_STREAM_MESSAGES if typed_messages else None
+    # (orders, positions) of the welcome pack while it is being received
+    self._welcome_pack = None
+    # client_order_id (as string) -> instrument_id of the orders known in ticks mode
+    self._order_instruments = {}
+    # timer_id (as string) -> modify_order commands of the batch of the timer, passed to
+    # on_modify_order when the timer triggers
+    self._timer_modifications = {}
+    # timer_id (as string) -> deque of modify_order commands of the sent update_timer commands (None
+    # for updates keeping the batch) not yet confirmed, oldest first
+    self._timer_updates = {}
 
   def add_listener(self, listener):
-    self._listeners.append(listener)
+    """
+    :raises ValueError: if the listener has a tick_table attribute (listeners of this package
+                        reading prices) which is None in ticks mode or a table otherwise
+    """
+    tick_table = getattr(listener, 'tick_table', _UNKNOWN)
+    if tick_table is not _UNKNOWN and (tick_table is None) != (self._tick_table is None):
+      raise ValueError('%s does not read prices in the units of the stream: %s' % (
+        type(listener).__name__,
+        'the stream is in ticks mode' if tick_table is None else 'the stream is not in ticks mode',
+      ))
+    self._dispatch_table.add(listener)
 
   def remove_listener(self, listener):
-    self._listeners.remove(listener)
+    self._dispatch_table.remove(listener)
 
   def place_order(self, place_order_command):
     """
@@ -357,6 +441,7 @@ class UserStream(object):
     self._check_if_initialized()
     place_order_command['type'] = 'place_order'
     check_place_order(place_order_command)
+    self._format_prices(place_order_command)
     self._set_nonce_account_id(place_order_command)
     if self._batch_mode:
       self._batch.append(place_order_command)
@@ -408,11 +493,13 @@ class UserStream(object):
     self._check_if_initialized()
     check_modify_order(modify_order_command)
     modify_order_command['type'] = 'modify_order'
+    self._format_prices(modify_order_command)
     self._set_nonce_account_id(modify_order_command)
     if self._batch_mode:
       self._batch.append(modify_order_command)
     else:
       self._encrypt_send(modify_order_command)
+      self._call_listeners('on_modify_order', modify_order_command)
 
   def batch(self, order_commands):
     """
@@ -507,6 +594,7 @@ class UserStream(object):
     self._verify_batch_commands_and_set_nonces_and_account_id(order_commands)
     command['command'] = self._create_batch_command_no_checks(order_commands)
     self._encrypt_send(command)
+    self._timer_modifications[str(timer_id)] = _modify_order_commands(order_commands)
 
   def start_time_triggered_batch(self, timer_id, execution_start_timestamp, execution_expiration_timestamp):
     """
@@ -550,6 +638,9 @@ class UserStream(object):
       raise ValueError("Empty batch")
     self._time_triggered_batch_command['command'] = self._create_batch_command_no_checks(self._batch)
     self._encrypt_send(self._time_triggered_batch_command)
+    self._timer_modifications[str(self._time_triggered_batch_command['timer_id'])] = (
+      _modify_order_commands(self._batch)
+    )
     self._batch = None
     self._batch_mode = None
     self._time_triggered_batch_command = None
@@ -599,6 +690,7 @@ class UserStream(object):
       command['new_command'] = self._create_batch_command_no_checks(new_order_commands)
     self._validate_update_command(command)
     self._encrypt_send(command)
+    self._add_timer_update(command)
 
   def start_update_time_triggered_batch(self, timer_id, new_execution_start_timestamp, new_execution_expiration_timestamp):
     """
@@ -653,6 +745,7 @@ class UserStream(object):
       self._time_triggered_batch_command['new_command'] = self._create_batch_command_no_checks(self._batch)
     self._validate_update_command(self._time_triggered_batch_command)
     self._encrypt_send(self._time_triggered_batch_command)
+    self._add_timer_update(self._time_triggered_batch_command)
     self._batch = None
     self._batch_mode = None
     self._time_triggered_batch_command = None
@@ -681,6 +774,33 @@ class UserStream(object):
     self._set_nonce_account_id(command)
     return command
 
+  def _add_timer_update(self, update_timer_command):
+    new_command = update_timer_command.get('new_command')
+    timer_id = str(update_timer_command['timer_id'])
+    updates = self._timer_updates.get(timer_id)
+    if updates is None:
+      updates = self._timer_updates[timer_id] = deque()
+    updates.append(_modify_order_commands(new_command['batch']) if new_command else None)
+
+  def _track_timer(self, entity_type, entity):
+    timer_id = str(entity['timer_id'])
+    if entity_type == 'timer_updated' or entity_type == 'timer_update_failed':
+      updates = self._timer_updates.get(timer_id)
+      if not updates:
+        return
+      modify_order_commands = updates.popleft()
+      if not updates:
+        del self._timer_updates[timer_id]
+      if entity_type == 'timer_updated' and modify_order_commands is not None:
+        self._timer_modifications[timer_id] = modify_order_commands
+      return
+    # the timer is gone
+    self._timer_updates.pop(timer_id, None)
+    modify_order_commands = self._timer_modifications.pop(timer_id, ())
+    if entity_type == 'timer_triggered':
+      for command in modify_order_commands:
+        self._call_listeners('on_modify_order', command)
+
   def _validate_update_command(self, update_timer_command):
     if (update_timer_command.get('new_command') == None
         and update_timer_command['new_execution_start_timestamp'] == None
@@ -705,6 +825,9 @@ class UserStream(object):
     self._encrypt_send(
       self._create_batch_command_no_checks(order_commands)
     )
+    for command in order_commands:
+      if command['type'] == 'modify_order':
+        self._call_listeners('on_modify_order', command)
 
   def _create_batch_command_no_checks(self, order_commands):
     return {
@@ -728,6 +851,7 @@ class UserStream(object):
         check_cancel_all_orders(command)
       else:
         raise ValueError('Unsupported command type: ' + type)
+      self._format_prices(command)
       self._set_nonce_account_id(command)
 
   def initialize(self):
@@ -738,10 +862,16 @@ class UserStream(object):
     })
 
   def on_message(self, message_wrapper_str):
+    """
+    :param message_wrapper_str: message received from the WebSocket as str or as a buffer (bytes,
+                                bytearray, memoryview) of UTF-8, which is decoded only if the codec
+                                cannot decode buffers
+    """
     try:
 
-      message_wrapper = json.loads(message_wrapper_str)
-      message_type = message_wrapper['type']
+      message_type, message_wrapper = parse_envelope(
+        message_wrapper_str, self._codec.loads, self._loads_buffer
+      )
 
       if message_type == 'keepalive':
         return
@@ -762,6 +892,8 @@ class UserStream(object):
       self.on_error(Exception('WebSocket error: ' + message_wrapper['error_code']))
 
   def process_data(self, message_wrapper):
+    batch_handlers = self._dispatch_table.handlers('on_batch')
+    batch = [] if batch_handlers else None
     for entity in self._decrypt(message_wrapper['data']):
       if entity['type'] == 'last_nonce' and entity['nonce_group'] == self._nonce_group:
         self._nonce = entity['last_nonce']
@@ -769,11 +901,47 @@ class UserStream(object):
         return
       elif entity['type'] == 'subscribed' and entity['message_nonce_group'] == self._nonce_group:
         self._initialized = True
+        self._welcome_pack = ([], [])
         self._call_listeners('on_ready')
         continue
 
-      self._call_listeners('on_message', entity)
-      self._call_listeners('on_' + entity['type'], entity)
+      entity_type = entity['type']
+      if entity_type in _TIMER_TRACKING_TYPES:
+        self._track_timer(entity_type, entity)
+      if self._tick_table is not None:
+        try:
+          self._convert_prices(entity)
+        except ValueError as e:
+          self.on_error(e)
+          continue
+      delivered = entity
+      if self._message_classes is not None:
+        message_class = self._message_classes.get(entity_type)
+        if message_class is not None:
+          delivered = message_class.from_dict(entity)
+      for handler in self._dispatch_table.handlers('on_message'):
+        handler(delivered)
+      for handler in self._dispatch_table.message_handlers(entity_type):
+        handler(delivered)
+      if batch is not None:
+        batch.append(delivered)
+      if self._welcome_pack is not None:
+        self._collect_welcome_pack(entity_type, delivered)
+
+    if batch:
+      for handler in batch_handlers:
+        handler(batch)
+
+  def _collect_welcome_pack(self, entity_type, entity):
+    # the welcome pack ends with the initial account_state
+    orders, positions = self._welcome_pack
+    if entity_type == 'order_placed':
+      orders.append(entity)
+    elif entity_type == 'open_position':
+      positions.append(entity)
+    elif entity_type == 'account_state':
+      self._welcome_pack = None
+      self._call_listeners('on_snapshot', orders, positions, entity)
 
   def on_error(self, error):
     self._call_listeners('on_error', error)
@@ -781,6 +949,50 @@ class UserStream(object):
   def on_disconnect(self, message):
     self._call_listeners('on_disconnect', message)
 
+  def _format_prices(self, command):
+    # in ticks mode prices of commands may be given as integer numbers of ticks
+    if self._tick_table is None:
+      return
+    command_type = command['type']
+    if command_type == 'place_order':
+      instrument_id = str(command['instrument_id'])
+      self._order_instruments[str(command['client_order_id'])] = instrument_id
+      field = 'limit_price'
+    elif command_type == 'modify_order' and 'new_price' in command:
+      instrument_id = self._order_instruments.get(str(command['client_order_id']))
+      field = 'new_price'
+    else:
+      return
+    price = command[field]
+    if isinstance(price, Integral):
+      if instrument_id is None:
+        raise ValueError(
+          'Instrument of order %s is not known, new_price has to be a decimal string'
+          % command['client_order_id']
+        )
+      command[field] = self._tick_table.to_price_str(instrument_id, price)
+
+  def _convert_prices(self, entity):
+    entity_type = entity['type']
+    if entity_type == 'order_placed':
+      instrument_id = entity['instrument_id']
+      self._order_instruments[str(entity['client_order_id'])] = instrument_id
+      entity['limit_price'] = self._tick_table.to_ticks(instrument_id, entity['limit_price'])
+    elif entity_type == 'order_filled':
+      instrument_id = self._order_instruments.get(str(entity['client_order_id']))
+      # the welcome pack places all pending orders, so this should not happen - a decimal string
+      # would slip through to listeners expecting ticks
+      if instrument_id is None:
+        raise ValueError(
+          'Instrument of order %s is not known, trade_price cannot be converted to ticks'
+          % entity['client_order_id']
+        )
+      entity['trade_price'] = self._tick_table.to_ticks(instrument_id, entity['trade_price'])
+      if entity.get('leaves_order_quantity') == 0:
+        self._order_instruments.pop(str(entity['client_order_id']), None)
+    elif entity_type in ('order_cancelled', 'order_forcefully_cancelled', 'order_place_failed'):
+      self._order_instruments.pop(str(entity['client_order_id']), None)
+
   def _set_nonce_account_id(self, entity):
     self._nonce += 1
     entity['nonce'] = self._nonce
@@ -789,7 +1001,7 @@ class UserStream(object):
     return entity
 
   def _encrypt_send(self, entity):
-    message = pgpy.PGPMessage.new(json.dumps(entity))
+    message = pgpy.PGPMessage.new(self._codec.dumps(entity))
     message |= self._trader.private_key.sign(message)
     # explicit encode for Python 3 compatibility
     self.send_message(str(self._exchange.public_key.encrypt(message)).encode('utf8'))
@@ -799,18 +1011,27 @@ class UserStream(object):
     decrypted = self._trader.private_key.decrypt(encrypted)
     if not self._exchange.public_key.verify(decrypted):
       raise AssertionError('Verification failed for message: ' + decrypted)
-    return json.loads(decrypted.message)
+    return self._codec.loads(decrypted.message)
 
   def _call_listeners(self, method_name, *args, **kwargs):
-    for listener in self._listeners:
-      if hasattr(listener, method_name):
-        getattr(listener, method_name)(*args, **kwargs)
+    for handler in self._dispatch_table.handlers(method_name):
+      handler(*args, **kwargs)
 
   def _check_if_initialized(self):
     if not self._initialized:
       raise Exception('UserStream not initialized, wait until UserStreamListener.on_ready is called.')
 
 
+_TIMER_TRACKING_TYPES = frozenset([
+  'timer_rejected', 'timer_expired', 'timer_triggered', 'timer_updated', 'timer_update_failed',
+  'timer_cancelled',
+])
+
+
+def _modify_order_commands(order_commands):
+  return [command for command in order_commands if command['type'] == 'modify_order']
+
+
 def check_place_order(place_order):
   check_positive_int(place_order, 'client_order_id')
   check_positive_decimal(place_order, 'limit_price')
@@ -853,7 +1074,10 @@ def check_internal_transfer(internal_transfer):
 
 def check_positive_decimal(_dict, field_name):
   number = _dict[field_name]
-  if not float(number) > 0:
+  if isinstance(number, bool):
+    raise TypeError('%s=%s should be a decimal string or a number' % (field_name, number))
+  # integers are prices in ticks (see TickTable) and need no parsing
+  if not (number > 0 if isinstance(number, Integral) else float(number) > 0):
     raise ValueError('%s=%s should be greater than 0' % (field_name, number))
 
 
@@ -10,8 +10,8 @@ class UserStreamClientProtocol(WebSocketClientProtocol):
     self.factory.user_stream.initialize()
 
   def onMessage(self, payload, isbinary):
-    # explicit decode for Python 3 compatibility
-    self.factory.user_stream.on_message(payload.decode('utf8'))
+    # the payload is passed on as bytes, it is decoded only where needed
+    self.factory.user_stream.on_message(payload)
 
   def onClose(self, wasclean, code, reason):
     if not wasclean:
@@ -0,0 +1,380 @@
+import base64
+import struct
+
+import pgpy
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa, utils
+
+_BEGIN_SIGNED_MESSAGE = '-----BEGIN PGP SIGNED MESSAGE-----'
+_BEGIN_SIGNATURE = '-----BEGIN PGP SIGNATURE-----'
+_END_SIGNATURE = '-----END PGP SIGNATURE-----'
+
+# OpenPGP hash algorithm ids (RFC 4880, 9.4)
+_HASH_ALGORITHMS = {
+  2: ('SHA1', hashes.SHA1),
+  8: ('SHA256', hashes.SHA256),
+  9: ('SHA384', hashes.SHA384),
+  10: ('SHA512', hashes.SHA512),
+  11: ('SHA224', hashes.SHA224),
+}
+# OpenPGP public key algorithm ids (RFC 4880, 9.1) of RSA keys capable of signing
+_RSA_SIGNING_ALGORITHMS = (1, 3)
+_SIGNATURE_PACKET_TAG = 2
+_CANONICAL_TEXT_SIGNATURE = 0x01
+_ISSUER_SUBPACKET = 16
+_ISSUER_FINGERPRINT_SUBPACKET = 33
+_TRAILING_WHITESPACE = (' ', '\t', '\r')
+
+
+class UnsupportedClearsignedMessage(Exception):
+  """
+  Raised by the fast path of ClearsignVerifier on a message which does not have the clearsigned
+  format used by Quedex - such messages are verified with pgpy.
+  """
+  pass
+
+
+class VerificationPolicy(object):
+  """
+  Decides which market stream messages have their signatures verified and when. By default every
+  message is verified before it is delivered to the listeners. Verification failures are reported
+  through MarketStreamListener.on_error in every mode.
+
+  verified_count and skipped_count tell how many messages were selected for verification and how
+  many were delivered without it.
+  """
+
+  def __init__(self, sample_every=1, message_types=None, after_delivery=False, schedule=None):
+    """
+    :param sample_every: verify only every n-th message (of message_types, if given)
+    :param message_types: optional collection of message types (e.g. "instrument_data",
+                          "session_state") - messages of other types are not verified
+    :param after_delivery: if True, messages are delivered to the listeners first and verified
+                           afterwards (optimistic dispatch) - in a separate call on the reactor
+                           thread or, in parallel, on the VerificationPool of the stream if it has
+                           one; listeners learn about failures through on_verification_failed
+    :param schedule: function(function, *args) used to schedule a call on the reactor thread when
+                     verifying after delivery, by default twisted reactor.callLater with no delay
+    """
+    if sample_every < 1:
+      raise ValueError('sample_every=%s should be greater than 0' % sample_every)
+    self.sample_every = sample_every
+    self.message_types = frozenset(message_types) if message_types is not None else None
+    self.after_delivery = after_delivery
+    self._schedule = schedule
+    self._sampled = 0
+    self.verified_count = 0
+    self.skipped_count = 0
+
+  @classmethod
+  def full(cls):
+    return cls()
+
+  @classmethod
+  def sampled(cls, sample_every):
+    return cls(sample_every=sample_every)
+
+  @classmethod
+  def only_types(cls, *message_types):
+    return cls(message_types=message_types)
+
+  @classmethod
+  def deferred(cls, schedule=None):
+    return cls(after_delivery=True, schedule=schedule)
+
+  @property
+  def verifies_all_before_delivery(self):
+    return self.sample_every == 1 and self.message_types is None and not self.after_delivery
+
+  def should_verify(self, message_type):
+    """
+    Called once per message, counts the message as verified or skipped.
+    """
+    verify = self.message_types is None or message_type in self.message_types
+    if verify and self.sample_every > 1:
+      verify = self._sampled % self.sample_every == 0
+      self._sampled += 1
+    if verify:
+      self.verified_count += 1
+    else:
+      self.skipped_count += 1
+    return verify
+
+  def schedule(self, function, *args):
+    if self._schedule is None:
+      from twisted.internet import reactor
+      self._schedule = lambda function, *args: reactor.callLater(0, function, *args)
+    self._schedule(function, *args)
+
+
+class PgpyVerifier(object):
+  """
+  Verifies clearsigned messages with pgpy.
+  """
+
+  def __init__(self, exchange):
+    self._exchange = exchange
+
+  def verify(self, clearsigned_message_str):
+    """
+    :return: tuple (<bool, True if the signature is valid>, <cleartext of the message>)
+    """
+    clearsigned_message = pgpy.PGPMessage().from_blob(clearsigned_message_str)
+    verified = bool(self._exchange.public_key.verify(clearsigned_message))
+    return verified, clearsigned_message.message
+
+
+class ClearsignVerifier(object):
+  """
+  Verifies clearsigned messages signed with a single v4 RSA signature (the format in which Quedex
+  publishes market data) without building pgpy objects: the armor is parsed in a single pass over
+  the lines, the cleartext is hashed as it is read and the signature is checked directly with
+  cryptography. Messages in any other format are verified with pgpy, as are messages with lines
+  ending with whitespace or carriage returns: pgpy hashes such lines as they are instead of
+  stripping the whitespace as RFC 4880 says, and the fast path has to give the same results.
+  """
+
+  def __init__(self, exchange):
+    self._exchange = exchange
+    self._key = None
+    self._rsa_keys = None
+    self._pgpy_verifier = PgpyVerifier(exchange)
+    self.fallback_count = 0
+
+  def verify(self, clearsigned_message_str):
+    """
+    :return: tuple (<bool, True if the signature is valid>, <cleartext of the message>)
+    """
+    try:
+      return self.verify_fast(clearsigned_message_str)
+    except UnsupportedClearsignedMessage:
+      self.fallback_count += 1
+      return self._pgpy_verifier.verify(clearsigned_message_str)
+
+  def verify_fast(self, clearsigned_message_str):
+    """
+    Like verify but raises UnsupportedClearsignedMessage instead of falling back to pgpy.
+    """
+    rsa_keys = self._get_rsa_keys()
+    lines = clearsigned_message_str.split('\n')
+    index, armor_hash_names = _read_armor_headers(lines)
+
+    # the hash algorithm is only known from the signature which comes after the cleartext, so the
+    # cleartext is hashed with every algorithm announced in the armor headers
+    digests = dict(
+      (name, hashes.Hash(algorithm(), default_backend())) for name, algorithm in armor_hash_names
+    )
+    cleartext_lines = []
+    first_line = True
+    while True:
+      if index >= len(lines):
+        raise UnsupportedClearsignedMessage('No signature in the message')
+      line = lines[index]
+      index += 1
+      if line.rstrip('\r') == _BEGIN_SIGNATURE:
+        break
+      if line.startswith('- '):
+        line = line[2:]
+      if line.endswith(_TRAILING_WHITESPACE):
+        raise UnsupportedClearsignedMessage('Line ending with whitespace')
+      cleartext_lines.append(line)
+      canonical_line = line.encode('utf8')
+      if not first_line:
+        canonical_line = b'\r\n' + canonical_line
+      first_line = False
+      for digest in digests.values():
+        digest.update(canonical_line)
+
+    signature = _parse_signature_packet(_read_armored_signature(lines, index))
+    hash_name, hash_algorithm = signature['hash']
+    if hash_name not in digests:
+      raise UnsupportedClearsignedMessage(
+        'Hash algorithm %s not announced in the armor' % hash_name
+      )
+    key = rsa_keys.get(signature['issuer'])
+    if key is None:
+      raise UnsupportedClearsignedMessage('Unknown issuer %s' % signature['issuer'])
+
+    digest = digests[hash_name]
+    digest.update(signature['hashed_trailer'])
+    digest.update(b'\x04\xff' + struct.pack('>I', len(signature['hashed_trailer'])))
+    digest_value = digest.finalize()
+    cleartext = '\n'.join(cleartext_lines)
+    if bytearray(digest_value[:2]) != signature['left_16_bits']:
+      return False, cleartext
+    signature_bytes = signature['signature']
+    signature_bytes = b'\x00' * ((key.key_size + 7) // 8 - len(signature_bytes)) + signature_bytes
+    try:
+      key.verify(
+        signature_bytes, digest_value, padding.PKCS1v15(), utils.Prehashed(hash_algorithm())
+      )
+    except InvalidSignature:
+      return False, cleartext
+    return True, cleartext
+
+  def _get_rsa_keys(self):
+    public_key = self._exchange.public_key
+    if public_key is not self._key:
+      self._rsa_keys = _extract_rsa_keys(public_key)
+      self._key = public_key
+    return self._rsa_keys
+
+
+def extract_cleartext(clearsigned_message_str):
+  """
+  Returns the cleartext of the clearsigned message without verifying its signature.
+  """
+  header_end = clearsigned_message_str.find('\n\n')
+  signature_start = clearsigned_message_str.find('\n' + _BEGIN_SIGNATURE, header_end)
+  if (not clearsigned_message_str.startswith(_BEGIN_SIGNED_MESSAGE) or header_end < 0
+      or signature_start < 0):
+    return pgpy.PGPMessage().from_blob(clearsigned_message_str).message
+  cleartext = clearsigned_message_str[header_end + 2:signature_start]
+  if cleartext.startswith('- ') or '\n- ' in cleartext:
+    cleartext = '\n'.join(
+      line[2:] if line.startswith('- ') else line for line in cleartext.split('\n')
+    )
+  return cleartext
+
+
+def _extract_rsa_keys(public_key):
+  rsa_keys = {}
+  for key in [public_key] + list(public_key.subkeys.values()):
+    if int(key._key.pkalg) not in _RSA_SIGNING_ALGORITHMS:
+      continue
+    key_material = key._key.keymaterial
+    public_numbers = rsa.RSAPublicNumbers(int(key_material.e), int(key_material.n))
+    rsa_keys[str(key.fingerprint.keyid)] = public_numbers.public_key(default_backend())
+  return rsa_keys
+
+
+def _read_armor_headers(lines):
+  if not lines or lines[0].rstrip('\r') != _BEGIN_SIGNED_MESSAGE:
+    raise UnsupportedClearsignedMessage('Not a clearsigned message')
+  # MD5 is assumed when no Hash header is present and is not supported by the fast path
+  hash_names = []
+  index = 1
+  while index < len(lines) and lines[index].rstrip('\r'):
+    name, _, value = lines[index].partition(':')
+    if name != 'Hash':
+      raise UnsupportedClearsignedMessage('Unsupported armor header %s' % name)
+    hash_names.extend(value.strip().split(','))
+    index += 1
+  algorithms_by_name = dict(_HASH_ALGORITHMS.values())
+  armor_hash_names = []
+  for hash_name in hash_names:
+    hash_name = hash_name.strip()
+    if hash_name not in algorithms_by_name:
+      raise UnsupportedClearsignedMessage('Unsupported hash algorithm %s' % hash_name)
+    armor_hash_names.append((hash_name, algorithms_by_name[hash_name]))
+  if not armor_hash_names:
+    raise UnsupportedClearsignedMessage('No Hash armor header')
+  return index + 1, armor_hash_names
+
+
+def _read_armored_signature(lines, index):
+  # skip the armor headers of the signature (e.g. Version), they end with an empty line
+  while index < len(lines) and lines[index].rstrip('\r'):
+    if lines[index].startswith('-----'):
+      raise UnsupportedClearsignedMessage('Malformed signature armor')
+    index += 1
+  base64_lines = []
+  for line in lines[index + 1:]:
+    line = line.rstrip('\r')
+    if line == _END_SIGNATURE:
+      try:
+        return bytearray(base64.b64decode(''.join(base64_lines)))
+      except Exception:
+        raise UnsupportedClearsignedMessage('Malformed signature armor')
+    if not line.startswith('='):
+      base64_lines.append(line)
+  raise UnsupportedClearsignedMessage('Malformed signature armor')
+
+
+def _parse_signature_packet(packet):
+  if len(packet) < 2 or not packet[0] & 0x80:
+    raise UnsupportedClearsignedMessage('Malformed signature packet')
+  if packet[0] & 0x40:
+    tag = packet[0] & 0x3f
+    first_octet = packet[1]
+    if first_octet < 192:
+      offset, length = 2, first_octet
+    elif first_octet < 224:
+      offset, length = 3, ((first_octet - 192) << 8) + packet[2] + 192
+    elif first_octet == 255:
+      offset, length = 6, struct.unpack('>I', bytes(packet[2:6]))[0]
+    else:
+      raise UnsupportedClearsignedMessage('Partial body lengths are not supported')
+  else:
+    tag = (packet[0] >> 2) & 0x0f
+    length_type = packet[0] & 0x03
+    if length_type == 0:
+      offset, length = 2, packet[1]
+    elif length_type == 1:
+      offset, length = 3, struct.unpack('>H', bytes(packet[1:3]))[0]
+    elif length_type == 2:
+      offset, length = 5, struct.unpack('>I', bytes(packet[1:5]))[0]
+    else:
+      raise UnsupportedClearsignedMessage('Indeterminate packet length is not supported')
+  if tag != _SIGNATURE_PACKET_TAG:
+    raise UnsupportedClearsignedMessage('Expected a signature packet, got tag %s' % tag)
+  if offset + length != len(packet):
+    raise UnsupportedClearsignedMessage('Exactly one signature is supported')
+
+  body = packet[offset:]
+  if len(body) < 6 or body[0] != 4:
+    raise UnsupportedClearsignedMessage('Only v4 signatures are supported')
+  signature_type, key_algorithm, hash_algorithm = body[1], body[2], body[3]
+  if signature_type != _CANONICAL_TEXT_SIGNATURE:
+    raise UnsupportedClearsignedMessage('Unsupported signature type %s' % signature_type)
+  if key_algorithm not in _RSA_SIGNING_ALGORITHMS:
+    raise UnsupportedClearsignedMessage('Unsupported public key algorithm %s' % key_algorithm)
+  if hash_algorithm not in _HASH_ALGORITHMS:
+    raise UnsupportedClearsignedMessage('Unsupported hash algorithm %s' % hash_algorithm)
+
+  hashed_length = struct.unpack('>H', bytes(body[4:6]))[0]
+  hashed_end = 6 + hashed_length
+  unhashed_length = struct.unpack('>H', bytes(body[hashed_end:hashed_end + 2]))[0]
+  unhashed_end = hashed_end + 2 + unhashed_length
+  issuer = _find_issuer(body[6:hashed_end]) or _find_issuer(body[hashed_end + 2:unhashed_end])
+  if issuer is None:
+    raise UnsupportedClearsignedMessage('No issuer in the signature')
+  left_16_bits = body[unhashed_end:unhashed_end + 2]
+  mpi_bits = struct.unpack('>H', bytes(body[unhashed_end + 2:unhashed_end + 4]))[0]
+  mpi = body[unhashed_end + 4:]
+  if len(mpi) != (mpi_bits + 7) // 8:
+    raise UnsupportedClearsignedMessage('Malformed signature MPI')
+
+  return {
+    'hash': _HASH_ALGORITHMS[hash_algorithm],
+    'hashed_trailer': bytes(body[:hashed_end]),
+    'issuer': issuer,
+    'left_16_bits': left_16_bits,
+    'signature': bytes(mpi),
+  }
+
+
+def _find_issuer(subpackets):
+  index = 0
+  while index < len(subpackets):
+    first_octet = subpackets[index]
+    if first_octet < 192:
+      length, index = first_octet, index + 1
+    elif first_octet < 255:
+      length, index = ((first_octet - 192) << 8) + subpackets[index + 1] + 192, index + 2
+    else:
+      length, index = struct.unpack('>I', bytes(subpackets[index + 1:index + 5]))[0], index + 5
+    subpacket_type = subpackets[index] & 0x7f
+    data = subpackets[index + 1:index + length]
+    if subpacket_type == _ISSUER_SUBPACKET:
+      return _hex(data)
+    if subpacket_type == _ISSUER_FINGERPRINT_SUBPACKET and len(data) == 21 and data[0] == 4:
+      return _hex(data[-8:])
+    index += length
+  return None
+
+
+def _hex(data):
+  return ''.join('%02X' % byte for byte in bytearray(data))
@@ -0,0 +1,282 @@
+import multiprocessing
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from .codec import get_codec
+from .envelope import parse_envelope
+from .exchange import Exchange
+from .verification import ClearsignVerifier, PgpyVerifier
+
+# verifier of the worker, one per worker thread/process
+_worker = threading.local()
+
+
+def _init_worker(public_key_str, public_key_fingerprint, fast_verification, codec_name):
+  exchange = Exchange(public_key_str, None, public_key_fingerprint)
+  _worker.verifier = ClearsignVerifier(exchange) if fast_verification else PgpyVerifier(exchange)
+  _worker.codec = get_codec(codec_name)
+  _worker.loads_buffer = getattr(_worker.codec, 'loads_buffer', None)
+
+
+def _verify(clearsigned_message_str):
+  started = time.time()
+  try:
+    verified, message_str = _worker.verifier.verify(clearsigned_message_str)
+    return (verified, message_str, None), started, time.time()
+  except Exception as e:
+    # exceptions are returned rather than raised as not every exception can be pickled
+    return (False, None, _describe(e)), started, time.time()
+
+
+def _ingest(message_wrapper_str):
+  started = time.time()
+  try:
+    message_type, message_wrapper = parse_envelope(
+      message_wrapper_str, _worker.codec.loads, _worker.loads_buffer
+    )
+    if message_type == 'data':
+      verified, message_str = _worker.verifier.verify(message_wrapper['data'])
+      return (message_type, _worker.codec.loads(message_str), verified, None), started, time.time()
+    elif message_type == 'error':
+      return (message_type, message_wrapper['error_code'], True, None), started, time.time()
+    # keepalive and unknown types carry nothing to be dispatched
+    return (message_type, None, True, None), started, time.time()
+  except Exception as e:
+    return (None, None, False, _describe(e)), started, time.time()
+
+
+def _verify_failure(error):
+  return False, None, error
+
+
+def _ingest_failure(error):
+  return None, None, False, error
+
+
+def _describe(exception):
+  return '%s: %s' % (type(exception).__name__, exception)
+
+
+def _apply_async(pool, function, argument, callback, error_callback):
+  if sys.version_info[0] < 3:
+    # no error_callback on Python 2, the functions run on the workers return their exceptions
+    pool.apply_async(function, (argument,), callback=callback)
+  else:
+    pool.apply_async(function, (argument,), callback=callback, error_callback=error_callback)
+
+
+def _on_error(failure, on_done):
+  def on_error(exception):
+    # nothing has been verified, so no latencies are recorded
+    on_done((failure(_describe(exception)), None, None))
+  return on_error
+
+
+class LatencyStats(object):
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def record(self, seconds):
+    self.count += 1
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+
+  @property
+  def mean(self):
+    return self.total / self.count if self.count else 0.0
+
+  def __repr__(self):
+    return 'LatencyStats(count=%s, mean=%.6f, max=%.6f)' % (self.count, self.mean, self.max)
+
+
+class VerificationPool(object):
+  """
+  Verifies signatures of market stream messages on a pool of worker threads or processes, so that
+  the reactor thread is not blocked by verification. Results are passed back to the reactor thread
+  and handed over to MarketStream strictly in the order in which the messages arrived.
+
+  Workers verify with the public key of the exchange checked against the fingerprint of the key
+  parsed by the exchange. A key replaced with Exchange.invalidate_public_key reaches them by
+  replacing the workers on the next submitted message, the old ones finish the messages already
+  submitted to them.
+
+  Pass an instance to MarketStream constructor. Call close when the pool is no longer needed.
+  """
+
+  STAGES = ('queue', 'verification', 'reorder', 'dispatch')
+
+  def __init__(self, workers=2, processes=False, call_from_thread=None):
+    """
+    :param workers: number of worker threads or processes
+    :param processes: if True, verification happens in worker processes, otherwise in threads
+    :param call_from_thread: function used to schedule a call on the reactor thread from a worker
+                             thread, twisted reactor.callFromThread by default
+    """
+    self._workers = workers
+    self._processes = processes
+    self._call_from_thread = call_from_thread
+    self._pool = None
+    self._exchange = None
+    self._worker_args = None
+    self._public_key_str = None
+    self._submitted = 0
+    self._delivered = 0
+    self._completed = {}
+    self._unordered_pending = 0
+    # latencies of the messages the workers processed, per stage
+    self.latencies = dict((stage, LatencyStats()) for stage in self.STAGES)
+    # messages passed through without being verified (see submit_done), not in latencies
+    self.unverified_count = 0
+
+  def start(self, exchange, fast_verification=False, codec='json'):
+    """
+    Called by MarketStream. Workers use the codec of the same name (codec objects are not sent to
+    worker processes).
+    """
+    if self._call_from_thread is None:
+      from twisted.internet import reactor
+      self._call_from_thread = reactor.callFromThread
+    self._exchange = exchange
+    self._worker_args = (fast_verification, getattr(codec, 'name', codec))
+    self._start_workers()
+
+  def _start_workers(self):
+    exchange = self._exchange
+    # parsing the key here checks it against the fingerprint the exchange was created with, the
+    # workers check the key they parse against the fingerprint of this one
+    public_key_fingerprint = str(exchange.public_key_fingerprint)
+    self._public_key_str = exchange.public_key_str
+    pool_class = multiprocessing.Pool if self._processes else ThreadPool
+    self._pool = pool_class(
+      self._workers, _init_worker,
+      (self._public_key_str, public_key_fingerprint) + self._worker_args,
+    )
+
+  def _check_public_key(self):
+    if self._exchange.public_key_str != self._public_key_str:
+      pool = self._pool
+      self._start_workers()
+      # workers of the old key finish what has been submitted to them and exit
+      pool.close()
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool = None
+
+  @property
+  def queue_depth(self):
+    """
+    Number of messages submitted for verification and not yet delivered.
+    """
+    return self._submitted - self._delivered + self._unordered_pending
+
+  def submit(self, clearsigned_message_str, callback, ordered=True):
+    """
+    Schedules verification of the message, once this and all previously submitted messages are
+    verified, callback(clearsigned_message_str, verified, message_str, error) is called on the
+    reactor thread, where error is a description of an exception raised during verification or
+    None.
+
+    :param ordered: if False, callback is called as soon as the message is verified, regardless of
+                    the previously submitted messages
+    """
+    if ordered:
+      self._submit(_verify, _verify_failure, clearsigned_message_str, callback)
+    else:
+      self._submit_unordered(_verify, _verify_failure, clearsigned_message_str, callback)
+
+  def submit_done(self, argument, callback, *callback_args):
+    """
+    Schedules callback(argument, *callback_args) to be called, without any work on the workers,
+    right after the callbacks of all previously submitted messages - used for messages which are
+    not verified.
+    """
+    self._submitted += 1
+    self.unverified_count += 1
+    self._on_done(self._submitted - 1, None, argument, callback, (callback_args, None, None))
+
+  def _submit(self, function, failure, argument, callback):
+    """
+    :param failure: function returning the callback arguments of a failure from the description
+                    of an exception which the pool raised instead of returning the result of
+                    function - the message still takes its turn, as a failed one
+    """
+    self._check_public_key()
+    sequence_number = self._submitted
+    self._submitted += 1
+    submitted = time.time()
+
+    def on_done(result):
+      self._call_from_thread(self._on_done, sequence_number, submitted, argument, callback, result)
+
+    _apply_async(self._pool, function, argument, on_done, _on_error(failure, on_done))
+
+  def _submit_unordered(self, function, failure, argument, callback):
+    self._check_public_key()
+    self._unordered_pending += 1
+    submitted = time.time()
+
+    def on_done(result):
+      self._call_from_thread(self._on_done_unordered, submitted, argument, callback, result)
+
+    _apply_async(self._pool, function, argument, on_done, _on_error(failure, on_done))
+
+  def _on_done_unordered(self, submitted, argument, callback, result):
+    self._unordered_pending -= 1
+    self._deliver(submitted, argument, callback, result)
+
+  def _on_done(self, sequence_number, submitted, argument, callback, result):
+    self._completed[sequence_number] = (submitted, argument, callback, result)
+    while self._delivered in self._completed:
+      submitted, argument, callback, result = self._completed.pop(self._delivered)
+      self._delivered += 1
+      self._deliver(submitted, argument, callback, result)
+
+  def _deliver(self, submitted, argument, callback, result):
+    callback_args, started, finished = result
+    if started is None:
+      callback(argument, *callback_args)
+      return
+    delivered = time.time()
+    self.latencies['queue'].record(started - submitted)
+    self.latencies['verification'].record(finished - started)
+    self.latencies['reorder'].record(delivered - finished)
+    callback(argument, *callback_args)
+    self.latencies['dispatch'].record(time.time() - delivered)
+
+
+class IngestionPool(VerificationPool):
+  """
+  Like VerificationPool but takes over the whole ingestion of market stream messages: the raw
+  message strings received from the WebSocket are sent to the workers, which parse them, verify
+  signatures and decode the JSON data - only the decoded messages are sent back to be dispatched
+  to the listeners. By default the workers are processes, so that ingestion scales with the number
+  of cores.
+
+  Pass an instance to MarketStream constructor. Call close when the pool is no longer needed.
+  """
+
+  def __init__(self, workers=2, processes=True, call_from_thread=None):
+    super(IngestionPool, self).__init__(workers, processes, call_from_thread)
+
+  def submit(self, message_wrapper_str, callback):
+    """
+    Schedules ingestion of the message, once this and all previously submitted messages are
+    ingested, callback(message_wrapper_str, message_type, payload, verified, error) is called on the
+    reactor thread, where payload is the decoded message for type data, the error code for type
+    error and None otherwise, and error is a description of an exception raised during ingestion or
+    None.
+
+    :param message_wrapper_str: str or buffer (bytes, bytearray, memoryview) of UTF-8 - memoryviews
+                                are copied to bytes when the workers are processes, as they cannot
+                                be pickled
+    """
+    if self._processes and isinstance(message_wrapper_str, memoryview):
+      message_wrapper_str = message_wrapper_str.tobytes()
+    self._submit(_ingest, _ingest_failure, message_wrapper_str, callback)
@@ -10,6 +10,7 @@ setup(
     'twisted==17.5.0',
     'cryptography==2.0.3',
     'pyOpenSSL==17.1.0',
+    'numpy==1.13.1',
     'pgpy==0.4.2',
     'six==1.10.0'
   ],
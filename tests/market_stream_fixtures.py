@@ -1,3 +1,7 @@
+import json
+
+from quedex_api.verification import extract_cleartext
+
 
 public_key_str = """-----BEGIN PGP PUBLIC KEY BLOCK-----
 Version: GnuPG v1
@@ -47,3 +51,27 @@ corrupt_data_str = 'this is not JSON'
 error_data_str = '{"type":"error","error_code":"ERROR"}'
 
 error_maintenance_data_str = '{"type":"error","error_code":"maintenance"}'
+
+
+def load(message_wrapper_str):
+  """
+  :return: the decoded message carried by a data message of the fixtures
+  """
+  return json.loads(extract_cleartext(json.loads(message_wrapper_str)['data']))
+
+
+def load_instrument_data():
+  return load(instrument_data_str)
+
+
+def order_book(instrument_id, bids, asks):
+  return {'type': 'order_book', 'instrument_id': instrument_id, 'bids': bids, 'asks': asks}
+
+
+def quotes(instrument_id, bid='0.00000100', ask='0.00000120', bid_quantity=10, ask_quantity=10,
+           last=None, last_quantity=0, volume=0, open_interest=0):
+  return {
+    'type': 'quotes', 'instrument_id': instrument_id, 'bid': bid, 'bid_quantity': bid_quantity,
+    'ask': ask, 'ask_quantity': ask_quantity, 'last': last, 'last_quantity': last_quantity,
+    'volume': volume, 'open_interest': open_interest,
+  }
@@ -0,0 +1,213 @@
+from unittest import TestCase
+
+import numpy as np
+
+from market_stream_fixtures import load_instrument_data, quotes
+from quedex_api import ArbitrageListener, ArbitrageScanner
+from quedex_api.arbitrage import BUTTERFLY, FUTURES_SYNTHETIC, PUT_CALL_PARITY, VERTICAL_SPREAD
+
+EXPIRATION = 1499990400000
+FUTURES_ID = '24'
+FORWARD = 0.0004
+TIME_VALUE = 0.00001
+HALF_SPREAD = 0.000001
+
+
+def float_quotes(instrument_id, bid, ask):
+  def price_str(price):
+    return None if price is None else '%.8f' % price
+  return quotes(instrument_id, price_str(bid), price_str(ask))
+
+
+class Listener(ArbitrageListener):
+  def __init__(self):
+    self.calls = []
+
+  def on_violations(self, underlying_symbol, expiration_date, violations):
+    self.calls.append((underlying_symbol, expiration_date, violations))
+
+
+class TestArbitrageScanner(TestCase):
+
+  def setUp(self):
+    self.scanner = ArbitrageScanner()
+    self.listener = Listener()
+    self.scanner.add_listener(self.listener)
+    self.scanner.on_instrument_data(load_instrument_data())
+    self.options = self.scanner.registry.find(expiration_date=EXPIRATION, type='option')
+    # consistent quotes: constant time value over the intrinsic value
+    for option in self.options:
+      self.quote_option(option, self.fair_price(option))
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, FORWARD - HALF_SPREAD, FORWARD + HALF_SPREAD))
+    self.scanner.scan()
+
+  def fair_price(self, option):
+    strike = float(option.strike)
+    intrinsic = max(FORWARD - strike, 0) if option.is_call else max(strike - FORWARD, 0)
+    return intrinsic + TIME_VALUE
+
+  def quote_option(self, option, price):
+    self.scanner.on_quotes(
+      float_quotes(option.instrument_id, price - HALF_SPREAD, price + HALF_SPREAD)
+    )
+
+  def option(self, row, is_call):
+    return [option for option in self.options if option.is_call == is_call][row]
+
+  def checks(self):
+    return [
+      (violation['check'], violation['is_call'], violation['strike'], violation['other_strike'])
+      for violation in self.scanner.violations('USD', EXPIRATION)
+    ]
+
+  def test_finds_no_violations_in_consistent_quotes(self):
+    self.assertEqual(len(self.scanner.violations('USD', EXPIRATION)), 0)
+    self.assertEqual(self.listener.calls, [])
+
+  def test_finds_vertical_spread_violation(self):
+    lower, higher = self.option(3, True), self.option(4, True)
+    self.quote_option(lower, self.fair_price(higher) - 0.000005)
+
+    self.scanner.scan()
+
+    # the cheap call is also cheaper than the calls of lower strikes allow, which breaks the
+    # other checks
+    violations = self.scanner.violations('USD', EXPIRATION)
+    vertical = violations[
+      (violations['check'] == VERTICAL_SPREAD) & (violations['strike'] == float(lower.strike))
+    ]
+    self.assertEqual(len(vertical), 1)
+    self.assertTrue(vertical[0]['is_call'])
+    self.assertEqual(vertical[0]['other_strike'], float(higher.strike))
+    self.assertAlmostEqual(vertical[0]['amount'], 0.000003, places=12)
+    self.assertEqual(
+      sorted(set(violations['check'])),
+      [PUT_CALL_PARITY, VERTICAL_SPREAD, BUTTERFLY, FUTURES_SYNTHETIC],
+    )
+
+  def test_finds_vertical_spread_wider_than_strikes(self):
+    lower, higher = self.option(3, False), self.option(4, False)
+    width = float(higher.strike - lower.strike)
+    self.quote_option(higher, self.fair_price(lower) + width + 0.000005)
+
+    self.scanner.scan()
+
+    self.assertIn(
+      (VERTICAL_SPREAD, False, float(lower.strike), float(higher.strike)), self.checks()
+    )
+
+  def test_finds_butterfly_violation(self):
+    middle = self.option(5, False)
+    self.quote_option(middle, self.fair_price(middle) + 0.00001)
+
+    self.scanner.scan()
+
+    violations = self.scanner.violations('USD', EXPIRATION)
+    butterflies = violations[violations['check'] == BUTTERFLY]
+    self.assertEqual(len(butterflies), 1)
+    self.assertFalse(butterflies[0]['is_call'])
+    self.assertEqual(butterflies[0]['strike'], float(middle.strike))
+    self.assertTrue(np.isnan(butterflies[0]['other_strike']))
+
+  def test_finds_put_call_parity_violation(self):
+    call, put = self.option(2, True), self.option(2, False)
+    # the synthetic forward of the strike can be sold above where those of other strikes are bought
+    self.quote_option(call, self.fair_price(call) + 0.00001)
+    self.quote_option(put, self.fair_price(put) - 0.00001)
+
+    self.scanner.scan()
+
+    violations = self.scanner.violations('USD', EXPIRATION)
+    parity = violations[violations['check'] == PUT_CALL_PARITY]
+    self.assertEqual(len(parity), len(self.options) // 2 - 1)
+    self.assertTrue((parity['other_strike'] == float(call.strike)).all())
+    self.assertNotIn(float(call.strike), parity['strike'])
+    np.testing.assert_allclose(parity['amount'], 0.000016, atol=1e-12)
+
+  def test_finds_futures_synthetic_violation(self):
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, FORWARD + 0.00001, FORWARD + 0.000012))
+
+    self.scanner.scan()
+
+    violations = self.scanner.violations('USD', EXPIRATION)
+    self.assertTrue((violations['check'] == FUTURES_SYNTHETIC).all())
+    self.assertEqual(len(violations), len(self.options) // 2)
+    np.testing.assert_allclose(violations['amount'], 0.000008, atol=1e-12)
+
+  def test_ignores_violations_within_tolerance(self):
+    self.scanner.tolerance = 0.00001
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, FORWARD + 0.00001, FORWARD + 0.000012))
+
+    self.assertEqual(self.scanner.scan(), 0)
+
+  def test_ignores_missing_quotes(self):
+    self.scanner.on_quotes(float_quotes(self.option(3, True).instrument_id, None, None))
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, None, None))
+
+    self.assertEqual(self.scanner.scan(), 0)
+
+  def test_scans_only_changed_expiries(self):
+    scanned_count = self.scanner.scanned_count
+
+    self.assertEqual(self.scanner.scan(), 0)
+    self.assertEqual(self.scanner.scanned_count, scanned_count)
+
+    self.quote_option(self.option(0, True), 0.0001)
+    self.scanner.on_quotes(float_quotes('1000', 0.1, 0.2))
+    self.scanner.scan()
+    self.assertEqual(self.scanner.scanned_count, scanned_count + 1)
+
+    # unchanged quotes of the futures do not change anything
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, FORWARD - HALF_SPREAD, FORWARD + HALF_SPREAD))
+    self.scanner.scan()
+    self.assertEqual(self.scanner.scanned_count, scanned_count + 1)
+
+  def test_notifies_listener_of_found_and_disappeared_violations(self):
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, FORWARD + 0.00001, FORWARD + 0.000012))
+    self.scanner.scan()
+    self.scanner.on_quotes(float_quotes(FUTURES_ID, FORWARD - HALF_SPREAD, FORWARD + HALF_SPREAD))
+    self.scanner.scan()
+
+    self.assertEqual(len(self.listener.calls), 2)
+    underlying_symbol, expiration_date, violations = self.listener.calls[0]
+    self.assertEqual((underlying_symbol, expiration_date), ('USD', EXPIRATION))
+    self.assertEqual(len(violations), 11)
+    self.assertFalse(violations.flags.writeable)
+    self.assertEqual(len(self.listener.calls[1][2]), 0)
+
+  def test_scans_several_expiries_at_once(self):
+    other_expiration = 1506643200000
+    for option in self.scanner.registry.find(expiration_date=other_expiration, type='option'):
+      self.quote_option(option, self.fair_price(option))
+    put = self.option(5, False)
+    self.quote_option(put, self.fair_price(put) + 0.00001)
+
+    self.assertEqual(self.scanner.scan(), len(self.checks()))
+
+    self.assertEqual(self.scanner.scanned_count, 5)
+    self.assertEqual(len(self.scanner.violations('USD', other_expiration)), 0)
+    self.assertIn(
+      (BUTTERFLY, float(put.strike)), [(check, strike) for check, _, strike, _ in self.checks()]
+    )
+
+  def test_scans_partially_quoted_expiries(self):
+    other_expiration = 1506643200000
+    calls = sorted(
+      (option
+       for option in self.scanner.registry.find(expiration_date=other_expiration, type='option')
+       if option.is_call),
+      key=lambda option: option.strike,
+    )
+    # only calls are quoted, a call of a higher strike priced above the one of a lower strike
+    self.quote_option(calls[0], 0.0001)
+    self.quote_option(calls[1], 0.0002)
+    put = self.option(5, False)
+    self.quote_option(put, self.fair_price(put) + 0.00001)
+
+    self.scanner.scan()
+
+    other_checks = [
+      violation['check'] for violation in self.scanner.violations('USD', other_expiration)
+    ]
+    self.assertEqual(other_checks, [VERTICAL_SPREAD])
+    self.assertIn(PUT_CALL_PARITY, [check for check, _, _, _ in self.checks()])
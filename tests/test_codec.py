@@ -0,0 +1,107 @@
+from unittest import TestCase
+import json
+import sys
+import types
+
+import market_stream_fixtures
+from quedex_api import Exchange, MarketStream
+from quedex_api.codec import JsonCodec, available_codecs, get_codec
+from quedex_api.verification import extract_cleartext
+from test_market_stream import TestListener
+
+FIXTURES = [
+  market_stream_fixtures.order_book_str,
+  market_stream_fixtures.quotes_str,
+  market_stream_fixtures.spot_data_str,
+  market_stream_fixtures.instrument_data_str,
+  market_stream_fixtures.trade_str,
+]
+
+
+class TestCodec(TestCase):
+
+  def test_available_codecs_decode_like_json(self):
+    for name in available_codecs():
+      codec = get_codec(name)
+      for fixture in FIXTURES:
+        message_str = extract_cleartext(json.loads(fixture)['data'])
+
+        self.assertEqual(codec.loads(message_str), json.loads(message_str), name)
+
+  def test_available_codecs_encode_valid_json(self):
+    entity = {'type': 'place_order', 'limit_price': '0.00041667', 'quantity': 10, 'post_only': True}
+    for name in available_codecs():
+      self.assertEqual(json.loads(get_codec(name).dumps(entity)), entity, name)
+
+  def test_json_codec_is_always_available(self):
+    self.assertEqual(available_codecs()[-1], 'json')
+
+  def test_defaults_to_json(self):
+    self.assertEqual(get_codec().name, 'json')
+
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+
+    self.assertEqual(market_stream._codec.name, 'json')
+
+  def test_auto_picks_fastest_installed_codec(self):
+    ujson = types.ModuleType('ujson')
+    ujson.loads = json.loads
+    ujson.dumps = json.dumps
+    # None in sys.modules makes the import fail as if the library was not installed
+    stubs = {'orjson': None, 'simdjson': None, 'ujson': ujson}
+    saved = dict((name, sys.modules.get(name)) for name in stubs)
+    sys.modules.update(stubs)
+    try:
+      self.assertEqual(available_codecs(), ['ujson', 'json'])
+      self.assertEqual(get_codec('auto').name, 'ujson')
+
+      sys.modules['ujson'] = None
+
+      self.assertEqual(get_codec('auto').name, 'json')
+    finally:
+      for name, module in saved.items():
+        if module is None:
+          del sys.modules[name]
+        else:
+          sys.modules[name] = module
+
+  def test_accepts_unicode_names(self):
+    self.assertEqual(get_codec(u'json').name, 'json')
+
+  def test_returns_codec_object_as_is(self):
+    codec = JsonCodec()
+
+    self.assertIs(get_codec(codec), codec)
+
+  def test_rejects_unknown_codec(self):
+    with self.assertRaises(ValueError):
+      get_codec('yaml')
+
+  def test_market_stream_decodes_with_given_codec(self):
+    decoded = []
+
+    class RecordingCodec(JsonCodec):
+      def loads(self, message_str):
+        decoded.append(message_str)
+        return super(RecordingCodec, self).loads(message_str)
+
+    market_stream = MarketStream(
+      Exchange(market_stream_fixtures.public_key_str, 'apiurl'), codec=RecordingCodec()
+    )
+    listener = TestListener()
+    market_stream.add_listener(listener)
+
+    market_stream.on_message(market_stream_fixtures.trade_str)
+
+    self.assertEqual(len(decoded), 1)
+    self.assertEqual(listener.trade['trade_id'], '138')
+
+  def test_codecs_decoding_buffers_decode_like_json(self):
+    for name in available_codecs():
+      codec = get_codec(name)
+      if codec.loads_buffer is None:
+        continue
+      for fixture in FIXTURES:
+        message_bytes = fixture.encode('utf8')
+
+        self.assertEqual(codec.loads_buffer(memoryview(message_bytes)), json.loads(fixture), name)
@@ -0,0 +1,215 @@
+from unittest import TestCase
+
+import market_stream_fixtures
+from quedex_api import (
+  ConflatingListener, Exchange, MarketStream, MarketStreamListener, VerificationPolicy,
+)
+from test_market_stream import forge
+
+
+def order_book(instrument_id, bid):
+  return {'type': 'order_book', 'instrument_id': instrument_id, 'bids': [[bid, 1]], 'asks': []}
+
+
+def quotes(instrument_id, last):
+  return {'type': 'quotes', 'instrument_id': instrument_id, 'last': last}
+
+
+def trade(instrument_id, trade_id):
+  return {'type': 'trade', 'instrument_id': instrument_id, 'trade_id': trade_id}
+
+
+class RecordingListener(MarketStreamListener):
+  def __init__(self):
+    self.calls = []
+
+  def on_message(self, message):
+    self.calls.append(('on_message', message))
+
+  def on_order_book(self, order_book):
+    self.calls.append(('on_order_book', order_book))
+
+  def on_trade(self, trade):
+    self.calls.append(('on_trade', trade))
+
+  def on_error(self, error):
+    self.calls.append(('on_error', error))
+
+  def on_verification_failed(self, message):
+    self.calls.append(('on_verification_failed', message))
+
+  def messages(self):
+    return [message for name, message in self.calls if name == 'on_message']
+
+
+class TestConflatingListener(TestCase):
+
+  def setUp(self):
+    self.listener = RecordingListener()
+    self.conflating_listener = ConflatingListener(self.listener)
+
+  def receive(self, *messages):
+    for message in messages:
+      self.conflating_listener.on_message(message)
+
+  def test_queues_messages_until_flush(self):
+    self.receive(order_book('71', '1'), trade('71', '1'))
+
+    self.assertEqual(self.listener.calls, [])
+    self.assertEqual(self.conflating_listener.pending, 2)
+    self.assertEqual(self.conflating_listener.flush(), 2)
+    self.assertEqual(self.listener.calls, [
+      ('on_message', order_book('71', '1')),
+      ('on_order_book', order_book('71', '1')),
+      ('on_message', trade('71', '1')),
+      ('on_trade', trade('71', '1')),
+    ])
+    self.assertEqual(self.conflating_listener.pending, 0)
+
+  def test_keeps_only_newest_book_and_quotes_per_instrument(self):
+    self.receive(
+      order_book('71', '1'), quotes('71', '1'), order_book('72', '1'), order_book('71', '2'),
+      quotes('71', '2'), order_book('71', '3'),
+    )
+    self.conflating_listener.flush()
+
+    self.assertEqual(
+      self.listener.messages(), [order_book('72', '1'), quotes('71', '2'), order_book('71', '3')]
+    )
+    self.assertEqual(self.conflating_listener.coalesced_count, 3)
+    self.assertEqual(self.conflating_listener.delivered_count, 3)
+
+  def test_never_conflates_other_messages(self):
+    session_state = {'type': 'session_state', 'state': 'continuous'}
+    self.receive(
+      trade('71', '1'), order_book('71', '1'), trade('71', '2'), session_state,
+      order_book('71', '2'), session_state,
+    )
+    self.conflating_listener.flush()
+
+    # the newest book takes the place of the older one, after the trades which preceded it
+    self.assertEqual(self.listener.messages(), [
+      trade('71', '1'), trade('71', '2'), session_state, order_book('71', '2'), session_state,
+    ])
+    self.assertEqual(self.conflating_listener.coalesced_count, 1)
+
+  def test_flushes_at_most_given_number_of_messages(self):
+    self.receive(trade('71', '1'), trade('71', '2'), trade('71', '3'))
+
+    self.assertEqual(self.conflating_listener.flush(max_messages=2), 2)
+    self.assertEqual(self.listener.messages(), [trade('71', '1'), trade('71', '2')])
+    self.assertEqual(self.conflating_listener.pending, 1)
+
+  def test_passes_errors_on_immediately(self):
+    error = Exception('error')
+    self.conflating_listener.on_error(error)
+
+    self.assertEqual(self.listener.calls, [('on_error', error)])
+
+  def test_computes_deltas_between_delivered_books(self):
+    class DeltaListener(MarketStreamListener):
+      def __init__(self):
+        self.deltas = []
+
+      def on_order_book_delta(self, order_book_delta):
+        self.deltas.append(order_book_delta['changes'])
+
+    listener = DeltaListener()
+    conflating_listener = ConflatingListener(listener)
+    for message in [order_book('71', '1'), order_book('71', '2'), order_book('71', '3')]:
+      conflating_listener.on_message(message)
+    conflating_listener.flush()
+    conflating_listener.on_message(order_book('71', '4'))
+    conflating_listener.flush()
+
+    self.assertEqual(
+      listener.deltas, [[['bid', '3', 0, 1]], [['bid', '4', 0, 1], ['bid', '3', 1, 0]]]
+    )
+
+  def test_drops_retracted_messages_still_queued(self):
+    book = order_book('71', '1')
+    first_trade = trade('71', '1')
+    self.receive(book, first_trade)
+
+    self.conflating_listener.on_verification_failed(book)
+    self.conflating_listener.on_verification_failed(first_trade)
+    self.conflating_listener.flush()
+
+    self.assertEqual(self.listener.calls, [])
+
+  def test_passes_on_retraction_of_delivered_messages(self):
+    book = order_book('71', '1')
+    self.receive(book)
+    self.conflating_listener.flush()
+
+    self.conflating_listener.on_verification_failed(book)
+
+    self.assertEqual(self.listener.calls[-1], ('on_verification_failed', book))
+
+  def test_computes_next_delta_from_scratch_after_retraction(self):
+    class DeltaListener(MarketStreamListener):
+      def __init__(self):
+        self.deltas = []
+
+      def on_order_book_delta(self, order_book_delta):
+        self.deltas.append(order_book_delta['changes'])
+
+    listener = DeltaListener()
+    conflating_listener = ConflatingListener(listener)
+    book = order_book('71', '1')
+    conflating_listener.on_message(book)
+    conflating_listener.flush()
+
+    conflating_listener.on_verification_failed(book)
+    conflating_listener.on_message(order_book('71', '1'))
+    conflating_listener.flush()
+
+    self.assertEqual(listener.deltas, [[['bid', '1', 0, 1]], [['bid', '1', 0, 1]]])
+
+  def test_drops_retraction_of_coalesced_messages(self):
+    old_book = order_book('71', '1')
+    self.receive(old_book, order_book('71', '2'))
+    self.conflating_listener.flush()
+
+    self.conflating_listener.on_verification_failed(old_book)
+
+    self.assertNotIn('on_verification_failed', [call[0] for call in self.listener.calls])
+
+  def test_passes_on_retraction_of_coalesced_messages_no_longer_remembered(self):
+    conflating_listener = ConflatingListener(self.listener, coalesced_memory=1)
+    first_book, second_book = order_book('71', '1'), order_book('71', '2')
+    for message in [first_book, second_book, order_book('71', '3')]:
+      conflating_listener.on_message(message)
+
+    conflating_listener.on_verification_failed(first_book)
+    conflating_listener.on_verification_failed(second_book)
+
+    self.assertEqual(self.listener.calls, [('on_verification_failed', first_book)])
+
+  def test_wraps_listener_of_market_stream(self):
+    market_stream = MarketStream(
+      Exchange(market_stream_fixtures.public_key_str, 'apiurl'),
+      verification_policy=VerificationPolicy.deferred(
+        schedule=lambda function, *args: function(*args)
+      ),
+    )
+    market_stream.add_listener(self.conflating_listener)
+
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+    market_stream.on_message(forge(market_stream_fixtures.order_book_str))
+    market_stream.on_message(market_stream_fixtures.trade_str)
+    self.conflating_listener.flush()
+
+    self.assertEqual([message['type'] for message in self.listener.messages()], ['trade'])
+    self.assertEqual(self.conflating_listener.coalesced_count, 1)
+
+  def test_is_rejected_by_stream_of_typed_messages(self):
+    market_stream = MarketStream(
+      Exchange(market_stream_fixtures.public_key_str, 'apiurl'), typed_messages=True
+    )
+
+    with self.assertRaises(ValueError):
+      market_stream.add_listener(self.conflating_listener)
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(self.conflating_listener.pending, 0)
@@ -0,0 +1,122 @@
+from unittest import TestCase
+
+from quedex_api import MarketStreamListener
+from quedex_api.dispatch import DispatchTable
+
+
+class OrderBookListener(MarketStreamListener):
+  def on_order_book(self, order_book):
+    pass
+
+
+class TradeListener(object):
+  # does not inherit from MarketStreamListener
+  def on_trade(self, trade):
+    pass
+
+
+class TestDispatchTable(TestCase):
+
+  def setUp(self):
+    self.dispatch_table = DispatchTable(MarketStreamListener)
+
+  def test_skips_methods_inherited_from_base_listener(self):
+    listener = OrderBookListener()
+    self.dispatch_table.add(listener)
+
+    self.assertEqual(self.dispatch_table.handlers('on_order_book'), [listener.on_order_book])
+    self.assertEqual(self.dispatch_table.handlers('on_message'), [])
+    self.assertEqual(self.dispatch_table.message_handlers('trade'), [])
+
+  def test_includes_methods_of_listener_not_inheriting_from_base(self):
+    listener = TradeListener()
+    self.dispatch_table.add(listener)
+
+    self.assertEqual(self.dispatch_table.message_handlers('trade'), [listener.on_trade])
+    self.assertEqual(self.dispatch_table.message_handlers('order_book'), [])
+
+  def test_includes_methods_set_on_instance(self):
+    listener = MarketStreamListener()
+    listener.on_quotes = lambda quotes: None
+    self.dispatch_table.add(listener)
+
+    self.assertEqual(self.dispatch_table.message_handlers('quotes'), [listener.on_quotes])
+
+  def test_includes_methods_unknown_to_base_listener(self):
+    class Listener(MarketStreamListener):
+      def on_new_type(self, message):
+        pass
+    listener = Listener()
+    self.dispatch_table.add(listener)
+
+    self.assertEqual(self.dispatch_table.message_handlers('new_type'), [listener.on_new_type])
+
+  def test_keeps_order_of_adding(self):
+    first, second = OrderBookListener(), OrderBookListener()
+    self.dispatch_table.add(first)
+    self.dispatch_table.add(second)
+
+    self.assertEqual(
+      self.dispatch_table.message_handlers('order_book'),
+      [first.on_order_book, second.on_order_book],
+    )
+
+  def test_rebuilds_on_remove(self):
+    first, second = OrderBookListener(), OrderBookListener()
+    self.dispatch_table.add(first)
+    self.dispatch_table.add(second)
+    self.dispatch_table.message_handlers('order_book')
+
+    self.dispatch_table.remove(first)
+
+    self.assertEqual(self.dispatch_table.message_handlers('order_book'), [second.on_order_book])
+    self.assertEqual(self.dispatch_table.listeners, [second])
+
+  def test_limits_scoped_listeners(self):
+    everything, scoped = OrderBookListener(), OrderBookListener()
+    self.dispatch_table.add(everything)
+    self.dispatch_table.add(scoped, instrument_ids=['71'], message_types=['order_book'])
+
+    self.assertTrue(self.dispatch_table.scoped)
+    self.assertEqual(
+      self.dispatch_table.message_handlers('order_book', '71'),
+      [everything.on_order_book, scoped.on_order_book],
+    )
+    self.assertEqual(
+      self.dispatch_table.message_handlers('order_book', '24'), [everything.on_order_book]
+    )
+    # lifecycle methods are not limited
+    self.assertEqual(len(self.dispatch_table.handlers('on_order_book')), 2)
+
+  def test_does_not_limit_messages_of_no_instrument_by_instruments(self):
+    listener = MarketStreamListener()
+    listener.on_session_state = lambda session_state: None
+    self.dispatch_table.add(listener, instrument_ids=['71'])
+
+    self.assertEqual(
+      self.dispatch_table.message_handlers('session_state'), [listener.on_session_state]
+    )
+
+  def test_rebuilds_scopes_on_remove(self):
+    listener = OrderBookListener()
+    self.dispatch_table.add(listener, instrument_ids=['71'])
+    self.dispatch_table.message_handlers('order_book', '24')
+
+    self.dispatch_table.remove(listener)
+    self.dispatch_table.add(listener)
+
+    self.assertFalse(self.dispatch_table.scoped)
+    self.assertEqual(
+      self.dispatch_table.message_handlers('order_book', '24'), [listener.on_order_book]
+    )
+
+  def test_receives_all_with_unscoped_on_message_only(self):
+    listener = MarketStreamListener()
+    listener.on_message = lambda message: None
+    self.dispatch_table.add(listener, message_types=['trade'])
+
+    self.assertFalse(self.dispatch_table.receives_all)
+
+    self.dispatch_table.add(listener)
+
+    self.assertTrue(self.dispatch_table.receives_all)
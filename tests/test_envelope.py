@@ -0,0 +1,120 @@
+from unittest import TestCase
+import json
+
+import market_stream_fixtures
+from quedex_api.envelope import decode_message, parse_envelope, peek_message
+from quedex_api.verification import extract_cleartext
+
+
+def loads_buffer(message_buffer):
+  return json.loads(bytes(message_buffer).decode('utf8'))
+
+
+class TestParseEnvelope(TestCase):
+
+  def assert_parses_like_json(self, message_wrapper_str):
+    message_wrapper = json.loads(message_wrapper_str)
+
+    message_bytes = message_wrapper_str.encode('utf8')
+    envelopes = [
+      message_wrapper_str, message_bytes, bytearray(message_bytes), memoryview(message_bytes)
+    ]
+    for envelope in envelopes:
+      for parsed in [parse_envelope(envelope), parse_envelope(envelope, loads_buffer=loads_buffer)]:
+        message_type, parsed_message_wrapper = parsed
+        self.assertEqual(message_type, message_wrapper['type'])
+        # other fields of data messages may be dropped
+        for key in ['type', 'data', 'error_code']:
+          self.assertEqual(parsed_message_wrapper.get(key), message_wrapper.get(key))
+
+  def test_parses_data_messages(self):
+    for message_wrapper_str in [
+      market_stream_fixtures.order_book_str,
+      market_stream_fixtures.instrument_data_str,
+      market_stream_fixtures.spot_data_str,
+    ]:
+      self.assert_parses_like_json(message_wrapper_str)
+
+  def test_parses_escaped_and_non_ascii_data(self):
+    self.assert_parses_like_json(json.dumps({'type': 'data', 'data': 'a\n"b"\\c é€'}))
+    self.assert_parses_like_json(
+      json.dumps({'type': 'data', 'data': 'a\n"b"\\c é€'}, ensure_ascii=False)
+    )
+
+  def test_does_not_decode_keepalive(self):
+    self.assertEqual(
+      parse_envelope('{"type":"keepalive","timestamp":1506958410894}'), ('keepalive', None)
+    )
+    self.assertEqual(
+      parse_envelope(b'{"type":"keepalive","timestamp":1506958410894}'), ('keepalive', None)
+    )
+    self.assertEqual(
+      parse_envelope(
+        memoryview(b'{"type":"keepalive","timestamp":1506958410894}'), loads_buffer=self.fail
+      ),
+      ('keepalive', None)
+    )
+
+  def test_decodes_buffers_with_loads_buffer_only(self):
+    message_bytes = market_stream_fixtures.order_book_str.encode('utf8')
+    buffers = []
+
+    def recording_loads_buffer(message_buffer):
+      buffers.append(message_buffer)
+      return loads_buffer(message_buffer)
+
+    view = memoryview(message_bytes)
+    parse_envelope(view, loads=self.fail, loads_buffer=recording_loads_buffer)
+
+    self.assertEqual(len(buffers), 1)
+    self.assertIs(buffers[0], view)
+
+  def test_parses_error_messages(self):
+    self.assert_parses_like_json(market_stream_fixtures.error_data_str)
+
+  def test_parses_envelopes_of_other_shape(self):
+    self.assert_parses_like_json('{"data":"x","type":"data"}')
+    self.assert_parses_like_json('{"type":"data","other":"y","data":"x"}')
+    self.assert_parses_like_json('{"type":"data","data":"x","id":1}')
+    self.assert_parses_like_json('{ "type" : "data" , "data" : "x" }')
+
+  def test_raises_on_invalid_json(self):
+    with self.assertRaises(ValueError):
+      parse_envelope(market_stream_fixtures.corrupt_data_str)
+
+
+class TestDecodeMessage(TestCase):
+
+  def test_decodes_buffers(self):
+    message_bytes = u'{"data":"\u00e9\u20ac"}'.encode('utf8')
+    for message in [message_bytes, bytearray(message_bytes), memoryview(message_bytes)]:
+      self.assertEqual(decode_message(message), u'{"data":"\u00e9\u20ac"}')
+
+  def test_returns_str_as_is(self):
+    message_str = market_stream_fixtures.order_book_str
+
+    self.assertIs(decode_message(message_str), message_str)
+
+
+class TestPeekMessage(TestCase):
+
+  def test_peeks_into_flat_messages(self):
+    order_book_str = extract_cleartext(
+      json.loads(market_stream_fixtures.order_book_str)['data']
+    )
+    session_state_str = extract_cleartext(
+      json.loads(market_stream_fixtures.session_state_str)['data']
+    )
+
+    self.assertEqual(peek_message(order_book_str), ('order_book', '71'))
+    self.assertEqual(peek_message(session_state_str), ('session_state', None))
+
+  def test_does_not_peek_into_nested_messages(self):
+    instrument_data_str = extract_cleartext(
+      json.loads(market_stream_fixtures.instrument_data_str)['data']
+    )
+
+    self.assertEqual(peek_message(instrument_data_str), None)
+    self.assertEqual(
+      peek_message('{"instrument_id": "1", "x": {"instrument_id": "2"}, "type": "quotes"}'), None
+    )
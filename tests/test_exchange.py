@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+from quedex_api import Exchange, Trader
+
+
+class TestExchange(TestCase):
+
+  def setUp(self):
+    with open('keys/quedex-public-key.asc', 'r') as f:
+      self.public_key_str = f.read()
+    self.exchange = Exchange(self.public_key_str, 'wss://url')
+
+  def test_public_key_is_parsed_once(self):
+    self.assertIs(self.exchange.public_key, self.exchange.public_key)
+
+  def test_invalidated_public_key_is_parsed_again(self):
+    public_key = self.exchange.public_key
+
+    self.exchange.invalidate_public_key()
+
+    self.assertIsNot(self.exchange.public_key, public_key)
+    self.assertEqual(self.exchange.public_key.fingerprint, public_key.fingerprint)
+
+  def test_invalidate_replaces_public_key(self):
+    with open('keys/trader-public-key.asc', 'r') as f:
+      trader_public_key_str = f.read()
+    public_key_fingerprint = self.exchange.public_key_fingerprint
+
+    self.exchange.invalidate_public_key(trader_public_key_str)
+
+    self.assertNotEqual(self.exchange.public_key_fingerprint, public_key_fingerprint)
+
+  def test_accepts_matching_fingerprint(self):
+    fingerprint = str(self.exchange.public_key_fingerprint)
+    exchange = Exchange(
+      self.public_key_str, 'wss://url', public_key_fingerprint=fingerprint.lower()
+    )
+
+    self.assertEqual(exchange.public_key_fingerprint, fingerprint)
+
+  def test_rejects_mismatching_fingerprint(self):
+    exchange = Exchange(self.public_key_str, 'wss://url', public_key_fingerprint='00' * 20)
+
+    with self.assertRaises(ValueError):
+      exchange.public_key
+
+
+class TestTrader(TestCase):
+
+  def setUp(self):
+    with open('keys/trader-private-key.asc', 'r') as f:
+      self.trader = Trader('123456789', f.read())
+
+  def test_private_key_is_parsed_once(self):
+    self.assertIs(self.trader.private_key, self.trader.private_key)
+
+  def test_invalidated_private_key_is_parsed_again(self):
+    private_key = self.trader.private_key
+
+    self.trader.invalidate_private_key()
+
+    self.assertIsNot(self.trader.private_key, private_key)
+    self.assertEqual(self.trader.private_key_fingerprint, private_key.fingerprint)
@@ -0,0 +1,114 @@
+from unittest import TestCase
+from datetime import datetime
+from decimal import Decimal
+
+import market_stream_fixtures
+from market_stream_fixtures import load_instrument_data
+from quedex_api import Exchange, InstrumentRegistry, MarketStream
+
+
+class TestInstrumentRegistry(TestCase):
+
+  def setUp(self):
+    self.registry = InstrumentRegistry()
+    self.registry.on_instrument_data(load_instrument_data())
+
+  def test_parses_instruments(self):
+    instrument = self.registry['25']
+
+    self.assertEqual(instrument.type, 'option')
+    self.assertEqual(instrument.symbol, 'O.USD.JUL17W2:C0.00043478')
+    self.assertEqual(instrument.strike, Decimal('0.00043478'))
+    self.assertEqual(instrument.tick_size, Decimal('0.00000001'))
+    self.assertEqual(instrument.maintenance_margin, Decimal('0.04'))
+    self.assertEqual(instrument.expiration_date, 1499990400000)
+    self.assertEqual(instrument.expiration, datetime(2017, 7, 14))
+    self.assertEqual(instrument.issue, datetime(2017, 6, 30))
+    self.assertTrue(instrument.is_option)
+    self.assertTrue(instrument.is_call)
+    self.assertFalse(instrument.is_put)
+    self.assertEqual(instrument.data['inverse_strike'], '2300.00000000')
+
+  def test_parses_futures(self):
+    instrument = self.registry['24']
+
+    self.assertEqual(instrument.type, 'futures')
+    self.assertIsNone(instrument.strike)
+    self.assertIsNone(instrument.option_type)
+    self.assertFalse(instrument.is_option)
+
+  def test_lookup(self):
+    self.assertEqual(len(self.registry), 69)
+    self.assertIn('24', self.registry)
+    self.assertNotIn('1000', self.registry)
+    self.assertIsNone(self.registry.get('1000'))
+    self.assertEqual(len(list(self.registry)), 69)
+
+  def test_finds_by_indexes(self):
+    futures = self.registry.find(type='futures', underlying_symbol='USD')
+    self.assertEqual(
+      [instrument.expiration_date for instrument in futures],
+      [1499990400000, 1500595200000, 1506643200000],
+    )
+
+    calls = self.registry.find(expiration_date=1499990400000, option_type='call_european')
+    self.assertEqual(len(calls), 11)
+    strikes = [instrument.strike for instrument in calls]
+    self.assertEqual(strikes, sorted(strikes))
+
+    by_strike = self.registry.find(strike='0.00043478')
+    self.assertEqual(
+      sorted(instrument.instrument_id for instrument in by_strike), ['25', '36', '48', '59']
+    )
+    self.assertEqual(
+      self.registry.find(
+        strike=Decimal('0.00043478'), option_type='put_european', expiration_date=1506643200000
+      ),
+      [self.registry['59']],
+    )
+    self.assertEqual(self.registry.find(type='unknown'), [])
+
+  def test_distinct_values(self):
+    self.assertEqual(self.registry.expirations(), [1499990400000, 1500595200000, 1506643200000])
+    self.assertEqual(
+      self.registry.expirations(type='futures', underlying_symbol='USD'),
+      [1499990400000, 1500595200000, 1506643200000],
+    )
+    self.assertEqual(len(self.registry.strikes(1499990400000)), 11)
+    self.assertEqual(self.registry.values('option_type'), ['call_european', 'put_european'])
+
+  def test_parses_shared_payload_once(self):
+    instrument_data = load_instrument_data()
+    registry = InstrumentRegistry()
+    registry.on_instrument_data(instrument_data)
+    instrument = registry['25']
+
+    registry.on_instrument_data(instrument_data)
+    self.assertEqual(registry.version, 1)
+    # unchanged instruments of a new payload are kept
+    registry.on_instrument_data(load_instrument_data())
+    self.assertEqual(registry.version, 1)
+    self.assertIs(registry['25'], instrument)
+
+  def test_updates_changed_instruments(self):
+    instrument_data = load_instrument_data()
+    instrument_data['data']['25']['maintenance_margin'] = '0.05000000'
+    del instrument_data['data']['24']
+    instrument = self.registry['26']
+
+    self.registry.on_instrument_data(instrument_data)
+
+    self.assertEqual(self.registry.version, 2)
+    self.assertEqual(self.registry['25'].maintenance_margin, Decimal('0.05'))
+    self.assertNotIn('24', self.registry)
+    self.assertEqual(len(self.registry.find(type='futures')), 2)
+    self.assertIs(self.registry['26'], instrument)
+
+  def test_receives_instrument_data_from_market_stream(self):
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+    registry = InstrumentRegistry()
+    market_stream.add_listener(registry)
+
+    market_stream.on_message(market_stream_fixtures.instrument_data_str)
+
+    self.assertEqual(len(registry), 69)
@@ -1,8 +1,13 @@
 from unittest import TestCase
+from decimal import Decimal
 import json
 
 import market_stream_fixtures
-from quedex_api import MarketStream, MarketStreamListener, Exchange
+from quedex_api import (
+  ArbitrageScanner, ConflatingListener, MarketStream, MarketStreamListener, Exchange, OptionChain,
+  OptionPricer, OrderBookStore, TermStructure, TickTable, TopOfBookCache, VerificationPolicy,
+)
+from quedex_api.messages import OrderBook, Quotes, Trade
 
 
 class TestMarketStream(TestCase):
@@ -198,6 +203,366 @@ class TestMarketStream(TestCase):
     self.assertTrue(self.listener.ready)
 
 
+def forge(message_wrapper_str):
+  message_wrapper = json.loads(message_wrapper_str)
+  message_wrapper['data'] = message_wrapper['data'].replace('"type"', ' "type"', 1)
+  return json.dumps(message_wrapper)
+
+
+class TestMarketStreamVerificationPolicy(TestCase):
+
+  def create_market_stream(self, verification_policy):
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = TestListener()
+    self.market_stream = MarketStream(exchange, verification_policy=verification_policy)
+    self.market_stream.add_listener(self.listener)
+
+  def test_full_policy_verifies_every_message(self):
+    self.create_market_stream(VerificationPolicy.full())
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(forge(market_stream_fixtures.trade_str))
+
+    self.assertNotEqual(self.listener.error, None)
+    self.assertEqual(self.market_stream.verification_policy.verified_count, 2)
+    self.assertEqual(self.market_stream.verification_policy.skipped_count, 0)
+
+  def test_sampled_policy_verifies_every_nth_message(self):
+    self.create_market_stream(VerificationPolicy.sampled(2))
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(forge(market_stream_fixtures.trade_str))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertNotEqual(self.listener.trade, None)
+
+    self.market_stream.on_message(forge(market_stream_fixtures.quotes_str))
+
+    self.assertNotEqual(self.listener.error, None)
+    self.assertNotEqual(self.listener.quotes, None)
+    self.assertEqual(self.market_stream.verification_policy.verified_count, 2)
+    self.assertEqual(self.market_stream.verification_policy.skipped_count, 1)
+
+  def test_type_policy_verifies_only_given_types(self):
+    self.create_market_stream(VerificationPolicy.only_types('session_state', 'instrument_data'))
+
+    self.market_stream.on_message(forge(market_stream_fixtures.order_book_str))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(self.listener.order_book['instrument_id'], '71')
+
+    self.market_stream.on_message(forge(market_stream_fixtures.session_state_str))
+
+    self.assertNotEqual(self.listener.error, None)
+    self.assertEqual(self.market_stream.verification_policy.verified_count, 1)
+    self.assertEqual(self.market_stream.verification_policy.skipped_count, 1)
+
+  def test_deferred_policy_verifies_after_delivery(self):
+    scheduled = []
+    self.create_market_stream(
+      VerificationPolicy.deferred(lambda function, *args: scheduled.append((function, args)))
+    )
+
+    self.market_stream.on_message(forge(market_stream_fixtures.trade_str))
+
+    self.assertNotEqual(self.listener.trade, None)
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(len(scheduled), 1)
+
+    function, args = scheduled[0]
+    function(*args)
+
+    self.assertNotEqual(self.listener.error, None)
+    self.assertEqual(self.market_stream.verification_policy.verified_count, 1)
+
+  def test_optimistic_dispatch_retracts_forged_messages(self):
+    scheduled = []
+    self.create_market_stream(
+      VerificationPolicy.deferred(lambda function, *args: scheduled.append((function, args)))
+    )
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(forge(market_stream_fixtures.trade_str))
+    self.market_stream.on_message(forge(market_stream_fixtures.quotes_str))
+
+    self.assertEqual(self.listener.verification_failed, [])
+    for function, args in scheduled:
+      function(*args)
+
+    self.assertEqual(self.listener.verification_failed, [self.listener.trade, self.listener.quotes])
+    self.assertEqual(
+      str(self.listener.error).split(':')[0], 'Signature verification failed on message'
+    )
+
+  def test_optimistic_dispatch_retracts_messages_which_cannot_be_verified(self):
+    scheduled = []
+    self.create_market_stream(
+      VerificationPolicy.deferred(lambda function, *args: scheduled.append((function, args)))
+    )
+    message_wrapper = json.loads(market_stream_fixtures.session_state_str)
+    message_wrapper['data'] = message_wrapper['data'].replace('-----END PGP SIGNATURE-----', '')
+
+    self.market_stream.on_message(json.dumps(message_wrapper))
+    for function, args in scheduled:
+      function(*args)
+
+    self.assertEqual(self.listener.verification_failed, [self.listener.session_state])
+    self.assertNotEqual(self.listener.error, None)
+
+  def test_rejects_non_positive_sample_every(self):
+    with self.assertRaises(ValueError):
+      VerificationPolicy.sampled(0)
+
+
+class TestMarketStreamSubscriptions(TestCase):
+
+  def setUp(self):
+    self.exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.market_stream = MarketStream(self.exchange)
+
+  def test_delivers_messages_of_subscribed_instruments_only(self):
+    listener = TestListener()
+    self.market_stream.add_listener(listener, instrument_ids=['24'])
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+    self.market_stream.on_message(market_stream_fixtures.session_state_str)
+
+    self.assertEqual(listener.error, None)
+    self.assertEqual(listener.order_book, None)
+    self.assertEqual(listener.trade['instrument_id'], '24')
+    # not of any instrument
+    self.assertEqual(listener.session_state['state'], 'continuous')
+    self.assertEqual(self.market_stream.skipped_counts, {'message_type': 0, 'instrument': 1})
+
+  def test_delivers_messages_of_subscribed_types_only(self):
+    listener = TestListener()
+    self.market_stream.add_listener(listener, message_types=['trade'])
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+    self.market_stream.on_message(market_stream_fixtures.session_state_str)
+
+    self.assertEqual(listener.order_book, None)
+    self.assertEqual(listener.session_state, None)
+    self.assertEqual(listener.trade['instrument_id'], '24')
+    self.assertEqual(listener.message, listener.trade)
+    self.assertEqual(self.market_stream.skipped_counts, {'message_type': 2, 'instrument': 0})
+
+  def test_skips_messages_of_types_no_listener_implements(self):
+    class TradeListener(MarketStreamListener):
+      def __init__(self):
+        self.trades = []
+
+      def on_trade(self, trade):
+        self.trades.append(trade)
+    listener = TradeListener()
+    self.market_stream.add_listener(listener)
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.quotes_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+
+    self.assertEqual(len(listener.trades), 1)
+    self.assertEqual(self.market_stream.skipped_counts, {'message_type': 2, 'instrument': 0})
+    self.assertEqual(self.market_stream.skipped_undecoded_count, 2)
+
+  def test_does_not_skip_with_unscoped_on_message(self):
+    scoped, unscoped = TestListener(), TestListener()
+    self.market_stream.add_listener(scoped, instrument_ids=['24'])
+    self.market_stream.add_listener(unscoped)
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(scoped.order_book, None)
+    self.assertEqual(unscoped.order_book['instrument_id'], '71')
+    self.assertEqual(self.market_stream.skipped_counts, {'message_type': 0, 'instrument': 0})
+
+  def test_delivers_deltas_of_subscribed_instruments(self):
+    class DeltaListener(MarketStreamListener):
+      def __init__(self):
+        self.deltas = []
+
+      def on_order_book_delta(self, order_book_delta):
+        self.deltas.append(order_book_delta)
+    subscribed, other = DeltaListener(), DeltaListener()
+    self.market_stream.add_listener(subscribed, instrument_ids=['71'])
+    self.market_stream.add_listener(other, instrument_ids=['24'])
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual([delta['instrument_id'] for delta in subscribed.deltas], ['71'])
+    self.assertEqual(other.deltas, [])
+
+  def test_delivers_instrument_data_to_keep_tick_table(self):
+    tick_table = TickTable()
+    market_stream = MarketStream(self.exchange, tick_table=tick_table)
+    listener = TestListener()
+    market_stream.add_listener(listener, message_types=['order_book'])
+
+    market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(listener.error, None)
+    self.assertIn('71', tick_table)
+    self.assertEqual(listener.order_book['bids'], [[41667, 10]])
+
+  def test_skips_verification_of_skipped_messages_if_policy_allows(self):
+    market_stream = MarketStream(
+      self.exchange, verification_policy=VerificationPolicy.only_types('trade')
+    )
+    listener = TestListener()
+    market_stream.add_listener(listener, instrument_ids=['24'])
+
+    market_stream.on_message(forge(market_stream_fixtures.order_book_str))
+
+    self.assertEqual(listener.error, None)
+    self.assertEqual(market_stream.verification_policy.verified_count, 0)
+    self.assertEqual(market_stream.skipped_undecoded_count, 1)
+
+  def test_verifies_skipped_messages_with_full_policy(self):
+    listener = TestListener()
+    self.market_stream.add_listener(listener, instrument_ids=['24'])
+
+    self.market_stream.on_message(forge(market_stream_fixtures.order_book_str))
+
+    self.assertNotEqual(listener.error, None)
+    self.assertEqual(listener.order_book, None)
+    self.assertEqual(self.market_stream.skipped_undecoded_count, 1)
+
+
+class TestMarketStreamTicksMode(TestCase):
+
+  def setUp(self):
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = TestListener()
+    self.tick_table = TickTable()
+    self.market_stream = MarketStream(exchange, tick_table=self.tick_table)
+    self.market_stream.add_listener(self.listener)
+
+  def test_delivers_prices_in_ticks(self):
+    self.market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+
+    self.assertEqual(self.listener.error, None)
+    self.assertIn('71', self.tick_table)
+    self.assertEqual(self.listener.order_book, {
+      'type': 'order_book',
+      'instrument_id': '71',
+      'bids': [[41667, 10]],
+      'asks': [[42016, 10]],
+    })
+    self.assertEqual(self.listener.trade['price'], 41667)
+
+  def test_leaves_spot_data(self):
+    self.market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    self.market_stream.on_message(market_stream_fixtures.spot_data_str)
+
+    self.assertEqual(self.listener.spot_data['spot_data']['USD']['spot_index'], '0.00010408')
+
+  def test_receives_error_on_prices_before_instrument_data(self):
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertIsInstance(self.listener.error, ValueError)
+    self.assertEqual(self.listener.order_book, None)
+
+  def test_delivers_deltas_in_ticks(self):
+    class DeltaListener(MarketStreamListener):
+      def on_order_book_delta(self, order_book_delta):
+        self.changes = order_book_delta['changes']
+
+    listener = DeltaListener()
+    self.market_stream.add_listener(listener)
+    self.market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(listener.changes, [['bid', 41667, 0, 10], ['ask', 42016, 0, 10]])
+
+  def test_listeners_reading_prices_take_the_tick_table(self):
+    store = OrderBookStore(tick_table=self.tick_table)
+    top_of_book = TopOfBookCache(tick_table=self.tick_table)
+    option_chain = ConflatingListener(OptionChain(tick_table=self.tick_table))
+    for listener in [store, top_of_book, option_chain]:
+      self.market_stream.add_listener(listener)
+
+    self.market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(store.book('71').best_bid(), (41667, 10))
+    self.assertEqual(store.book('71').to_price(41667), Decimal('0.00041667'))
+    self.assertEqual(top_of_book.get('71')['bid'], 0.00041667)
+
+  def test_rejects_listeners_reading_decimal_strings(self):
+    listeners = [
+      OrderBookStore(), TopOfBookCache(), OptionChain(), OptionPricer(), ArbitrageScanner(),
+      TermStructure(), ConflatingListener(OrderBookStore()),
+    ]
+    for listener in listeners:
+      with self.assertRaises(ValueError):
+        self.market_stream.add_listener(listener)
+
+    self.market_stream.add_listener(ConflatingListener(TestListener()))
+
+  def test_listeners_reading_ticks_are_rejected_without_ticks_mode(self):
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+
+    with self.assertRaises(ValueError):
+      market_stream.add_listener(OrderBookStore(tick_table=self.tick_table))
+
+
+class TestMarketStreamTypedMessages(TestCase):
+
+  def setUp(self):
+    self.exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = TestListener()
+    self.market_stream = MarketStream(self.exchange, typed_messages=True)
+    self.market_stream.add_listener(self.listener)
+
+  def test_rejects_listeners_reading_dicts(self):
+    with self.assertRaises(ValueError):
+      self.market_stream.add_listener(TopOfBookCache())
+    with self.assertRaises(ValueError):
+      MarketStream(self.exchange, tick_table=TickTable(), typed_messages=True).add_listener(
+        OrderBookStore(tick_table=TickTable())
+      )
+
+  def test_delivers_typed_messages(self):
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.quotes_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(
+      self.listener.order_book,
+      OrderBook('71', [(Decimal('0.00041667'), 10)], [(Decimal('0.00042016'), 10)]),
+    )
+    self.assertIsInstance(self.listener.quotes, Quotes)
+    self.assertEqual(self.listener.quotes.bid, Decimal('0.00001503'))
+    self.assertEqual(self.listener.quotes.tap, None)
+    self.assertIsInstance(self.listener.trade, Trade)
+    self.assertEqual(self.listener.trade.price, Decimal('0.00041667'))
+    self.assertIs(self.listener.message, self.listener.trade)
+
+  def test_delivers_other_messages_as_dicts(self):
+    self.market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    self.market_stream.on_message(market_stream_fixtures.spot_data_str)
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(self.listener.instrument_data['type'], 'instrument_data')
+    self.assertEqual(self.listener.spot_data['spot_data']['USD']['spot_index'], '0.00010408')
+
+  def test_keeps_prices_in_ticks(self):
+    market_stream = MarketStream(self.exchange, tick_table=TickTable(), typed_messages=True)
+    market_stream.add_listener(self.listener)
+
+    market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(self.listener.order_book, OrderBook('71', [(41667, 10)], [(42016, 10)]))
+
+
 class TestListener(MarketStreamListener):
   def __init__(self):
     self.message = None
@@ -210,6 +575,7 @@ class TestListener(MarketStreamListener):
     self.disconnect_message = None
     self.ready = False
     self.spot_data = None
+    self.verification_failed = []
 
   def on_message(self, message):
     self.message = message
@@ -240,3 +606,38 @@ class TestListener(MarketStreamListener):
 
   def on_spot_data(self, spot_data):
     self.spot_data = spot_data
+
+  def on_verification_failed(self, message):
+    self.verification_failed.append(message)
+
+
+class TestMarketStreamFastVerification(TestMarketStream):
+
+  def setUp(self):
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = TestListener()
+    self.market_stream = MarketStream(exchange, fast_verification=True)
+    self.market_stream.add_listener(self.listener)
+
+
+class TestMarketStreamBufferMessages(TestMarketStream):
+  # messages are passed on as received from the WebSocket, decoded straight from the buffer
+
+  def setUp(self):
+    super(TestMarketStreamBufferMessages, self).setUp()
+    on_message = self.market_stream.on_message
+    self.market_stream.on_message = lambda message_str: on_message(
+      memoryview(message_str.encode('utf8'))
+    )
+
+
+class TestMarketStreamBufferMessagesJsonCodec(TestMarketStream):
+  # the json codec cannot decode buffers, so they are decoded to str first
+
+  def setUp(self):
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = TestListener()
+    self.market_stream = MarketStream(exchange, codec='json')
+    self.market_stream.add_listener(self.listener)
+    on_message = self.market_stream.on_message
+    self.market_stream.on_message = lambda message_str: on_message(message_str.encode('utf8'))
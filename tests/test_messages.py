@@ -0,0 +1,75 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from quedex_api.messages import AccountState, Message, OrderBook, OrderFilled, Quotes
+
+
+class TestMessages(TestCase):
+
+  def test_parses_decimals(self):
+    quotes = Quotes.from_dict({
+      'type': 'quotes', 'instrument_id': '71', 'last': '0.00041667', 'last_quantity': 1,
+      'bid': '0.00041660', 'bid_quantity': 10, 'ask': None, 'ask_quantity': 0, 'volume': 100,
+      'open_interest': 5, 'tap': None, 'lower_limit': None, 'upper_limit': None,
+    })
+
+    self.assertEqual(quotes.type, 'quotes')
+    self.assertEqual(quotes.instrument_id, '71')
+    self.assertEqual(quotes.last, Decimal('0.00041667'))
+    self.assertEqual(quotes.bid, Decimal('0.0004166'))
+    self.assertEqual(quotes.ask, None)
+    self.assertEqual(quotes.volume, 100)
+
+  def test_parses_fields_on_first_access(self):
+    data = {
+      'type': 'order_book', 'instrument_id': '71', 'bids': [['0.00041667', 10]], 'asks': [],
+    }
+    order_book = OrderBook.from_dict(data)
+
+    self.assertIs(order_book._bids, data['bids'])
+    self.assertEqual(order_book.bids, [(Decimal('0.00041667'), 10)])
+    self.assertIs(order_book.bids, order_book.bids)
+    # the decoded levels are not modified
+    self.assertEqual(data['bids'], [['0.00041667', 10]])
+
+  def test_keeps_ticks(self):
+    order_book = OrderBook.from_dict({
+      'type': 'order_book', 'instrument_id': '71', 'bids': [[41667, 10]], 'asks': [],
+    })
+
+    self.assertEqual(order_book.bids, [(41667, 10)])
+    self.assertEqual(order_book.asks, [])
+
+  def test_missing_fields_are_none(self):
+    account_state = AccountState.from_dict({'type': 'account_state', 'balance': '3.1416'})
+
+    self.assertEqual(account_state.balance, Decimal('3.1416'))
+    self.assertEqual(account_state.free_balance, None)
+
+  def test_base_is_abstract(self):
+    with self.assertRaises(TypeError):
+      Message()
+
+  def test_has_no_dict(self):
+    order_filled = OrderFilled('5', Decimal('0.0004'), 1, 0)
+
+    with self.assertRaises(AttributeError):
+      order_filled.price = 1
+
+  def test_converts_to_dict(self):
+    order_filled = OrderFilled.from_dict({
+      'type': 'order_filled', 'client_order_id': '5', 'trade_price': '0.0004', 'trade_quantity': 1,
+      'leaves_order_quantity': 0,
+    })
+
+    self.assertEqual(order_filled.to_dict(), {
+      'type': 'order_filled', 'client_order_id': '5', 'trade_price': Decimal('0.0004'),
+      'trade_quantity': 1, 'leaves_order_quantity': 0,
+    })
+    self.assertEqual(order_filled, OrderFilled('5', Decimal('0.0004'), 1, 0))
+    self.assertNotEqual(order_filled, OrderFilled('5', Decimal('0.0004'), 1, 1))
+    self.assertEqual(
+      repr(OrderFilled('5', None, 1, 0)),
+      "OrderFilled(client_order_id='5', trade_price=None, trade_quantity=1, "
+      "leaves_order_quantity=0)",
+    )
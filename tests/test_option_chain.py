@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+import numpy as np
+
+import market_stream_fixtures
+from market_stream_fixtures import load_instrument_data, quotes
+from quedex_api import Exchange, MarketStream, OptionChain, TickTable
+
+
+class TestOptionChain(TestCase):
+
+  def setUp(self):
+    self.option_chain = OptionChain()
+    self.option_chain.on_instrument_data(load_instrument_data())
+
+  def test_builds_chain_per_expiry_ordered_by_strike(self):
+    self.assertEqual(
+      self.option_chain.expirations('USD'),
+      [('USD', 1499990400000), ('USD', 1500595200000), ('USD', 1506643200000)],
+    )
+    chain = self.option_chain.chain('USD', 1499990400000)
+    self.assertEqual(len(chain), 11)
+    self.assertEqual(list(chain['strike']), sorted(chain['strike']))
+    self.assertTrue(np.isnan(chain['call_bid']).all())
+    self.assertEqual(chain['put_open_interest'].sum(), 0)
+    call_ids, put_ids = self.option_chain.instrument_ids('USD', 1499990400000)
+    self.assertEqual(
+      self.option_chain.registry[call_ids[3]].strike, self.option_chain.registry[put_ids[3]].strike
+    )
+    self.assertTrue(self.option_chain.registry[call_ids[3]].is_call)
+
+  def test_updates_cells_in_place(self):
+    chain = self.option_chain.chain('USD', 1499990400000)
+    call_ids, put_ids = self.option_chain.instrument_ids('USD', 1499990400000)
+
+    self.option_chain.on_quotes(quotes(call_ids[2], last='0.00000110', volume=3, open_interest=5))
+    self.option_chain.on_quotes(quotes(put_ids[2], bid=None, open_interest=7))
+
+    self.assertEqual(chain['call_bid'][2], 0.000001)
+    self.assertEqual(chain['call_ask'][2], 0.0000012)
+    self.assertEqual(chain['call_last'][2], 0.0000011)
+    self.assertEqual(chain['call_bid_quantity'][2], 10)
+    self.assertEqual(chain['call_volume'][2], 3)
+    self.assertEqual(chain['call_open_interest'][2], 5)
+    self.assertTrue(np.isnan(chain['put_bid'][2]))
+    self.assertEqual(chain['put_open_interest'][2], 7)
+    self.assertTrue(np.isnan(chain['call_bid'][[0, 1, 3]]).all())
+
+  def test_reads_prices_in_ticks(self):
+    tick_table = TickTable()
+    tick_table.on_instrument_data(load_instrument_data())
+    option_chain = OptionChain(tick_table=tick_table)
+    option_chain.on_instrument_data(load_instrument_data())
+    call_ids, _ = option_chain.instrument_ids('USD', 1499990400000)
+
+    option_chain.on_quotes(quotes(call_ids[2], bid=100, ask=120, last=None))
+
+    chain = option_chain.chain('USD', 1499990400000)
+    self.assertEqual(chain['call_bid'][2], 0.000001)
+    self.assertEqual(chain['call_ask'][2], 0.0000012)
+    self.assertTrue(np.isnan(chain['call_last'][2]))
+
+  def test_chain_is_a_read_only_view(self):
+    chain = self.option_chain.chain('USD', 1499990400000)
+
+    self.assertIs(self.option_chain.chain('USD', 1499990400000), chain)
+    self.assertIsNotNone(chain.base)
+    with self.assertRaises(ValueError):
+      chain['call_bid'][0] = 1
+
+  def test_ignores_quotes_of_other_instruments(self):
+    self.option_chain.on_quotes(quotes('24'))
+    self.option_chain.on_quotes(quotes('1000'))
+
+    for expiry in self.option_chain.expirations():
+      self.assertTrue(np.isnan(self.option_chain.chain(*expiry)['call_bid']).all())
+
+  def test_keeps_quotes_when_instruments_change(self):
+    call_ids, put_ids = self.option_chain.instrument_ids('USD', 1499990400000)
+    self.option_chain.on_quotes(quotes(call_ids[2]))
+    instrument_data = load_instrument_data()
+    del instrument_data['data'][put_ids[0]]
+    del instrument_data['data'][call_ids[0]]
+
+    self.option_chain.on_instrument_data(instrument_data)
+
+    chain = self.option_chain.chain('USD', 1499990400000)
+    self.assertEqual(len(chain), 10)
+    self.assertEqual(chain['call_bid'][1], 0.000001)
+
+  def test_receives_instrument_data_from_market_stream(self):
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+    option_chain = OptionChain()
+    market_stream.add_listener(option_chain)
+
+    market_stream.on_message(market_stream_fixtures.instrument_data_str)
+
+    self.assertEqual(len(option_chain.expirations()), 3)
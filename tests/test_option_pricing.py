@@ -0,0 +1,190 @@
+from unittest import TestCase
+import math
+
+import numpy as np
+
+from market_stream_fixtures import load_instrument_data, quotes
+from quedex_api import InstrumentRegistry, OptionPricer
+from quedex_api.option_pricing import MILLIS_PER_YEAR, black_scholes, implied_volatility, norm_cdf
+
+
+class TestBlackScholes(TestCase):
+
+  def test_norm_cdf(self):
+    for x in np.linspace(-6, 6, 121):
+      self.assertAlmostEqual(float(norm_cdf(x)), 0.5 * math.erfc(-x / math.sqrt(2)), delta=1e-7)
+
+  def test_prices_known_values(self):
+    price, delta, _, _, _ = black_scholes(100, 100, 1.0, 0.2, True, rate=0.05)
+    self.assertAlmostEqual(float(price), 10.4506, places=3)
+    self.assertAlmostEqual(float(delta), 0.6368, places=3)
+
+    price, delta, _, _, _ = black_scholes(100, 100, 1.0, 0.2, False, rate=0.05)
+    self.assertAlmostEqual(float(price), 5.5735, places=3)
+    self.assertAlmostEqual(float(delta), -0.3632, places=3)
+
+  def test_greeks_match_finite_differences(self):
+    strikes = np.array([80.0, 100.0, 120.0])
+    for is_call in [True, False]:
+      price, delta, gamma, vega, theta = black_scholes(100, strikes, 0.5, 0.3, is_call, rate=0.02)
+      h = 1e-3
+      up = black_scholes(100 + h, strikes, 0.5, 0.3, is_call, rate=0.02)
+      down = black_scholes(100 - h, strikes, 0.5, 0.3, is_call, rate=0.02)
+      np.testing.assert_allclose(delta, (up[0] - down[0]) / (2 * h), atol=1e-5)
+      np.testing.assert_allclose(gamma, (up[0] - 2 * price + down[0]) / (h * h), atol=1e-3)
+      vol_up = black_scholes(100, strikes, 0.5, 0.3 + h, is_call, rate=0.02)[0]
+      vol_down = black_scholes(100, strikes, 0.5, 0.3 - h, is_call, rate=0.02)[0]
+      # the error of the approximation of the normal distribution is amplified by 1 / h
+      np.testing.assert_allclose(vega, (vol_up - vol_down) / (2 * h), atol=1e-3)
+      later = black_scholes(100, strikes, 0.5 - h, 0.3, is_call, rate=0.02)[0]
+      earlier = black_scholes(100, strikes, 0.5 + h, 0.3, is_call, rate=0.02)[0]
+      np.testing.assert_allclose(theta, (later - earlier) / (2 * h), atol=1e-3)
+
+  def test_implied_volatility_inverts_prices(self):
+    spot = 0.0001
+    strikes = spot * np.array([0.7, 0.9, 1.0, 1.1, 1.5])
+    volatilities = np.array([0.4, 0.9, 1.2, 0.6, 2.5])
+    for is_call in [True, False]:
+      prices = black_scholes(spot, strikes, 0.1, volatilities, is_call)[0]
+      np.testing.assert_allclose(
+        implied_volatility(prices, spot, strikes, 0.1, is_call), volatilities, rtol=1e-6
+      )
+
+  def test_implied_volatility_of_prices_out_of_bounds(self):
+    result = implied_volatility([np.nan, 0.0, 150.0, 25.0], 100, 80, 0.5, True)
+
+    self.assertTrue(np.isnan(result[:3]).all())
+    self.assertFalse(np.isnan(result[3]))
+
+  def test_implied_volatility_keeps_shape_and_starting_points(self):
+    spot = 0.0001
+    strikes = spot * np.array([[0.7, 0.9, 1.0], [1.1, 1.5, 1.0]])
+    volatilities = np.array([[0.4, 0.9, 1.2], [0.6, 2.5, 1.2]])
+    prices = black_scholes(spot, strikes, 0.1, volatilities, True)[0]
+    prices[1, 2] = np.nan
+
+    for initial_volatilities in [None, volatilities * 1.01, np.full((2, 3), np.nan)]:
+      result = implied_volatility(
+        prices, spot, strikes, 0.1, True, initial_volatilities=initial_volatilities
+      )
+      self.assertEqual(result.shape, (2, 3))
+      np.testing.assert_allclose(result[:, :2], volatilities[:, :2], rtol=1e-6)
+      self.assertAlmostEqual(result[0, 2], 1.2, places=6)
+      self.assertTrue(np.isnan(result[1, 2]))
+    self.assertTrue(np.isnan(implied_volatility([np.nan, np.nan], 100, 80, 0.5, True)).all())
+
+
+class TestOptionPricer(TestCase):
+
+  def setUp(self):
+    self.instrument_data = load_instrument_data()
+    self.now = 1499990400000 - 0.05 * MILLIS_PER_YEAR
+    self.pricer = OptionPricer(clock=lambda: self.now)
+    self.pricer.on_instrument_data(self.instrument_data)
+    # close to the strikes of the instruments in the fixture
+    self.spot = 0.0004
+    self.pricer.on_spot_data(
+      {'type': 'spot_data', 'spot_data': {'USD': {'spot_index': '0.00040000'}}}
+    )
+
+  def test_builds_expiries_ordered_by_strike(self):
+    self.assertEqual(
+      self.pricer.expirations(),
+      [('USD', 1499990400000), ('USD', 1500595200000), ('USD', 1506643200000)],
+    )
+    results = self.pricer.results('USD', 1499990400000)
+    self.assertEqual(len(results), 22)
+    self.assertEqual(list(results['strike']), sorted(results['strike']))
+    self.assertEqual(list(results['is_call'][:2]), [True, False])
+    instrument_ids = self.pricer.instrument_ids('USD', 1499990400000)
+    self.assertEqual(
+      self.pricer.registry[instrument_ids[0]].strike, self.pricer.registry[instrument_ids[1]].strike
+    )
+
+  def test_prices_quoted_options_at_implied_volatility(self):
+    instrument_ids = self.pricer.instrument_ids('USD', 1499990400000)
+    strikes = self.pricer.results('USD', 1499990400000)['strike']
+    expected = black_scholes(self.spot, strikes[0], 0.05, 0.8, True)[0]
+    self.pricer.on_quotes(
+      quotes(instrument_ids[0], '%.10f' % (expected * 0.99), '%.10f' % (expected * 1.01))
+    )
+
+    results = self.pricer.results('USD', 1499990400000)
+    self.assertAlmostEqual(results['implied_volatility'][0], 0.8, places=5)
+    self.assertAlmostEqual(results['price'][0], results['mid'][0], places=12)
+    self.assertTrue(0 < results['delta'][0] < 1)
+    self.assertTrue(np.isnan(results['implied_volatility'][1:]).all())
+
+  def test_prices_all_options_at_set_volatility(self):
+    self.pricer.set_volatility(0.8, expiration_date=1499990400000)
+
+    results = self.pricer.results('USD', 1499990400000)
+    expected = black_scholes(self.spot, results['strike'], 0.05, 0.8, results['is_call'])
+    np.testing.assert_allclose(results['price'], expected[0])
+    np.testing.assert_allclose(results['delta'], expected[1])
+    np.testing.assert_allclose(results['vega'], expected[3])
+    self.assertTrue(np.isnan(self.pricer.results('USD', 1500595200000)['price']).all())
+
+  def test_recomputes_only_dirty_expiries(self):
+    self.assertEqual(len(self.pricer.refresh()), 3)
+    instrument_ids = self.pricer.instrument_ids('USD', 1500595200000)
+
+    self.pricer.on_quotes(quotes(instrument_ids[0], '0.00000100', '0.00000120'))
+    self.assertEqual(self.pricer.refresh(), [('USD', 1500595200000)])
+    self.pricer.on_quotes(quotes(instrument_ids[0], '0.00000100', '0.00000120'))
+    self.pricer.on_quotes(quotes('1000', '0.00000100', '0.00000120'))
+    self.assertEqual(self.pricer.refresh(), [])
+
+    self.pricer.results('USD', 1500595200000)
+    self.assertEqual(self.pricer.recomputed_count, 4)
+    self.pricer.on_spot_data(
+      {'type': 'spot_data', 'spot_data': {'USD': {'spot_index': '0.00041000'}}}
+    )
+    self.assertEqual(len(self.pricer.refresh()), 3)
+
+  def test_recomputes_only_quoted_options_of_clean_expiries(self):
+    self.pricer.set_volatility(0.5)
+    self.pricer.refresh()
+    instrument_ids = self.pricer.instrument_ids('USD', 1499990400000)
+    strikes = self.pricer.results('USD', 1499990400000)['strike']
+    self.now += 0.01 * MILLIS_PER_YEAR
+
+    self.pricer.on_quotes(quotes(instrument_ids[0], '0.00000100', '0.00000120'))
+    self.pricer.set_volatility(0.6, expiration_date=1500595200000)
+    self.assertEqual(self.pricer.refresh(), [('USD', 1499990400000), ('USD', 1500595200000)])
+
+    # times to expiration are taken at the recomputation of each option
+    results = self.pricer.results('USD', 1499990400000)
+    self.assertAlmostEqual(
+      results['price'][0], black_scholes(self.spot, strikes[0], 0.04, 0.5, True)[0], places=12
+    )
+    self.assertAlmostEqual(
+      results['price'][2], black_scholes(self.spot, strikes[2], 0.05, 0.5, True)[0], places=12
+    )
+
+  def test_results_are_read_only(self):
+    with self.assertRaises(ValueError):
+      self.pricer.results('USD', 1499990400000)['price'][0] = 1
+
+  def test_keeps_quotes_when_instruments_change(self):
+    instrument_ids = self.pricer.instrument_ids('USD', 1499990400000)
+    self.pricer.on_quotes(quotes(instrument_ids[0], '0.00000100', '0.00000120'))
+    instrument_data = load_instrument_data()
+    del instrument_data['data'][instrument_ids[1]]
+
+    self.pricer.on_instrument_data(instrument_data)
+
+    results = self.pricer.results('USD', 1499990400000)
+    self.assertEqual(len(results), 21)
+    self.assertAlmostEqual(results['mid'][0], 0.0000011)
+
+  def test_shares_registry(self):
+    registry = InstrumentRegistry()
+    pricer = OptionPricer(registry=registry)
+    registry.on_instrument_data(self.instrument_data)
+
+    pricer.on_instrument_data(self.instrument_data)
+
+    self.assertIs(pricer.registry, registry)
+    self.assertEqual(registry.version, 1)
+    self.assertEqual(len(pricer.expirations()), 3)
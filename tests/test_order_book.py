@@ -0,0 +1,217 @@
+from unittest import TestCase
+from decimal import Decimal
+
+import market_stream_fixtures
+from market_stream_fixtures import order_book
+from quedex_api import Exchange, MarketStream, OrderBookStore
+from test_market_stream import TestListener
+
+
+def instrument_data(*instrument_ids):
+  return {
+    'type': 'instrument_data',
+    'data': dict((instrument_id, {'instrument_id': instrument_id, 'tick_size': '0.00000001'})
+                 for instrument_id in instrument_ids),
+  }
+
+
+class TestOrderBookStore(TestCase):
+
+  def setUp(self):
+    self.store = OrderBookStore(capacity=2)
+    self.store.on_instrument_data(instrument_data('71', '72'))
+
+  def test_keeps_book_in_ticks(self):
+    self.store.on_order_book(order_book(
+      '71', [['0.00041667', 10], ['0.00041660', 5]], [['0.00042016', 7]]
+    ))
+
+    book = self.store.book('71')
+    self.assertEqual(book.best_bid(), (41667, 10))
+    self.assertEqual(book.best_ask(), (42016, 7))
+    self.assertEqual(book.spread(), 349)
+    self.assertEqual(list(book.bid_prices), [41667, 41660])
+    self.assertEqual(list(book.bid_quantities), [10, 5])
+    self.assertEqual(list(book.ask_prices), [42016])
+    self.assertEqual(book.to_price(book.best_bid()[0]), Decimal('0.00041667'))
+    self.assertEqual(book.tick_size, Decimal('0.00000001'))
+
+  def test_replaces_book_on_update(self):
+    self.store.on_order_book(order_book('71', [['0.00041667', 10], ['0.00041660', 5]], []))
+    self.store.on_order_book(order_book('71', [['0.00041600', 3]], [['0.00042016', 7]]))
+
+    book = self.store.book('71')
+    self.assertEqual(list(book.bid_prices), [41600])
+    self.assertEqual(book.bid_levels, 1)
+    self.assertEqual(book.ask_levels, 1)
+    self.assertEqual(book.updates, 2)
+
+  def test_queries_follow_updates(self):
+    self.store.on_order_book(order_book('71', [['0.00041667', 10], ['0.00041660', 5]], []))
+    book = self.store.book('71')
+    bid_prices = book.bid_prices
+    self.assertEqual((book.best_bid(), book.bid_depth(), book.bid_depth(1)), ((41667, 10), 15, 10))
+
+    self.store.on_order_book(order_book('71', [['0.00041600', 3]], [['0.00041700', 1]]))
+
+    self.assertIs(book.bid_prices, book.bid_prices)
+    self.assertIsNot(book.bid_prices, bid_prices)
+    self.assertEqual(list(book.bid_prices), [41600])
+    self.assertEqual((book.best_bid(), book.bid_depth(), book.bid_depth(2)), ((41600, 3), 3, 3))
+    self.assertEqual(book.spread(), 100)
+    self.assertEqual(book.ask_depth(0), 0)
+
+  def test_empty_sides(self):
+    self.store.on_order_book(order_book('71', [], []))
+
+    book = self.store.book('71')
+    self.assertIsNone(book.best_bid())
+    self.assertIsNone(book.best_ask())
+    self.assertIsNone(book.spread())
+    self.assertEqual(book.bid_depth(), 0)
+    self.assertEqual(book.ask_quantity_at(42016), 0)
+
+  def test_grows_beyond_capacity(self):
+    asks = [['0.000420%02d' % i, i + 1] for i in range(10)]
+    self.store.on_order_book(order_book('71', [], asks))
+
+    book = self.store.book('71')
+    self.assertEqual(list(book.ask_prices), [42000 + i for i in range(10)])
+    self.assertEqual(book.ask_depth(), 55)
+
+  def test_depth_queries(self):
+    self.store.on_order_book(order_book(
+      '71',
+      [['0.00000010', 1], ['0.00000009', 2], ['0.00000007', 4]],
+      [['0.00000011', 1], ['0.00000012', 2], ['0.00000014', 4]],
+    ))
+
+    book = self.store.book('71')
+    self.assertEqual(book.bid_depth(2), 3)
+    self.assertEqual(book.bid_depth(10), 7)
+    self.assertEqual(book.ask_depth(1), 1)
+    self.assertEqual(book.bid_quantity_at(7), 4)
+    self.assertEqual(book.bid_quantity_at(8), 0)
+    self.assertEqual(book.bid_quantity_at(11), 0)
+    self.assertEqual(book.ask_quantity_at(12), 2)
+    self.assertEqual(book.ask_quantity_at(13), 0)
+    self.assertEqual(book.ask_quantity_at(15), 0)
+
+  def test_sorts_unordered_levels(self):
+    self.store.on_order_book(order_book(
+      '71', [['0.00000009', 2], ['0.00000010', 1]], [['0.00000012', 2], ['0.00000011', 1]]
+    ))
+
+    book = self.store.book('71')
+    self.assertEqual(list(book.bid_prices), [10, 9])
+    self.assertEqual(list(book.bid_quantities), [1, 2])
+    self.assertEqual(list(book.ask_prices), [11, 12])
+    self.assertEqual(list(book.ask_quantities), [1, 2])
+
+  def test_arrays_are_read_only(self):
+    self.store.on_order_book(order_book('71', [['0.00041667', 10]], []))
+
+    with self.assertRaises(ValueError):
+      self.store.book('71').bid_prices[0] = 1
+
+  def test_keeps_books_per_instrument(self):
+    self.store.on_order_book(order_book('71', [['0.00041667', 10]], []))
+    self.store.on_order_book(order_book('72', [['0.00041000', 1]], []))
+
+    self.assertEqual(self.store.book('71').best_bid(), (41667, 10))
+    self.assertEqual(self.store.book('72').best_bid(), (41000, 1))
+    self.assertIsNone(self.store.book('73'))
+    self.assertEqual(sorted(self.store.instrument_ids), ['71', '72'])
+    self.assertEqual(self.store.nbytes, 2 * 4 * 2 * 8)
+
+  def test_rejects_book_of_unknown_instrument(self):
+    with self.assertRaises(ValueError):
+      self.store.on_order_book(order_book('73', [], []))
+
+  def test_rebuilds_book_on_tick_size_change(self):
+    self.store.on_order_book(order_book('71', [['0.00041667', 10]], []))
+    data = instrument_data('71')
+    data['data']['71']['tick_size'] = '0.00000010'
+    self.store.on_instrument_data(data)
+
+    self.assertIsNone(self.store.book('71'))
+    self.store.on_order_book(order_book('71', [['0.00041660', 10]], []))
+    self.assertEqual(self.store.book('71').best_bid(), (4166, 10))
+
+  def test_receives_order_books_from_market_stream(self):
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+    listener = TestListener()
+    market_stream.add_listener(self.store)
+    market_stream.add_listener(listener)
+
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertIsNone(listener.error)
+    self.assertEqual(self.store.book('71').best_bid(), (41667, 10))
+    self.assertEqual(self.store.book('71').best_ask(), (42016, 10))
+
+
+class TestOrderBookSweeps(TestCase):
+
+  def setUp(self):
+    self.store = OrderBookStore()
+    self.store.on_instrument_data(instrument_data('71'))
+    self.store.on_order_book(order_book(
+      '71',
+      [['0.00000010', 1], ['0.00000009', 2], ['0.00000007', 4]],
+      [['0.00000011', 1], ['0.00000012', 2], ['0.00000014', 4]],
+    ))
+    self.book = self.store.book('71')
+
+  def test_vwap(self):
+    self.assertEqual(self.book.vwap('ask', 1), 11)
+    self.assertEqual(self.book.vwap('ask', 2), (11 + 12) / 2.0)
+    self.assertEqual(self.book.vwap('ask', 5), (11 + 2 * 12 + 2 * 14) / 5.0)
+    self.assertEqual(self.book.vwap('ask', 7), (11 + 2 * 12 + 4 * 14) / 7.0)
+    self.assertEqual(self.book.vwap('bid', 3), (10 + 2 * 9) / 3.0)
+    self.assertIsNone(self.book.vwap('ask', 8))
+
+  def test_sweep_price_and_price_impact(self):
+    self.assertEqual(self.book.sweep_price('ask', 3), 12)
+    self.assertEqual(self.book.sweep_price('bid', 4), 7)
+    self.assertEqual(self.book.price_impact('ask', 1), 0)
+    self.assertEqual(self.book.price_impact('ask', 5), (11 + 2 * 12 + 2 * 14) / 5.0 - 11)
+    self.assertEqual(self.book.price_impact('bid', 3), 10 - (10 + 2 * 9) / 3.0)
+    self.assertIsNone(self.book.sweep_price('bid', 8))
+    self.assertIsNone(self.book.price_impact('bid', 8))
+
+  def test_quantity_up_to(self):
+    self.assertEqual(self.book.quantity_up_to('ask', 10), 0)
+    self.assertEqual(self.book.quantity_up_to('ask', 11), 1)
+    self.assertEqual(self.book.quantity_up_to('ask', 13), 3)
+    self.assertEqual(self.book.quantity_up_to('ask', 100), 7)
+    self.assertEqual(self.book.quantity_up_to('bid', 11), 0)
+    self.assertEqual(self.book.quantity_up_to('bid', 9), 3)
+    self.assertEqual(self.book.quantity_up_to('bid', 1), 7)
+
+  def test_empty_side(self):
+    self.store.on_order_book(order_book('71', [], []))
+
+    self.assertIsNone(self.book.vwap('ask', 1))
+    self.assertEqual(self.book.quantity_up_to('bid', 1), 0)
+
+  def test_rebuilds_cumulative_arrays_only_when_levels_change(self):
+    self.book.vwap('ask', 1)
+    asks = self.book._cumulative['ask']
+    self.store.on_order_book(order_book(
+      '71',
+      [['0.00000010', 5]],
+      [['0.00000011', 1], ['0.00000012', 2], ['0.00000014', 4]],
+    ))
+
+    self.assertIs(self.book._cumulative['ask'], asks)
+    self.assertEqual(self.book.vwap('bid', 5), 10)
+    self.assertEqual(self.book.vwap('ask', 2), (11 + 12) / 2.0)
+
+  def test_rejects_invalid_arguments(self):
+    with self.assertRaises(ValueError):
+      self.book.vwap('buy', 1)
+    with self.assertRaises(ValueError):
+      self.book.vwap('ask', 0)
+    with self.assertRaises(ValueError):
+      self.book.quantity_up_to('sell', 1)
@@ -0,0 +1,175 @@
+from unittest import TestCase
+
+import market_stream_fixtures
+from market_stream_fixtures import order_book
+from quedex_api import (
+  Exchange, MarketStream, MarketStreamListener, OrderBookDiffer, VerificationPolicy,
+)
+from test_market_stream import forge
+
+
+class TestOrderBookDiffer(TestCase):
+
+  def setUp(self):
+    self.differ = OrderBookDiffer()
+
+  def test_first_book_yields_all_levels_as_added(self):
+    delta = self.differ.diff(
+      order_book('71', [['0.00041667', 10], ['0.00041660', 5]], [['0.00042016', 7]])
+    )
+
+    self.assertEqual(delta, {
+      'type': 'order_book_delta',
+      'instrument_id': '71',
+      'changes': [
+        ['bid', '0.00041667', 0, 10],
+        ['bid', '0.00041660', 0, 5],
+        ['ask', '0.00042016', 0, 7],
+      ],
+    })
+
+  def test_yields_only_changed_levels(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10], ['0.00041660', 5]], [['0.00042016', 7]]))
+
+    delta = self.differ.diff(
+      order_book('71', [['0.00041667', 10], ['0.00041660', 3]], [['0.00042016', 7]])
+    )
+
+    self.assertEqual(delta['changes'], [['bid', '0.00041660', 5, 3]])
+
+  def test_yields_added_and_removed_levels(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10]], [['0.00042016', 7], ['0.00042020', 1]]))
+
+    delta = self.differ.diff(
+      order_book('71', [['0.00041668', 2], ['0.00041667', 10]], [['0.00042020', 1]])
+    )
+
+    self.assertEqual(delta['changes'], [['bid', '0.00041668', 0, 2], ['ask', '0.00042016', 7, 0]])
+
+  def test_yields_none_if_nothing_changed(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10]], []))
+
+    self.assertIsNone(self.differ.diff(order_book('71', [['0.00041667', 10]], [])))
+
+  def test_same_price_on_both_sides_is_distinguished(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10]], []))
+
+    delta = self.differ.diff(order_book('71', [], [['0.00041667', 10]]))
+
+    self.assertEqual(delta['changes'], [['bid', '0.00041667', 10, 0], ['ask', '0.00041667', 0, 10]])
+
+  def test_keeps_books_per_instrument(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10]], []))
+
+    delta = self.differ.diff(order_book('72', [['0.00041667', 10]], []))
+
+    self.assertEqual(delta['instrument_id'], '72')
+    self.assertEqual(delta['changes'], [['bid', '0.00041667', 0, 10]])
+    self.assertEqual(len(self.differ), 2)
+
+  def test_reset_forgets_books(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10]], []))
+    self.differ.reset()
+
+    self.assertEqual(
+      self.differ.diff(order_book('71', [['0.00041667', 10]], []))['changes'],
+      [['bid', '0.00041667', 0, 10]],
+    )
+
+  def test_reset_forgets_books_of_given_instruments(self):
+    self.differ.diff(order_book('71', [['0.00041667', 10]], []))
+    self.differ.diff(order_book('72', [['0.00041667', 10]], []))
+    self.differ.reset(['71'])
+
+    self.assertEqual(self.differ.instrument_ids, ['72'])
+
+
+class DeltaListener(MarketStreamListener):
+  def __init__(self):
+    self.calls = []
+
+  def on_order_book(self, order_book):
+    self.calls.append(order_book)
+
+  def on_order_book_delta(self, order_book_delta):
+    self.calls.append(order_book_delta)
+
+
+class TestMarketStreamOrderBookDelta(TestCase):
+
+  def setUp(self):
+    self.market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+    self.listener = DeltaListener()
+
+  def test_delta_follows_order_book(self):
+    self.market_stream.add_listener(self.listener)
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(
+      [call['type'] for call in self.listener.calls],
+      ['order_book', 'order_book_delta', 'order_book'],
+    )
+    self.assertEqual(
+      self.listener.calls[1]['changes'],
+      [['bid', '0.00041667', 0, 10], ['ask', '0.00042016', 0, 10]],
+    )
+
+  def test_deltas_are_not_computed_without_listeners(self):
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(len(self.market_stream._order_book_differ), 0)
+
+  def test_books_are_forgotten_when_last_delta_listener_is_removed(self):
+    self.market_stream.add_listener(self.listener)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.remove_listener(self.listener)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    listener = DeltaListener()
+    self.market_stream.add_listener(listener)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(
+      listener.calls[1]['changes'], [['bid', '0.00041667', 0, 10], ['ask', '0.00042016', 0, 10]]
+    )
+
+  def test_books_are_forgotten_when_instrument_is_no_longer_subscribed(self):
+    self.market_stream.add_listener(self.listener, instrument_ids=['71'])
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.add_listener(DeltaListener(), instrument_ids=['24'])
+    self.market_stream.remove_listener(self.listener)
+    # skipped, the book of 71 may change meanwhile
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    listener = DeltaListener()
+    self.market_stream.add_listener(listener, instrument_ids=['71'])
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(self.market_stream._order_book_differ.instrument_ids, ['71'])
+    self.assertEqual(
+      listener.calls[1]['changes'],
+      [['bid', '0.00041667', 0, 10], ['ask', '0.00042016', 0, 10]],
+    )
+
+  def test_retracted_book_is_not_base_of_next_delta(self):
+    market_stream = MarketStream(
+      Exchange(market_stream_fixtures.public_key_str, 'apiurl'),
+      verification_policy=VerificationPolicy.deferred(
+        schedule=lambda function, *args: function(*args)
+      ),
+    )
+    market_stream.add_listener(self.listener)
+
+    market_stream.on_message(forge(market_stream_fixtures.order_book_str))
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(
+      [call['type'] for call in self.listener.calls],
+      ['order_book', 'order_book_delta', 'order_book', 'order_book_delta'],
+    )
+    self.assertEqual(
+      self.listener.calls[3]['changes'],
+      [['bid', '0.00041667', 0, 10], ['ask', '0.00042016', 0, 10]],
+    )
@@ -0,0 +1,238 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from quedex_api import OrderManager, TickTable
+from quedex_api.messages import OrderCancelled, OrderFilled, OrderPlaced
+
+
+def order_placed(client_order_id, limit_price, side='buy', quantity=10, instrument_id='76'):
+  return {
+    'type': 'order_placed', 'client_order_id': str(client_order_id), 'instrument_id': instrument_id,
+    'limit_price': limit_price, 'side': side, 'quantity': quantity,
+  }
+
+
+def order_filled(client_order_id, trade_quantity, leaves_order_quantity):
+  return {
+    'type': 'order_filled', 'client_order_id': str(client_order_id), 'trade_price': '0.0004',
+    'trade_quantity': trade_quantity, 'leaves_order_quantity': leaves_order_quantity,
+  }
+
+
+class TestOrderManager(TestCase):
+
+  def setUp(self):
+    self.order_manager = OrderManager()
+
+  def place(self, *orders):
+    for order in orders:
+      self.order_manager.on_order_placed(order)
+
+  def test_indexes_placed_orders(self):
+    self.place(
+      order_placed(1, '0.0004'), order_placed(2, '0.00041'), order_placed(3, '0.0004', quantity=5),
+      order_placed(4, '0.0005', side='sell'), order_placed(5, '0.0003', instrument_id='77'),
+    )
+
+    self.assertEqual(len(self.order_manager), 5)
+    self.assertIn(1, self.order_manager)
+    self.assertEqual(self.order_manager.get('2').price, Decimal('0.00041'))
+    self.assertEqual(
+      [order.client_order_id for order in self.order_manager.orders('76', 'buy')], ['1', '2', '3']
+    )
+    self.assertEqual(
+      [order.client_order_id for order in self.order_manager.orders('76')], ['1', '2', '3', '4']
+    )
+    self.assertEqual(self.order_manager.quantity('76', 'buy'), 25)
+    self.assertEqual(self.order_manager.quantity('76', 'sell'), 10)
+    self.assertEqual(self.order_manager.quantity('78', 'sell'), 0)
+    self.assertEqual(self.order_manager.best_price('76', 'buy'), Decimal('0.00041'))
+    self.assertEqual(self.order_manager.best_price('76', 'sell'), Decimal('0.0005'))
+    self.assertEqual(self.order_manager.best_price('77', 'sell'), None)
+    self.assertEqual(
+      self.order_manager.levels('76', 'buy'), [(Decimal('0.00041'), 10), (Decimal('0.0004'), 15)]
+    )
+    self.assertEqual(
+      [order.client_order_id for order in self.order_manager.orders_at('76', 'buy', '0.00040')],
+      ['1', '3'],
+    )
+    self.assertEqual(self.order_manager.quantity_at('76', 'buy', Decimal('0.0004')), 15)
+    self.assertEqual(self.order_manager.quantity_between('76', 'buy', '0.0004', '0.000405'), 15)
+    self.assertEqual(self.order_manager.quantity_between('76', 'buy', '0.0001', '0.001'), 25)
+
+  def test_applies_fills(self):
+    self.place(order_placed(1, '0.0004'), order_placed(2, '0.0004'))
+
+    self.order_manager.on_order_filled(order_filled(1, 4, 6))
+
+    self.assertEqual(self.order_manager.get(1).quantity, 6)
+    self.assertEqual(self.order_manager.get(1).filled_quantity, 4)
+    self.assertEqual(self.order_manager.quantity('76', 'buy'), 16)
+    self.assertEqual(self.order_manager.quantity_at('76', 'buy', '0.0004'), 16)
+
+    self.order_manager.on_order_filled(order_filled(1, 6, 0))
+    self.order_manager.on_order_filled(order_filled(2, 10, 0))
+
+    self.assertEqual(len(self.order_manager), 0)
+    self.assertEqual(self.order_manager.levels('76', 'buy'), [])
+    self.assertEqual(self.order_manager.best_price('76', 'buy'), None)
+
+  def test_ignores_fills_of_unknown_orders(self):
+    self.order_manager.on_order_filled(order_filled(1, 4, 6))
+
+    self.assertEqual(len(self.order_manager), 0)
+
+  def test_applies_modifications_of_sent_commands(self):
+    self.place(order_placed(1, '0.0004'), order_placed(2, '0.0004'))
+    self.order_manager.on_modify_order(
+      {'client_order_id': 1, 'new_price': '0.0005', 'new_quantity': 3}
+    )
+    self.order_manager.on_modify_order({'client_order_id': 2, 'new_quantity': 7})
+
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '2'})
+
+    self.assertEqual(
+      self.order_manager.levels('76', 'buy'), [(Decimal('0.0005'), 3), (Decimal('0.0004'), 7)]
+    )
+    self.assertEqual(self.order_manager.quantity('76', 'buy'), 10)
+
+  def test_settles_modifications_in_flight_in_order_of_sending(self):
+    self.place(order_placed(1, '0.0004'))
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_price': '0.0005'})
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_price': '0.0006'})
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_quantity': 4})
+
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+
+    self.assertEqual(self.order_manager.get(1).price, Decimal('0.0005'))
+
+    self.order_manager.on_order_modification_failed(
+      {'type': 'order_modification_failed', 'client_order_id': '1'}
+    )
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+
+    self.assertEqual(self.order_manager.levels('76', 'buy'), [(Decimal('0.0005'), 4)])
+
+  def test_discards_failed_modifications(self):
+    self.place(order_placed(1, '0.0004'))
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_price': '0.0005'})
+
+    self.order_manager.on_order_modification_failed(
+      {'type': 'order_modification_failed', 'client_order_id': '1'}
+    )
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+
+    self.assertEqual(self.order_manager.get(1).price, Decimal('0.0004'))
+
+  def test_settles_modification_matching_values_of_order_modified(self):
+    self.place(order_placed(1, '0.0004'))
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_price': '0.0005'})
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_price': '0.0006'})
+
+    self.order_manager.on_order_modified(
+      {'type': 'order_modified', 'client_order_id': '1', 'new_limit_price': '0.00060'}
+    )
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+
+    self.assertEqual(self.order_manager.get(1).price, Decimal('0.0005'))
+    self.assertFalse(self.order_manager.get(1).externally_modified)
+
+  def test_marks_orders_modified_by_unknown_commands(self):
+    self.place(order_placed(1, '0.0004'), order_placed(2, '0.0004'))
+    self.order_manager.on_modify_order({'client_order_id': 2, 'new_price': '0.0005'})
+
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+    self.order_manager.on_order_modified(
+      {'type': 'order_modified', 'client_order_id': '2', 'new_limit_price': '0.0003'}
+    )
+
+    self.assertTrue(self.order_manager.get(1).externally_modified)
+    self.assertEqual(self.order_manager.get(1).price, Decimal('0.0004'))
+    self.assertTrue(self.order_manager.get(2).externally_modified)
+    self.assertEqual(self.order_manager.get(2).price, Decimal('0.0003'))
+
+    # the own modification is still pending
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '2'})
+
+    self.assertEqual(self.order_manager.get(2).price, Decimal('0.0005'))
+
+  def test_marks_orders_whose_fills_do_not_add_up(self):
+    self.place(order_placed(1, '0.0004'), order_placed(2, '0.0004'))
+
+    self.order_manager.on_order_filled(order_filled(1, 4, 6))
+    self.order_manager.on_order_filled(order_filled(2, 4, 2))
+
+    self.assertFalse(self.order_manager.get(1).externally_modified)
+    self.assertTrue(self.order_manager.get(2).externally_modified)
+    self.assertEqual(self.order_manager.quantity('76', 'buy'), 8)
+
+    self.place(order_placed(2, '0.0004', quantity=2))
+
+    self.assertFalse(self.order_manager.get(2).externally_modified)
+
+  def test_forgets_cancelled_orders(self):
+    self.place(
+      order_placed(1, '0.0004'), order_placed(2, '0.0004'), order_placed(3, '0.0005', side='sell')
+    )
+
+    self.order_manager.on_order_cancelled({'type': 'order_cancelled', 'client_order_id': '1'})
+    self.order_manager.on_order_forcefully_cancelled(
+      {'type': 'order_forcefully_cancelled', 'client_order_id': '3', 'cause': 'liquidation'}
+    )
+
+    self.assertEqual([order.client_order_id for order in self.order_manager], ['2'])
+    self.assertEqual(self.order_manager.levels('76', 'sell'), [])
+
+    self.order_manager.on_all_orders_cancelled({})
+
+    self.assertEqual(len(self.order_manager), 0)
+
+  def test_rebuilds_from_welcome_pack(self):
+    self.place(order_placed(1, '0.0004'))
+
+    self.order_manager.on_ready()
+    self.order_manager.on_snapshot(
+      [order_placed(2, '0.0003'), order_placed(3, '0.0006', side='sell')], [], {}
+    )
+
+    self.assertNotIn(1, self.order_manager)
+    self.assertEqual(self.order_manager.levels('76', 'buy'), [(Decimal('0.0003'), 10)])
+    self.assertEqual(self.order_manager.levels('76', 'sell'), [(Decimal('0.0006'), 10)])
+
+  def test_accepts_typed_messages_in_ticks(self):
+    self.order_manager = OrderManager(tick_table=tick_table())
+    self.order_manager.on_order_placed(OrderPlaced('1', '76', 40000, 'buy', 10))
+    self.order_manager.on_order_placed(OrderPlaced('2', '76', 40001, 'buy', 10))
+    self.order_manager.on_order_filled(OrderFilled('1', 40000, 4, 6))
+    self.order_manager.on_order_cancelled(OrderCancelled('2'))
+
+    self.assertEqual(self.order_manager.levels('76', 'buy'), [(40000, 6)])
+    self.assertEqual(self.order_manager.quantity_between('76', 'buy', 39999, 40000), 6)
+
+  def test_keeps_prices_in_ticks_with_tick_table(self):
+    self.order_manager = OrderManager(tick_table=tick_table())
+    self.place(order_placed(1, 40000), order_placed(2, 40002))
+    # UserStream passes commands as sent, with new_price formatted to a decimal string
+    self.order_manager.on_modify_order({'client_order_id': 1, 'new_price': '0.00040001'})
+
+    self.order_manager.on_order_modified({'type': 'order_modified', 'client_order_id': '1'})
+
+    self.assertEqual(self.order_manager.levels('76', 'buy'), [(40002, 10), (40001, 10)])
+    self.assertEqual(self.order_manager.quantity_at('76', 'buy', '0.00040001'), 10)
+    self.assertEqual(self.order_manager.quantity_between('76', 'buy', 40001, '0.00040002'), 20)
+
+  def test_rejects_ticks_without_tick_table(self):
+    with self.assertRaises(ValueError):
+      self.place(order_placed(1, 40000))
+
+    self.place(order_placed(1, '0.0004'))
+
+    with self.assertRaises(ValueError):
+      self.order_manager.quantity_at('76', 'buy', 40000)
+
+
+def tick_table():
+  table = TickTable()
+  table.on_instrument_data({'data': {'76': {'instrument_id': '76', 'tick_size': '0.00000001'}}})
+  return table
@@ -0,0 +1,133 @@
+from unittest import TestCase
+import math
+
+import numpy as np
+
+import market_stream_fixtures
+from market_stream_fixtures import load_instrument_data, quotes
+from quedex_api import Exchange, MarketStream, TermStructure
+from quedex_api.option_pricing import MILLIS_PER_YEAR
+
+DAY = 24 * 3600 * 1000
+JUL17W2, JUL17W3, SEP17 = 1499990400000, 1500595200000, 1506643200000
+NOW = JUL17W2 - 10 * DAY
+
+
+def spot_data(spot_index):
+  return {'type': 'spot_data', 'spot_data': {'USD': {'spot_index': spot_index}}}
+
+
+class TestTermStructure(TestCase):
+
+  def setUp(self):
+    self.now = NOW
+    self.term_structure = TermStructure(clock=lambda: self.now)
+    self.term_structure.on_instrument_data(load_instrument_data())
+
+  def test_builds_curve_per_underlying_ordered_by_expiration(self):
+    self.assertEqual(self.term_structure.underlying_symbols, ['USD'])
+    self.assertEqual(self.term_structure.instrument_ids('USD'), ['24', '71', '47'])
+    curve = self.term_structure.curve('USD')
+    self.assertEqual(list(curve['expiration_date']), [JUL17W2, JUL17W3, SEP17])
+    self.assertTrue(np.isnan(curve['mid']).all())
+
+  def test_computes_basis_carry_and_implied_rate(self):
+    self.term_structure.on_spot_data(spot_data('0.00040000'))
+    self.term_structure.on_quotes(quotes('24', '0.00040090', '0.00040110'))
+
+    row = self.term_structure.get('24')
+    years = 10 * DAY / MILLIS_PER_YEAR
+    self.assertAlmostEqual(row['years'], years)
+    self.assertAlmostEqual(row['mid'], 0.000401)
+    self.assertAlmostEqual(row['basis'], 0.000001)
+    self.assertAlmostEqual(row['carry'], 0.0025 / years)
+    self.assertAlmostEqual(row['implied_rate'], math.log(0.000401 / 0.0004) / years)
+    self.assertTrue(np.isnan(self.term_structure.get('47')['mid']))
+
+  def test_recomputes_curve_on_spot_change(self):
+    self.term_structure.on_quotes(quotes('24', '0.00040090', '0.00040110'))
+    self.term_structure.on_quotes(quotes('47', '0.00040490', '0.00040510'))
+    self.assertTrue(np.isnan(self.term_structure.curve('USD')['basis']).all())
+
+    self.term_structure.on_spot_data(spot_data('0.00040000'))
+
+    curve = self.term_structure.curve('USD')
+    np.testing.assert_allclose(curve['basis'][[0, 2]], [0.000001, 0.000005])
+    self.assertTrue(np.isnan(curve['basis'][1]))
+    self.assertGreater(curve['implied_rate'][2], 0)
+
+  def test_updates_only_on_changed_quotes(self):
+    self.term_structure.on_spot_data(spot_data('0.00040000'))
+    self.term_structure.on_quotes(quotes('24', '0.00040090', '0.00040110'))
+    self.now += DAY
+
+    self.term_structure.on_quotes(quotes('24', '0.00040090', '0.00040110'))
+    self.term_structure.on_quotes(quotes('25', '0.00000090', '0.00000110'))
+    self.term_structure.on_quotes(quotes('1000', '0.00000090', '0.00000110'))
+    self.term_structure.on_spot_data(spot_data('0.00040000'))
+
+    self.assertAlmostEqual(self.term_structure.get('24')['years'], 10 * DAY / MILLIS_PER_YEAR)
+    self.term_structure.refresh()
+    self.assertAlmostEqual(self.term_structure.get('24')['years'], 9 * DAY / MILLIS_PER_YEAR)
+
+  def test_curve_is_a_read_only_view(self):
+    curve = self.term_structure.curve('USD')
+
+    self.term_structure.on_quotes(quotes('71', '0.00040090', '0.00040110'))
+
+    self.assertIs(self.term_structure.curve('USD'), curve)
+    self.assertAlmostEqual(curve['mid'][1], 0.000401)
+    with self.assertRaises(ValueError):
+      curve['mid'][0] = 1
+
+  def test_expired_futures_have_no_rates(self):
+    self.now = JUL17W2 + DAY
+    self.term_structure.on_spot_data(spot_data('0.00040000'))
+    self.term_structure.on_quotes(quotes('24', '0.00040090', '0.00040110'))
+
+    row = self.term_structure.get('24')
+    self.assertAlmostEqual(row['basis'], 0.000001)
+    self.assertTrue(np.isnan(row['carry']))
+    self.assertTrue(np.isnan(row['implied_rate']))
+
+  def test_interpolates_between_expirations(self):
+    self.assertTrue(np.isnan(self.term_structure.interpolate('USD', JUL17W3)))
+    self.term_structure.on_spot_data(spot_data('0.00040000'))
+    self.term_structure.on_quotes(quotes('24', '0.00040090', '0.00040110'))
+    self.term_structure.on_quotes(quotes('47', '0.00040490', '0.00040510'))
+    curve = self.term_structure.curve('USD')
+    first_rate, last_rate = curve['implied_rate'][0], curve['implied_rate'][2]
+
+    rates = self.term_structure.interpolate('USD', np.array([JUL17W2 - DAY, JUL17W3, SEP17 + DAY]))
+
+    weight = float(JUL17W3 - JUL17W2) / (SEP17 - JUL17W2)
+    np.testing.assert_allclose(
+      rates, [first_rate, first_rate + weight * (last_rate - first_rate), last_rate]
+    )
+    self.assertAlmostEqual(self.term_structure.forward_price('USD', SEP17), 0.000405)
+    np.testing.assert_allclose(
+      self.term_structure.interpolate('USD', [JUL17W2, SEP17], 'basis'), [0.000001, 0.000005]
+    )
+
+  def test_keeps_quotes_when_instruments_change(self):
+    self.term_structure.on_quotes(quotes('47', '0.00040490', '0.00040510'))
+    instrument_data = load_instrument_data()
+    del instrument_data['data']['24']
+
+    self.term_structure.on_instrument_data(instrument_data)
+
+    self.assertEqual(self.term_structure.instrument_ids('USD'), ['71', '47'])
+    self.assertAlmostEqual(self.term_structure.curve('USD')['mid'][1], 0.000405)
+    self.assertIsNone(self.term_structure.get('24'))
+
+  def test_receives_messages_from_market_stream(self):
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+    term_structure = TermStructure(clock=lambda: NOW)
+    market_stream.add_listener(term_structure)
+
+    market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    market_stream.on_message(market_stream_fixtures.spot_data_str)
+
+    term_structure.on_quotes(quotes('24', '0.00010418', '0.00010418'))
+    self.assertEqual(len(term_structure.curve('USD')), 3)
+    self.assertAlmostEqual(term_structure.get('24')['basis'], 0.0000001)
@@ -0,0 +1,126 @@
+from unittest import TestCase
+from decimal import Decimal
+
+from quedex_api import TickConverter, TickTable
+
+
+class TestTickConverter(TestCase):
+
+  def test_converts_prices_to_ticks(self):
+    tick_converter = TickConverter('0.00000001')
+
+    self.assertEqual(tick_converter.to_ticks('0.00041667'), 41667)
+    self.assertEqual(tick_converter.to_ticks('0.0004'), 40000)
+    self.assertEqual(tick_converter.to_ticks('12'), 1200000000)
+    self.assertEqual(tick_converter.to_ticks('-0.00000002'), -2)
+    self.assertEqual(tick_converter.to_ticks('4.1667E-4'), 41667)
+    self.assertEqual(tick_converter.to_ticks('0.000416670'), 41667)
+    self.assertEqual(tick_converter.to_ticks(Decimal('0.00041667')), 41667)
+
+  def test_converts_prices_to_ticks_of_any_size(self):
+    tick_converter = TickConverter('0.25')
+
+    self.assertEqual(tick_converter.to_ticks('2300.75'), 9203)
+    self.assertEqual(tick_converter.to_price(9203), Decimal('2300.75'))
+
+  def test_converts_ticks_to_prices(self):
+    tick_converter = TickConverter('0.00000001')
+
+    self.assertEqual(tick_converter.to_price(41667), Decimal('0.00041667'))
+    self.assertEqual(str(tick_converter.to_price(41667)), '0.00041667')
+
+  def test_converts_ticks_to_floats_of_the_prices(self):
+    self.assertEqual(TickConverter('0.00000001').to_float(41667), float('0.00041667'))
+    self.assertEqual(TickConverter('0.25').to_float(9203), 2300.75)
+
+  def test_rejects_prices_between_ticks(self):
+    with self.assertRaises(ValueError):
+      TickConverter('0.00000001').to_ticks('0.000416675')
+    with self.assertRaises(ValueError):
+      TickConverter('0.25').to_ticks('2300.1')
+
+  def test_rejects_malformed_prices(self):
+    for price_str in ['0.0004x667', 'abc', '']:
+      with self.assertRaises(ValueError) as context:
+        TickConverter('0.25').to_ticks(price_str)
+      self.assertIn(repr(price_str), str(context.exception))
+    with self.assertRaises(ValueError):
+      TickConverter('0.00000001').to_ticks('0.0004x667')
+
+  def test_rejects_non_positive_tick_size(self):
+    with self.assertRaises(ValueError):
+      TickConverter('0')
+
+  def test_formats_ticks_as_price_strings(self):
+    tick_converter = TickConverter('0.00000001')
+
+    self.assertEqual(tick_converter.to_price_str(41667), '0.00041667')
+    self.assertEqual(tick_converter.to_price_str(1200000000), '12.00000000')
+    self.assertEqual(tick_converter.to_price_str(0), '0.00000000')
+    self.assertEqual(TickConverter('0.25').to_price_str(9203), '2300.75')
+    self.assertEqual(TickConverter('1').to_price_str(15), '15')
+
+
+def instrument_data():
+  return {
+    'type': 'instrument_data',
+    'data': {
+      '24': {'instrument_id': '24', 'tick_size': '0.00000001'},
+      '25': {'instrument_id': '25', 'tick_size': '0.00000001'},
+      '26': {'instrument_id': '26', 'tick_size': '0.25'},
+    },
+  }
+
+
+class TestTickTable(TestCase):
+
+  def setUp(self):
+    self.tick_table = TickTable()
+    self.tick_table.convert(instrument_data())
+
+  def test_shares_converters_of_tick_size(self):
+    self.assertIs(self.tick_table.converter('24'), self.tick_table.converter('25'))
+    self.assertEqual(self.tick_table.converter('26').tick_size, Decimal('0.25'))
+    self.assertIn('26', self.tick_table)
+    self.assertNotIn('27', self.tick_table)
+
+  def test_converts_prices_of_order_book(self):
+    order_book = self.tick_table.convert({
+      'type': 'order_book', 'instrument_id': '26', 'bids': [['2300.75', 10], ['2300.5', 5]],
+      'asks': [['2301', 1]],
+    })
+
+    self.assertEqual(order_book['bids'], [[9203, 10], [9202, 5]])
+    self.assertEqual(order_book['asks'], [[9204, 1]])
+
+  def test_converts_prices_of_quotes_and_trade(self):
+    quotes = self.tick_table.convert({
+      'type': 'quotes', 'instrument_id': '24', 'last': '0.00041667', 'bid': '0.00041600',
+      'ask': None, 'bid_quantity': 10, 'tap': None, 'lower_limit': '0.0004', 'upper_limit': None,
+    })
+    trade = self.tick_table.convert(
+      {'type': 'trade', 'instrument_id': '24', 'price': '0.00041667', 'quantity': 1}
+    )
+
+    self.assertEqual(quotes, {
+      'type': 'quotes', 'instrument_id': '24', 'last': 41667, 'bid': 41600, 'ask': None,
+      'bid_quantity': 10, 'tap': None, 'lower_limit': 40000, 'upper_limit': None,
+    })
+    self.assertEqual(trade['price'], 41667)
+
+  def test_leaves_other_messages(self):
+    spot_data = {'type': 'spot_data', 'spot_data': {'USD': {'spot_index': '0.00010408'}}}
+
+    self.assertEqual(self.tick_table.convert(spot_data), {
+      'type': 'spot_data', 'spot_data': {'USD': {'spot_index': '0.00010408'}}
+    })
+
+  def test_rejects_prices_of_unknown_instruments(self):
+    with self.assertRaises(ValueError):
+      self.tick_table.convert({'type': 'trade', 'instrument_id': '27', 'price': '0.00041667'})
+    with self.assertRaises(ValueError):
+      self.tick_table.to_price_str('27', 41667)
+
+  def test_formats_prices_of_instruments(self):
+    self.assertEqual(self.tick_table.to_price_str('24', 41667), '0.00041667')
+    self.assertEqual(self.tick_table.to_ticks('26', '2300.75'), 9203)
@@ -0,0 +1,125 @@
+from unittest import TestCase
+import math
+
+import market_stream_fixtures
+from market_stream_fixtures import order_book, quotes
+from quedex_api import Exchange, MarketStream, TopOfBookCache
+
+
+class TestTopOfBookCache(TestCase):
+
+  def setUp(self):
+    self.cache = TopOfBookCache(capacity=1)
+
+  def test_computes_values_from_order_book(self):
+    self.cache.on_order_book(order_book('71', [['10', 1], ['9', 5]], [['12', 3]]))
+
+    row = self.cache.get('71')
+    self.assertEqual(row['bid'], 10)
+    self.assertEqual(row['ask'], 12)
+    self.assertEqual(row['bid_quantity'], 1)
+    self.assertEqual(row['ask_quantity'], 3)
+    self.assertEqual(row['mid'], 11)
+    self.assertEqual(row['spread'], 2)
+    self.assertEqual(row['microprice'], (10 * 3 + 12 * 1) / 4.0)
+    self.assertEqual(row['imbalance'], -0.5)
+    self.assertEqual(row['updates'], 1)
+
+  def test_imbalance_over_top_levels(self):
+    cache = TopOfBookCache(levels=2)
+    cache.on_order_book(order_book('71', [['10', 1], ['9', 5], ['8', 100]], [['12', 3]]))
+
+    row = cache.get('71')
+    self.assertEqual(row['bid_quantity'], 6)
+    self.assertEqual(row['imbalance'], 3 / 9.0)
+    self.assertEqual(row['microprice'], (10 * 3 + 12 * 1) / 4.0)
+
+  def test_skips_update_when_top_levels_do_not_change(self):
+    self.cache.on_order_book(order_book('71', [['10', 1], ['9', 5]], [['12', 3]]))
+    self.cache.on_order_book(order_book('71', [['10', 1], ['9', 7]], [['12', 3], ['13', 1]]))
+
+    self.assertEqual(self.cache.get('71')['updates'], 1)
+    self.assertEqual(self.cache.skipped_count, 1)
+
+  def test_empty_side(self):
+    self.cache.on_order_book(order_book('71', [['10', 1]], []))
+
+    row = self.cache.get('71')
+    self.assertEqual(row['bid'], 10)
+    self.assertTrue(math.isnan(row['ask']))
+    self.assertTrue(math.isnan(row['mid']))
+    self.assertEqual(row['imbalance'], 1)
+
+  def test_updates_from_quotes(self):
+    self.cache.on_quotes(quotes('71', '10', '12', bid_quantity=1, ask_quantity=3))
+
+    row = self.cache.get('71')
+    self.assertEqual(row['mid'], 11)
+    self.assertEqual(row['microprice'], 10.5)
+    self.assertEqual(row['imbalance'], -0.5)
+
+  def test_skips_quotes_with_unchanged_best_levels(self):
+    self.cache.on_order_book(order_book('71', [['10', 1], ['9', 5]], [['12', 3]]))
+    self.cache.on_quotes(quotes('71', '10', '12', bid_quantity=1, ask_quantity=3))
+
+    self.assertEqual(self.cache.get('71')['updates'], 1)
+    self.assertEqual(self.cache.skipped_count, 1)
+
+  def test_quotes_without_bids(self):
+    self.cache.on_quotes(quotes('71', None, '12', bid_quantity=None, ask_quantity=3))
+
+    row = self.cache.get('71')
+    self.assertTrue(math.isnan(row['bid']))
+    self.assertEqual(row['ask'], 12)
+
+  def test_quotes_update_depth_over_more_levels(self):
+    cache = TopOfBookCache(levels=2)
+    cache.on_order_book(order_book('71', [['10', 1], ['9', 5]], [['12', 3]]))
+    cache.on_quotes(quotes('71', '10', '11', bid_quantity=2, ask_quantity=3))
+
+    row = cache.get('71')
+    self.assertEqual(row['ask'], 11)
+    self.assertEqual(row['microprice'], (10 * 3 + 11 * 2) / 5.0)
+    self.assertEqual((row['bid_quantity'], row['ask_quantity']), (7, 6))
+    self.assertEqual(row['imbalance'], 1 / 13.0)
+    # the book is compared in full again after quotes
+    cache.on_order_book(order_book('71', [['10', 1], ['9', 5]], [['12', 3]]))
+    self.assertEqual(cache.get('71')['ask'], 12)
+
+  def test_quotes_crossing_levels_of_the_book(self):
+    cache = TopOfBookCache(levels=2)
+    cache.on_order_book(order_book('71', [['10', 1], ['9', 5], ['8', 4]], [['12', 3], ['13', 2]]))
+    cache.on_quotes(quotes('71', '9', '13', bid_quantity=2, ask_quantity=1))
+
+    row = cache.get('71')
+    self.assertEqual((row['bid_quantity'], row['ask_quantity']), (6, 1))
+    self.assertEqual(row['imbalance'], 5 / 7.0)
+
+  def test_snapshot_of_all_instruments(self):
+    self.cache.on_order_book(order_book('71', [['10', 1]], [['12', 1]]))
+    self.cache.on_order_book(order_book('72', [['20', 1]], [['24', 1]]))
+    self.cache.on_order_book(order_book('73', [['30', 1]], [['36', 1]]))
+
+    snapshot = self.cache.snapshot()
+    self.assertEqual(self.cache.instrument_ids, ['71', '72', '73'])
+    self.assertEqual(list(snapshot['mid']), [11, 22, 33])
+    self.assertEqual(list(snapshot['spread'] / snapshot['mid']), [2 / 11.0, 4 / 22.0, 6 / 33.0])
+    self.assertEqual(self.cache.index('72'), 1)
+    self.assertIsNone(self.cache.index('74'))
+    self.assertIsNone(self.cache.get('74'))
+
+  def test_snapshot_is_a_copy(self):
+    self.cache.on_order_book(order_book('71', [['10', 1]], [['12', 1]]))
+    snapshot = self.cache.snapshot()
+    self.cache.on_order_book(order_book('71', [['11', 1]], [['12', 1]]))
+
+    self.assertEqual(snapshot['bid'][0], 10)
+
+  def test_receives_messages_from_market_stream(self):
+    market_stream = MarketStream(Exchange(market_stream_fixtures.public_key_str, 'apiurl'))
+    market_stream.add_listener(self.cache)
+
+    market_stream.on_message(market_stream_fixtures.order_book_str)
+
+    self.assertEqual(self.cache.get('71')['bid'], 0.00041667)
+    self.assertEqual(self.cache.get('71')['ask'], 0.00042016)
@@ -1,9 +1,11 @@
 from unittest import TestCase
+from decimal import Decimal
 import json
 
 import pgpy
 
-from quedex_api import UserStream, UserStreamListener, Trader, Exchange
+from quedex_api import OrderManager, UserStream, UserStreamListener, Trader, Exchange, TickTable
+from quedex_api.messages import AccountState, OrderPlaced
 
 
 class TestUserStream(TestCase):
@@ -18,6 +20,7 @@ class TestUserStream(TestCase):
     trader = Trader('123456789', open('keys/trader-private-key.asc', 'r').read())
     trader.decrypt_private_key('aaa')
     exchange = Exchange(open('keys/quedex-public-key.asc', 'r').read(), 'wss://url')
+    self.exchange, self.trader = exchange, trader
     self.listener = TestListener()
     self.user_stream = UserStream(exchange, trader)
     self.user_stream.add_listener(self.listener)
@@ -66,6 +69,88 @@ class TestUserStream(TestCase):
     self.assertEqual(self.listener.account_state, account_state)
     self.assertEqual(self.listener.message, account_state)
 
+  def test_receiving_typed_account_state(self):
+    user_stream = UserStream(self.exchange, self.trader, typed_messages=True)
+    user_stream.add_listener(self.listener)
+
+    user_stream.on_message(self.serialize_to_trader([
+      {'type': 'account_state', 'balance': '3.1416', 'account_status': 'active'},
+      {'type': 'timer_added', 'timer_id': '7'},
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertIsInstance(self.listener.account_state, AccountState)
+    self.assertEqual(self.listener.account_state.balance, Decimal('3.1416'))
+    self.assertEqual(self.listener.account_state.account_status, 'active')
+    self.assertIs(self.listener.messages[0], self.listener.account_state)
+    self.assertEqual(self.listener.timer_added, {'type': 'timer_added', 'timer_id': '7'})
+
+  def test_receiving_entities_of_message_in_batch(self):
+    listener = BatchListener()
+    self.user_stream.add_listener(listener)
+    entities = [
+      {
+        'type': 'order_filled', 'client_order_id': '5', 'trade_price': '0.0004',
+        'trade_quantity': 1, 'leaves_order_quantity': 1,
+      },
+      {
+        'type': 'order_filled', 'client_order_id': '5', 'trade_price': '0.0004',
+        'trade_quantity': 1, 'leaves_order_quantity': 0,
+      },
+      {'type': 'account_state', 'balance': '3.1416'},
+    ]
+
+    self.user_stream.on_message(self.serialize_to_trader(entities))
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'account_state', 'balance': '3'},
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(listener.batches, [entities, [{'type': 'account_state', 'balance': '3'}]])
+    # other listeners still receive the entities one by one
+    self.assertEqual(self.listener.messages, entities + [{'type': 'account_state', 'balance': '3'}])
+
+  def test_receiving_snapshot_of_welcome_pack(self):
+    listener = BatchListener()
+    self.user_stream.add_listener(listener)
+    order_placed = {
+      'type': 'order_placed', 'client_order_id': '5', 'instrument_id': '76',
+      'limit_price': '0.0004', 'side': 'buy', 'quantity': 2,
+    }
+    open_position = {'type': 'open_position', 'instrument_id': '76', 'side': 'long', 'quantity': 3}
+    account_state = {'type': 'account_state', 'balance': '3.1416'}
+
+    self.user_stream.initialize()
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'last_nonce', 'last_nonce': 5, 'nonce_group': 5},
+    ]))
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'subscribed', 'nonce': 5, 'message_nonce_group': 5},
+      order_placed,
+      open_position,
+      account_state,
+    ]))
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'account_state', 'balance': '3'},
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertTrue(self.listener.ready)
+    self.assertEqual(self.listener.order_placed, order_placed)
+    self.assertEqual(listener.snapshots, [([order_placed], [open_position], account_state)])
+    self.assertEqual(listener.batches[0], [order_placed, open_position, account_state])
+
+  def test_receiving_snapshot_of_welcome_pack_in_separate_message(self):
+    listener = BatchListener()
+    self.user_stream.add_listener(listener)
+    self.initialize()
+
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'account_state', 'balance': '3.1416'},
+    ]))
+
+    self.assertEqual(listener.snapshots, [([], [], {'type': 'account_state', 'balance': '3.1416'})])
+
   def test_receiving_open_position(self):
     open_position = {'type': 'open_position', 'initial_margin': '2.5'}
     self.user_stream.on_message(self.serialize_to_trader([open_position]))
@@ -1348,6 +1433,250 @@ class TestUserStream(TestCase):
       'message_nonce_group': 5,
     }]))
 
+
+class TestUserStreamBufferMessages(TestUserStream):
+  # messages are passed on as bytes, as received from the WebSocket
+
+  def serialize_to_trader(self, entity):
+    return super(TestUserStreamBufferMessages, self).serialize_to_trader(entity).encode('utf8')
+
+
+class TestUserStreamTicksMode(TestCase):
+
+  def setUp(self):
+    self.quedex_private_key = pgpy.PGPKey()
+    self.quedex_private_key.parse(open('keys/quedex-private-key.asc', 'r').read())
+    self.trader_public_key = pgpy.PGPKey()
+    self.trader_public_key.parse(open('keys/trader-public-key.asc', 'r').read())
+
+    trader = Trader('123456789', open('keys/trader-private-key.asc', 'r').read())
+    trader.decrypt_private_key('aaa')
+    exchange = Exchange(open('keys/quedex-public-key.asc', 'r').read(), 'wss://url')
+    self.exchange, self.trader = exchange, trader
+    self.listener = TestListener()
+    self.tick_table = tick_table = TickTable()
+    tick_table.on_instrument_data({'data': {
+      '76': {'instrument_id': '76', 'tick_size': '0.00000001'},
+      '77': {'instrument_id': '77', 'tick_size': '0.5'},
+    }})
+    self.user_stream = UserStream(exchange, trader, tick_table=tick_table)
+    self.user_stream.add_listener(self.listener)
+
+    self.sent_message = None
+    def set_sent_message(message):
+      self.sent_message = message
+    self.user_stream.send_message = set_sent_message
+    self.user_stream.initialize()
+    self.user_stream.on_message(self.serialize_to_trader([{
+      'type': 'last_nonce',
+      'last_nonce': 5,
+      'nonce_group': 5,
+    }]))
+    self.user_stream.on_message(self.serialize_to_trader([{
+      'type': 'subscribed',
+      'nonce': 5,
+      'message_nonce_group': 5,
+    }]))
+
+  def test_formats_limit_price_from_ticks(self):
+    self.user_stream.place_order({
+      'client_order_id': 15,
+      'instrument_id': '76',
+      'quantity': 6,
+      'side': 'buy',
+      'order_type': 'limit',
+      'limit_price': 45000,
+    })
+
+    self.assertEqual(self.decrypt_from_trader(self.sent_message)['limit_price'], '0.00045000')
+
+  def test_accepts_decimal_strings(self):
+    self.user_stream.place_order({
+      'client_order_id': 15,
+      'instrument_id': '76',
+      'quantity': 6,
+      'side': 'buy',
+      'order_type': 'limit',
+      'limit_price': '0.00045',
+    })
+
+    self.assertEqual(self.decrypt_from_trader(self.sent_message)['limit_price'], '0.00045')
+
+  def test_rejects_non_positive_ticks(self):
+    with self.assertRaises(ValueError):
+      self.user_stream.place_order({
+        'client_order_id': 15,
+        'instrument_id': '76',
+        'quantity': 6,
+        'side': 'buy',
+        'order_type': 'limit',
+        'limit_price': 0,
+      })
+
+  def test_formats_new_price_of_known_order_from_ticks(self):
+    self.user_stream.on_message(self.serialize_to_trader([
+      {
+        'type': 'order_placed', 'client_order_id': '16', 'instrument_id': '77',
+        'limit_price': '2300.5', 'side': 'buy', 'quantity': 1,
+      },
+    ]))
+
+    self.user_stream.modify_order({'client_order_id': 16, 'new_price': 4603})
+
+    self.assertEqual(self.decrypt_from_trader(self.sent_message)['new_price'], '2301.5')
+
+  def test_rejects_new_price_in_ticks_of_unknown_order(self):
+    with self.assertRaises(ValueError):
+      self.user_stream.modify_order({'client_order_id': 16, 'new_price': 4603})
+
+  def test_formats_prices_in_batch(self):
+    self.user_stream.batch([
+      {
+        'type': 'place_order', 'client_order_id': 15, 'instrument_id': '76', 'quantity': 6,
+        'side': 'buy', 'order_type': 'limit', 'limit_price': 45000,
+      },
+      {'type': 'modify_order', 'client_order_id': 15, 'new_price': 45001},
+    ])
+
+    batch = self.decrypt_from_trader(self.sent_message)['batch']
+    self.assertEqual(batch[0]['limit_price'], '0.00045000')
+    self.assertEqual(batch[1]['new_price'], '0.00045001')
+
+  def test_delivers_prices_in_ticks(self):
+    self.user_stream.on_message(self.serialize_to_trader([
+      {
+        'type': 'order_placed', 'client_order_id': '16', 'instrument_id': '77',
+        'limit_price': '2300.5', 'side': 'buy', 'quantity': 2,
+      },
+      {
+        'type': 'order_filled', 'client_order_id': '16', 'trade_price': '2300', 'trade_quantity': 1,
+        'leaves_order_quantity': 1,
+      },
+      {'type': 'open_position', 'instrument_id': '77', 'average_opening_price': '2300.1'},
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(self.listener.order_placed['limit_price'], 4601)
+    self.assertEqual(self.listener.order_filled['trade_price'], 4600)
+    self.assertEqual(self.listener.open_position['average_opening_price'], '2300.1')
+
+  def test_reports_fill_of_unknown_order_instead_of_delivering_decimal_price(self):
+    self.user_stream.on_message(self.serialize_to_trader([
+      {
+        'type': 'order_filled', 'client_order_id': '16', 'trade_price': '2300', 'trade_quantity': 1,
+        'leaves_order_quantity': 1,
+      },
+      {'type': 'open_position', 'instrument_id': '77', 'average_opening_price': '2300.1'},
+    ]))
+
+    self.assertEqual(self.listener.order_filled, None)
+    self.assertIsInstance(self.listener.error, ValueError)
+    self.assertNotEqual(self.listener.open_position, None)
+
+  def test_rejects_boolean_limit_price(self):
+    with self.assertRaises(TypeError):
+      self.user_stream.place_order({
+        'client_order_id': 15,
+        'instrument_id': '76',
+        'quantity': 6,
+        'side': 'buy',
+        'order_type': 'limit',
+        'limit_price': True,
+      })
+
+  def test_forgets_orders_which_are_done(self):
+    self.user_stream.on_message(self.serialize_to_trader([
+      {
+        'type': 'order_placed', 'client_order_id': '16', 'instrument_id': '77',
+        'limit_price': '2300.5', 'side': 'buy', 'quantity': 1,
+      },
+      {
+        'type': 'order_filled', 'client_order_id': '16', 'trade_price': '2300', 'trade_quantity': 1,
+        'leaves_order_quantity': 0,
+      },
+    ]))
+
+    with self.assertRaises(ValueError):
+      self.user_stream.modify_order({'client_order_id': 16, 'new_price': 4603})
+
+  def test_passes_sent_modifications_to_order_manager(self):
+    order_manager = OrderManager(tick_table=self.tick_table)
+    self.user_stream.add_listener(order_manager)
+    self.user_stream.on_message(self.serialize_to_trader([{
+      'type': 'order_placed', 'client_order_id': '16', 'instrument_id': '77',
+      'limit_price': '2300.5', 'side': 'buy', 'quantity': 2,
+    }]))
+
+    self.user_stream.modify_order({'client_order_id': 16, 'new_price': 4603})
+    self.user_stream.batch([{'type': 'modify_order', 'client_order_id': 16, 'new_quantity': 3}])
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'order_modified', 'client_order_id': '16'},
+      {'type': 'order_modified', 'client_order_id': '16'},
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(order_manager.levels('77', 'buy'), [(4603, 3)])
+
+  def test_passes_modifications_of_time_triggered_batches_when_timers_trigger(self):
+    order_manager = OrderManager(tick_table=self.tick_table)
+    self.user_stream.add_listener(order_manager)
+    self.user_stream.on_message(self.serialize_to_trader([{
+      'type': 'order_placed', 'client_order_id': '16', 'instrument_id': '77',
+      'limit_price': '2300.5', 'side': 'buy', 'quantity': 2,
+    }]))
+
+    self.user_stream.time_triggered_batch(
+      7, 1, 2, [{'type': 'modify_order', 'client_order_id': 16, 'new_price': 4603}]
+    )
+    self.user_stream.update_time_triggered_batch(
+      7, None, None, [{'type': 'modify_order', 'client_order_id': 16, 'new_quantity': 3}]
+    )
+    self.user_stream.time_triggered_batch(
+      8, 1, 2, [{'type': 'modify_order', 'client_order_id': 16, 'new_price': 4605}]
+    )
+    self.user_stream.on_message(self.serialize_to_trader([
+      {'type': 'timer_updated', 'timer_id': '7'},
+      {'type': 'timer_cancelled', 'timer_id': '8'},
+      {'type': 'timer_triggered', 'timer_id': '7'},
+      {'type': 'order_modified', 'client_order_id': '16'},
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(order_manager.levels('77', 'buy'), [(4601, 3)])
+    self.assertFalse(order_manager.get(16).externally_modified)
+
+  def test_rejects_listeners_reading_prices_in_other_units(self):
+    with self.assertRaises(ValueError):
+      self.user_stream.add_listener(OrderManager())
+    with self.assertRaises(ValueError):
+      UserStream(self.exchange, self.trader).add_listener(OrderManager(tick_table=self.tick_table))
+
+  def test_delivers_typed_messages_in_ticks(self):
+    user_stream = UserStream(
+      self.exchange, self.trader, tick_table=self.tick_table, typed_messages=True
+    )
+    user_stream.add_listener(self.listener)
+
+    user_stream.on_message(self.serialize_to_trader([
+      {
+        'type': 'order_placed', 'client_order_id': '16', 'instrument_id': '77',
+        'limit_price': '2300.5', 'side': 'buy', 'quantity': 2,
+      },
+    ]))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(self.listener.order_placed, OrderPlaced('16', '77', 4601, 'buy', 2))
+
+  def serialize_to_trader(self, entity):
+    return json.dumps({
+      'type': 'data',
+      'data': sign_encrypt(entity, self.quedex_private_key, self.trader_public_key),
+    })
+
+  def decrypt_from_trader(self, message):
+    return decrypt_verify(message, self.quedex_private_key, self.trader_public_key)
+
+
 class TestListener(UserStreamListener):
   def __init__(self):
     self.order_place_failed = None
@@ -1467,6 +1796,19 @@ class TestListener(UserStreamListener):
   def on_internal_transfer_rejected(self, internal_transfer_rejected):
     self.internal_transfer_rejected = internal_transfer_rejected
 
+
+class BatchListener(UserStreamListener):
+  def __init__(self):
+    self.batches = []
+    self.snapshots = []
+
+  def on_batch(self, entities):
+    self.batches.append(entities)
+
+  def on_snapshot(self, orders, positions, account_state):
+    self.snapshots.append((orders, positions, account_state))
+
+
 def sign_encrypt(entity, private_key, public_key):
   message = pgpy.PGPMessage.new(json.dumps(entity))
   message |= private_key.sign(message)
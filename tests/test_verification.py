@@ -0,0 +1,132 @@
+from unittest import TestCase
+import json
+
+import pgpy
+
+import market_stream_fixtures
+from quedex_api import Exchange
+from quedex_api.verification import (
+  ClearsignVerifier, PgpyVerifier, UnsupportedClearsignedMessage, extract_cleartext,
+)
+
+FIXTURES = [
+  market_stream_fixtures.order_book_str,
+  market_stream_fixtures.quotes_str,
+  market_stream_fixtures.spot_data_str,
+  market_stream_fixtures.instrument_data_str,
+  market_stream_fixtures.trade_str,
+  market_stream_fixtures.session_state_str,
+]
+
+
+def clearsigned(message_wrapper_str):
+  return json.loads(message_wrapper_str)['data']
+
+
+def tamper(clearsigned_message_str):
+  return clearsigned_message_str.replace('"type"', '"typo"', 1)
+
+
+def clearsign(cleartext, private_key):
+  message = pgpy.PGPMessage.new(cleartext, cleartext=True)
+  message |= private_key.sign(message)
+  return str(message)
+
+
+class TestClearsignVerifier(TestCase):
+
+  def setUp(self):
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.verifier = ClearsignVerifier(exchange)
+    self.pgpy_verifier = PgpyVerifier(exchange)
+
+  def test_agrees_with_pgpy_on_fixtures(self):
+    for fixture in FIXTURES:
+      message = clearsigned(fixture)
+
+      self.assertEqual(self.verifier.verify_fast(message), self.pgpy_verifier.verify(message))
+      self.assertEqual(self.verifier.verify_fast(message)[0], True)
+
+  def test_agrees_with_pgpy_on_tampered_fixtures(self):
+    for fixture in FIXTURES:
+      message = tamper(clearsigned(fixture))
+
+      self.assertEqual(self.verifier.verify_fast(message), self.pgpy_verifier.verify(message))
+      self.assertEqual(self.verifier.verify_fast(message)[0], False)
+
+  def test_falls_back_to_pgpy_on_message_signed_by_other_key(self):
+    with open('keys/quedex-public-key.asc', 'r') as f:
+      verifier = ClearsignVerifier(Exchange(f.read(), 'apiurl'))
+    message = clearsigned(market_stream_fixtures.order_book_str)
+
+    with self.assertRaises(UnsupportedClearsignedMessage):
+      verifier.verify_fast(message)
+    # pgpy refuses to verify a message without a signature of the given key
+    with self.assertRaises(Exception):
+      verifier.verify(message)
+    self.assertEqual(verifier.fallback_count, 1)
+
+  def test_falls_back_to_pgpy_on_unsupported_format(self):
+    message = clearsigned(market_stream_fixtures.order_book_str).replace(
+      'Hash: SHA256\n', 'Hash: SHA256\nCharset: UTF-8\n'
+    )
+
+    with self.assertRaises(UnsupportedClearsignedMessage):
+      self.verifier.verify_fast(message)
+    self.assertEqual(self.verifier.verify(message), self.pgpy_verifier.verify(message))
+    self.assertEqual(self.verifier.fallback_count, 1)
+
+  def test_dash_escaped_lines_are_unescaped(self):
+    message = clearsigned(market_stream_fixtures.session_state_str).replace('\n}\n', '\n- }\n', 1)
+
+    self.assertEqual(
+      self.verifier.verify_fast(message), (True, self.pgpy_verifier.verify(message)[1])
+    )
+
+
+class TestClearsignVerifierAgainstPgpy(TestCase):
+  """
+  Differential tests of the fast path and extract_cleartext against pgpy on messages signed here,
+  with whitespace at the ends of the lines and carriage returns before and after signing.
+  """
+
+  CLEARTEXTS = [
+    '{"type": "trade"}',
+    '{\n  "type": "trade"\n}',
+    '{"type": "trade"}   \n{"type": "quotes"}\t',
+    '{"type": "trade"}\r\n{"type": "quotes"}',
+    '{"type": "trade"}\r\n\r\n',
+    '- {"type": "trade"}\n-\n- ',
+    ' \n\t\n',
+  ]
+
+  def setUp(self):
+    self.private_key = pgpy.PGPKey()
+    self.private_key.parse(open('keys/quedex-private-key.asc', 'r').read())
+    with open('keys/quedex-public-key.asc', 'r') as f:
+      exchange = Exchange(f.read(), 'apiurl')
+    self.verifier = ClearsignVerifier(exchange)
+    self.pgpy_verifier = PgpyVerifier(exchange)
+
+  def messages(self):
+    for cleartext in self.CLEARTEXTS:
+      message = clearsign(cleartext, self.private_key)
+      yield message
+      yield message.replace('\n', '\r\n')
+      yield message.replace('\n-----BEGIN PGP SIGNATURE-----', ' \n-----BEGIN PGP SIGNATURE-----')
+      yield message.replace('\n\n', '\n\n  ', 1)
+
+  def test_agrees_with_pgpy(self):
+    for message in self.messages():
+      expected = self.pgpy_verifier.verify(message)
+
+      self.assertEqual(self.verifier.verify(message), expected, repr(message))
+      self.assertEqual(extract_cleartext(message), expected[1], repr(message))
+
+  def test_leaves_lines_ending_with_whitespace_to_pgpy(self):
+    message = clearsign('{"type": "trade"} \n{}', self.private_key)
+
+    with self.assertRaises(UnsupportedClearsignedMessage):
+      self.verifier.verify_fast(message)
+    self.assertEqual(self.verifier.verify(message), (True, '{"type": "trade"} \n{}'))
+    self.assertEqual(self.verifier.fallback_count, 1)
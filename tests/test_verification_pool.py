@@ -0,0 +1,244 @@
+from unittest import TestCase, skipIf
+import json
+import sys
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+import market_stream_fixtures
+from quedex_api import MarketStream, Exchange, IngestionPool, VerificationPolicy, VerificationPool
+from quedex_api import verification_pool
+from test_market_stream import TestListener, forge
+
+
+def raise_in_worker(argument):
+  raise ValueError('worker failed')
+
+
+class ReactorStub(object):
+  """
+  Collects calls scheduled from worker threads and runs them on the test thread.
+  """
+
+  def __init__(self):
+    self._calls = queue.Queue()
+
+  def call_from_thread(self, function, *args):
+    self._calls.put((function, args))
+
+  def run_until(self, condition, timeout=10):
+    while not condition():
+      function, args = self._calls.get(timeout=timeout)
+      function(*args)
+
+
+class RecordingListener(TestListener):
+  def __init__(self):
+    super(RecordingListener, self).__init__()
+    self.messages = []
+
+  def on_message(self, message):
+    self.messages.append(message)
+
+
+class PoolTests(object):
+  """
+  Tests common for VerificationPool and IngestionPool.
+  """
+
+  def run_until_delivered(self):
+    self.reactor.run_until(lambda: self.pool.queue_depth == 0)
+
+  def tearDown(self):
+    self.pool.close()
+
+  def test_delivers_messages_in_arrival_order(self):
+    # instrument data is much slower to verify than the rest
+    fixtures = [
+      market_stream_fixtures.instrument_data_str,
+      market_stream_fixtures.order_book_str,
+      market_stream_fixtures.quotes_str,
+      market_stream_fixtures.trade_str,
+      market_stream_fixtures.session_state_str,
+    ] * 3
+
+    for fixture in fixtures:
+      self.market_stream.on_message(fixture)
+    self.reactor.run_until(lambda: len(self.listener.messages) == len(fixtures))
+
+    self.assertEqual(self.listener.error, None)
+    self.assertEqual(
+      [message['type'] for message in self.listener.messages],
+      ['instrument_data', 'order_book', 'quotes', 'trade', 'session_state'] * 3
+    )
+    self.assertEqual(self.pool.queue_depth, 0)
+    for stage in VerificationPool.STAGES:
+      self.assertEqual(self.pool.latencies[stage].count, len(fixtures))
+
+  def test_reports_failed_verification(self):
+    message_wrapper = json.loads(market_stream_fixtures.session_state_str)
+    message_wrapper['data'] = message_wrapper['data'].replace('continuous', 'auction')
+
+    self.market_stream.on_message(json.dumps(message_wrapper))
+    self.reactor.run_until(lambda: self.listener.session_state is not None)
+
+    self.assertEqual(
+      str(self.listener.error).split(':')[0], 'Signature verification failed on message'
+    )
+
+  def test_reports_verification_error_in_order(self):
+    message_wrapper = {'type': 'data', 'data': 'not a clearsigned message'}
+
+    self.market_stream.on_message(json.dumps(message_wrapper))
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+    self.reactor.run_until(lambda: self.listener.trade is not None)
+
+    self.assertNotEqual(self.listener.error, None)
+    self.assertEqual(len(self.listener.messages), 1)
+
+  def test_queue_depth_counts_undelivered_messages(self):
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+
+    self.assertEqual(self.pool.queue_depth, 2)
+    self.reactor.run_until(lambda: self.pool.queue_depth == 0)
+    self.assertEqual(len(self.listener.messages), 2)
+
+
+
+class TestVerificationPool(PoolTests, TestCase):
+  processes = False
+
+  def setUp(self):
+    self.reactor = ReactorStub()
+    self.pool = VerificationPool(
+      workers=4, processes=self.processes, call_from_thread=self.reactor.call_from_thread
+    )
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = RecordingListener()
+    self.market_stream = MarketStream(exchange, verification_pool=self.pool)
+    self.market_stream.add_listener(self.listener)
+
+  def test_unverified_messages_are_delivered_in_order(self):
+    self.market_stream = MarketStream(
+      Exchange(market_stream_fixtures.public_key_str, 'apiurl'),
+      verification_pool=self.pool,
+      verification_policy=VerificationPolicy.only_types('instrument_data'),
+    )
+    self.market_stream.add_listener(self.listener)
+
+    self.market_stream.on_message(market_stream_fixtures.instrument_data_str)
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+    self.run_until_delivered()
+
+    self.assertEqual(
+      [message['type'] for message in self.listener.messages],
+      ['instrument_data', 'order_book', 'trade'],
+    )
+    self.assertEqual(self.market_stream.verification_policy.skipped_count, 2)
+    self.assertEqual(self.pool.unverified_count, 2)
+    for stage in VerificationPool.STAGES:
+      self.assertEqual(self.pool.latencies[stage].count, 1)
+
+  @skipIf(sys.version_info[0] < 3, 'the pool reports exceptions of workers since Python 3')
+  def test_delivers_in_order_past_messages_the_workers_raised_on(self):
+    verify = verification_pool._verify
+    verification_pool._verify = raise_in_worker
+    try:
+      self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    finally:
+      verification_pool._verify = verify
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+    self.run_until_delivered()
+
+    self.assertEqual(
+      str(self.listener.error), 'Signature verification error: ValueError: worker failed'
+    )
+    self.assertEqual([message['type'] for message in self.listener.messages], ['trade'])
+
+  def test_workers_check_public_key_against_fingerprint(self):
+    verification_pool._init_worker(market_stream_fixtures.public_key_str, '00' * 20, False, 'json')
+
+    verified, _, error = verification_pool._verify(
+      json.loads(market_stream_fixtures.trade_str)['data']
+    )[0]
+
+    self.assertFalse(verified)
+    self.assertEqual(error.split(':')[0], 'ValueError')
+
+  def test_replaces_workers_when_public_key_changes(self):
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.market_stream = MarketStream(exchange, verification_pool=self.pool)
+    self.market_stream.add_listener(self.listener)
+    self.market_stream.on_message(market_stream_fixtures.trade_str)
+    with open('keys/trader-public-key.asc', 'r') as f:
+      exchange.invalidate_public_key(f.read())
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.run_until_delivered()
+
+    # the message is not signed with the new key
+    self.assertEqual([message['type'] for message in self.listener.messages], ['trade'])
+    self.assertEqual(str(self.listener.error).split(':')[0], 'Signature verification error')
+
+  def test_deferred_verification_runs_on_the_pool(self):
+    self.market_stream = MarketStream(
+      Exchange(market_stream_fixtures.public_key_str, 'apiurl'),
+      verification_pool=self.pool,
+      verification_policy=VerificationPolicy.deferred(),
+    )
+    self.market_stream.add_listener(self.listener)
+
+    self.market_stream.on_message(market_stream_fixtures.order_book_str)
+    self.market_stream.on_message(forge(market_stream_fixtures.trade_str))
+
+    self.assertNotEqual(self.listener.trade, None)
+    self.assertEqual(self.listener.error, None)
+    self.run_until_delivered()
+    self.assertNotEqual(self.listener.error, None)
+    self.assertEqual(self.listener.verification_failed, [self.listener.trade])
+
+
+class TestProcessVerificationPool(TestVerificationPool):
+  processes = True
+
+
+class TestIngestionPool(PoolTests, TestCase):
+  processes = True
+
+  def setUp(self):
+    self.reactor = ReactorStub()
+    self.pool = IngestionPool(
+      workers=4, processes=self.processes, call_from_thread=self.reactor.call_from_thread
+    )
+    exchange = Exchange(market_stream_fixtures.public_key_str, 'apiurl')
+    self.listener = RecordingListener()
+    self.market_stream = MarketStream(exchange, fast_verification=True, ingestion_pool=self.pool)
+    self.market_stream.add_listener(self.listener)
+
+  def test_keepalive_is_ignored(self):
+    self.market_stream.on_message(json.dumps({'type': 'keepalive', 'timestamp': 1506958410894}))
+    self.run_until_delivered()
+
+    self.assertEqual(self.listener.messages, [])
+    self.assertEqual(self.listener.error, None)
+
+  def test_receives_error_on_non_maintenance_error_code(self):
+    self.market_stream.on_message(market_stream_fixtures.error_maintenance_data_str)
+    self.market_stream.on_message(market_stream_fixtures.error_data_str)
+    self.run_until_delivered()
+
+    self.assertEqual(str(self.listener.error), 'WebSocket error: ERROR')
+
+  def test_receives_error_on_data_parsing_error(self):
+    self.market_stream.on_message(market_stream_fixtures.corrupt_data_str)
+    self.run_until_delivered()
+
+    self.assertNotEqual(self.listener.error, None)
+
+
+class TestIngestionThreadPool(TestIngestionPool):
+  processes = False